@@ -0,0 +1,48 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Probabilistic set: `might_contain` never returns False for an added key,
+    and returns True for a missing key with roughly `false_positive_rate`
+    probability while at most `capacity` keys have been added.
+
+    Size is m = -n * ln(p) / ln(2)^2 bits with k = m / n * ln(2) hash
+    functions. For 10M emails that is about 11.4 MiB (k=7) at p=1%, and
+    17.1 MiB (k=10) at p=0.1%, independent of email length.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.num_bits = max(
+            8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions derived from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -13,7 +13,96 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    ACCESS_TOKEN_RENEW_MINUTES: int = 10
+    # How often each worker reloads revoked token generations from the database.
+    TOKEN_GENERATION_REFRESH_SECONDS: int = 30
+    TOKEN_CACHE_SIZE: int = 10000
+    # Password hashing policy. The first scheme hashes new passwords; hashes in
+    # the other schemes (or with different costs) are upgraded on next login.
+    PASSWORD_SCHEMES: List[str] = ["bcrypt"]
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_ARGON2_TIME_COST: int = 3
+    PASSWORD_ARGON2_MEMORY_COST_KIB: int = 65536
+    PASSWORD_ARGON2_PARALLELISM: int = 1
+    # Token buckets for POST /auth/login and /auth/signup: "memory" (per worker)
+    # or "database" (shared through PostgreSQL).
+    AUTH_RATE_LIMIT_BACKEND: str = "memory"
+    AUTH_RATE_LIMIT_IP_BURST: int = 20
+    AUTH_RATE_LIMIT_IP_PER_MINUTE: float = 10
+    AUTH_RATE_LIMIT_EMAIL_BURST: int = 5
+    AUTH_RATE_LIMIT_EMAIL_PER_MINUTE: float = 2
+    # Password hashes running at once per worker (defaults to the CPU count), and
+    # how long a login may wait for a slot before getting a 503.
+    AUTH_HASH_CONCURRENCY: Optional[int] = None
+    AUTH_HASH_QUEUE_TIMEOUT_SECONDS: float = 5
+    # Bloom filter of registered emails, so signups with new emails skip the
+    # existence query. Sized for max(capacity, 2x current users) at startup.
+    EMAIL_FILTER_ENABLED: bool = True
+    EMAIL_FILTER_CAPACITY: int = 1_000_000
+    EMAIL_FILTER_FALSE_POSITIVE_RATE: float = 0.01
+    # Picks up users registered through other workers (with PUBSUB_BACKEND=database
+    # the invalidation bus does this right away; the refresh is a fallback).
+    EMAIL_FILTER_REFRESH_SECONDS: int = 5
+    # Stored outcomes of todo form posts carrying an idempotency key, so a
+    # resubmitted form replays the first response: "memory" (per worker) or
+    # "database" (shared through PostgreSQL).
+    IDEMPOTENCY_BACKEND: str = "memory"
+    IDEMPOTENCY_TTL_SECONDS: int = 600
+    # How long a retry waits for the original request (e.g. a slow upload).
+    IDEMPOTENCY_WAIT_SECONDS: float = 30
+    # Optional write-behind buffer for status clicks: each user's changes are
+    # written together this many seconds after the first one. Keep the window
+    # below READ_YOUR_WRITES_SECONDS when using a read replica.
+    STATUS_WRITE_BUFFER_ENABLED: bool = False
+    STATUS_WRITE_BUFFER_WINDOW_SECONDS: float = 2
+    STATUS_WRITE_BUFFER_MAX_ATTEMPTS: int = 5
+    # app.jobs.archive_todos moves todos Done for this long out of the hot table.
+    ARCHIVE_DONE_AFTER_DAYS: float = 30
+    ARCHIVE_BATCH_SIZE: int = 1000
+    # app.jobs.purge_todos hard-deletes todos soft-deleted at least this long ago.
+    TODO_PURGE_AFTER_HOURS: float = 24
+    TODO_PURGE_BATCH_SIZE: int = 1000
+    # GET /todos/sync: rows per page.
+    SYNC_PAGE_SIZE: int = 500
+    # Cross-worker messages (app.core.pubsub): "memory" for a single worker,
+    # "database" for Postgres LISTEN/NOTIFY between workers and hosts.
+    PUBSUB_BACKEND: str = "memory"
+    # How long startup waits for the database (including the LISTEN connection
+    # above) before the worker gives up instead of hanging.
+    STARTUP_TIMEOUT_SECONDS: float = 10
+    # GET /todos/events streams todo changes to the user's other tabs/devices.
+    TODO_EVENTS_ENABLED: bool = True
+    TODO_EVENTS_QUEUE_SIZE: int = 100
+    TODO_EVENTS_HEARTBEAT_SECONDS: float = 15
+    # How deeply subtasks may nest; a top-level todo is level 1.
+    TODO_MAX_SUBTASK_DEPTH: int = 5
+    # Repeating todos: one worker (elected with an advisory lock) creates each
+    # next instance this long before its due date starts, and keeps the
+    # occurrences of the following lookahead queued in memory.
+    RECURRENCE_SCHEDULER_ENABLED: bool = True
+    RECURRENCE_LEAD_MINUTES: float = 60
+    RECURRENCE_LOOKAHEAD_MINUTES: float = 60
+    RECURRENCE_TICK_SECONDS: float = 30
+    RECURRENCE_BATCH_SIZE: int = 500
+    # app.jobs.send_reminders tells users, one message each per batch, about
+    # unfinished todos due within REMINDER_DAYS_AHEAD days (0: due today),
+    # once per todo. REMINDER_CHANNEL is "file" (a local outbox standing in
+    # for email) or "webhook" (POSTs each batch to REMINDER_WEBHOOK_URL).
+    REMINDER_DAYS_AHEAD: int = 1
+    REMINDER_BATCH_SIZE: int = 1000
+    REMINDER_CHANNEL: str = "file"
+    REMINDER_FILE_PATH: Path = BASE_DIR / "reminders.jsonl"
+    REMINDER_WEBHOOK_URL: Optional[str] = None
+    REMINDER_WEBHOOK_TIMEOUT_SECONDS: float = 10
     DATABASE_URL: str
+    # Optional read replica for GET list/detail pages; falls back to DATABASE_URL.
+    DATABASE_READ_URL: Optional[str] = None
+    # After a write, the same client reads from the primary for this long.
+    READ_YOUR_WRITES_SECONDS: int = 10
+    # Optional horizontal sharding of todos by owner_id; users stay on DATABASE_URL.
+    DATABASE_SHARD_URLS: List[str] = []
+    SHARD_STRATEGY: str = "hash"  # "hash" or "directory"
+    SHARD_DIRECTORY_REFRESH_SECONDS: int = 30
     STATIC_DIR: Path = BASE_DIR / "app" / "static"
     CLOUDINARY_URL: Optional[str] = None
 
@@ -0,0 +1,227 @@
+"""
+Idempotency keys for mutating form posts.
+
+A client sends the same key with every retry of one logical request (the
+todo forms embed a fresh key per render, API clients send an
+`Idempotency-Key` header). The first request with a key claims it and runs;
+its response is kept for `ttl_seconds`. Retries get that stored response
+back without running the handler again. A retry that arrives while the
+first request is still running waits up to `wait_seconds` for its outcome.
+
+Two stores share the same interface, mirroring app.core.rate_limit:
+
+* InMemoryIdempotencyStore: per worker process, no I/O.
+* DatabaseIdempotencyStore: one Postgres row per key, shared by every worker
+  and host, claimed with a single atomic upsert.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import sessionmaker
+from starlette.responses import Response
+
+from app.db.models import IdempotencyRecord
+
+# Polling interval for DatabaseIdempotencyStore while another worker holds a key.
+DATABASE_POLL_SECONDS = 0.2
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when a key comes back with a different request than it was first used for."""
+
+
+class IdempotencyInProgress(Exception):
+    """Raised when the request holding a key is still running after the wait."""
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """What a replay needs to reproduce a response: status, headers and body."""
+
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+    @classmethod
+    def from_response(cls, response: Response) -> "StoredResponse":
+        # Cookies belong to the original exchange (e.g. a renewed session) and
+        # must not be handed out again.
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() != "set-cookie"
+        ]
+        return cls(response.status_code, headers, bytes(response.body))
+
+    def to_response(self) -> Response:
+        return Response(
+            content=self.body, status_code=self.status_code, headers=dict(self.headers)
+        )
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    expires_at: float
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    response: Optional[StoredResponse] = None
+
+
+class InMemoryIdempotencyStore:
+    """Per-process store; the least recently used keys are evicted past `max_keys`."""
+
+    def __init__(
+        self, ttl_seconds: float, wait_seconds: float, max_keys: int = 100_000
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        Claims `key` and returns None, or returns the stored response of the
+        request that already used it.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                self._entries[key] = _Entry(fingerprint, now + self.ttl_seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+                return None
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyKeyReused()
+            if entry.response is not None:
+                return entry.response
+            try:
+                await asyncio.wait_for(entry.done.wait(), timeout=deadline - now)
+            except asyncio.TimeoutError:
+                raise IdempotencyInProgress()
+            # Loop: either a response is stored now, or the holder gave up the key.
+
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.response = response
+            entry.done.set()
+
+    async def abandon(self, key: str) -> None:
+        """Releases a claimed key whose request failed, so a retry runs it again."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+    async def purge(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            if self._entries[key].response is not None:
+                del self._entries[key]
+
+
+class DatabaseIdempotencyStore:
+    """Keys stored in the `idempotency_keys` table (PostgreSQL only)."""
+
+    def __init__(
+        self, session_factory: sessionmaker, ttl_seconds: float, wait_seconds: float
+    ):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+
+    def _cutoff(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        table = IdempotencyRecord.__table__
+        stmt = insert(table).values(key=key, fingerprint=fingerprint)
+        # An expired row is taken over as if it did not exist; a live one is left
+        # alone, so an empty result means someone else holds the key.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "status_code": None,
+                "headers": None,
+                "body": None,
+                "created_at": stmt.excluded.created_at,
+            },
+            where=table.c.created_at < self._cutoff(),
+        ).returning(table.c.key)
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    if (await session.execute(stmt)).first() is not None:
+                        return None
+                    row = (
+                        await session.execute(select(table).where(table.c.key == key))
+                    ).first()
+            if row is None:
+                continue  # Abandoned or purged in between: try to claim again.
+            if row.fingerprint != fingerprint:
+                raise IdempotencyKeyReused()
+            if row.status_code is not None:
+                return StoredResponse(
+                    row.status_code, [tuple(h) for h in row.headers], row.body
+                )
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress()
+            await asyncio.sleep(DATABASE_POLL_SECONDS)
+
+    async def complete(self, key: str, response: StoredResponse) -> None:
+        table = IdempotencyRecord.__table__
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    update(table)
+                    .where(table.c.key == key)
+                    .values(
+                        status_code=response.status_code,
+                        headers=[list(h) for h in response.headers],
+                        body=response.body,
+                    )
+                )
+
+    async def abandon(self, key: str) -> None:
+        table = IdempotencyRecord.__table__
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    delete(table).where(
+                        table.c.key == key, table.c.status_code.is_(None)
+                    )
+                )
+
+    async def purge(self) -> None:
+        """Deletes keys older than `ttl_seconds`; they can no longer be replayed."""
+        table = IdempotencyRecord.__table__
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(
+                    delete(table).where(table.c.created_at < self._cutoff())
+                )
+
+
+def build_idempotency_store(
+    kind: str,
+    ttl_seconds: float,
+    wait_seconds: float,
+    session_factory: Optional[sessionmaker] = None,
+):
+    if kind == "memory":
+        return InMemoryIdempotencyStore(ttl_seconds, wait_seconds)
+    if kind == "database":
+        return DatabaseIdempotencyStore(session_factory, ttl_seconds, wait_seconds)
+    raise ValueError(f"Unknown IDEMPOTENCY_BACKEND: {kind}")
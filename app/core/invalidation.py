@@ -0,0 +1,117 @@
+"""
+Cross-worker cache invalidation.
+
+Every worker keeps some state in memory (token generations, the email
+filter, the shard directory) that another worker's write makes stale. The
+crud modules report each committed change as an Invalidation (entity,
+owner_id, version) on `invalidation_bus`; the ServiceContainer of every
+worker registers handlers for the entities it caches and attaches the bus
+to its pubsub backend at startup.
+
+Delivery is at most once (see app.core.pubsub). A handler called with None
+must treat everything it caches as stale, so periodic refreshes can stay as
+a safety net with long intervals. Entities with no handler are not
+published at all.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.db.base import after_commit
+
+CHANNEL = "invalidations"
+# NOTIFY payloads are capped at 8000 bytes; stay well below with small batches.
+MAX_BATCH = 100
+
+InvalidationHandler = Callable[[Optional["Invalidation"]], None]
+
+
+@dataclass(frozen=True)
+class Invalidation:
+    entity: str  # "user" or "todo"
+    owner_id: int
+    # Version of the changed row after the write (token_generation for users).
+    version: Optional[int] = None
+
+
+class InvalidationBus:
+    def __init__(self):
+        self.pubsub = None
+        self._handlers: Dict[str, List[InvalidationHandler]] = {}
+
+    def on(self, entity: str, handler: InvalidationHandler) -> None:
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def attach(self, pubsub) -> None:
+        """Routes invalidations through `pubsub`; call before pubsub.start()."""
+        self.pubsub = pubsub
+        pubsub.subscribe(CHANNEL, self._dispatch)
+
+    def detach(self) -> None:
+        self.pubsub = None
+        self._handlers.clear()
+
+    def publish_after_commit(
+        self,
+        db: AsyncSession,
+        entity: str,
+        owner_id: int,
+        version: Optional[int] = None,
+    ) -> None:
+        """Announces a change to `entity` once the session's transaction commits."""
+        if self.pubsub is None or entity not in self._handlers:
+            return
+        after_commit(db, CHANNEL, Invalidation(entity, owner_id, version), self.publish)
+
+    async def publish(self, invalidations: List[Invalidation]) -> None:
+        # One message per commit: repeated changes to an owner keep the newest version.
+        latest: Dict[tuple, Optional[int]] = {}
+        for item in invalidations:
+            key = (item.entity, item.owner_id)
+            if key not in latest or (item.version or 0) > (latest[key] or 0):
+                latest[key] = item.version
+        entries = [
+            [entity, owner_id, version]
+            for (entity, owner_id), version in latest.items()
+        ]
+        for i in range(0, len(entries), MAX_BATCH):
+            try:
+                await self.pubsub.publish(
+                    CHANNEL, {"items": entries[i : i + MAX_BATCH]}
+                )
+            except Exception:
+                # Other workers catch up on their next periodic refresh.
+                logging.exception(f"Publishing {len(entries)} invalidations failed")
+
+    def _dispatch(self, message: Optional[dict]) -> None:
+        if message is None:
+            for handlers in self._handlers.values():
+                for handler in handlers:
+                    handler(None)
+            return
+        for entity, owner_id, version in message["items"]:
+            for handler in self._handlers.get(entity, ()):
+                try:
+                    handler(Invalidation(entity, owner_id, version))
+                except Exception:
+                    logging.exception(f"Invalidation handler {handler!r} failed")
+
+
+async def notify_in_transaction(
+    conn: AsyncConnection, invalidations: List[Invalidation]
+) -> None:
+    """
+    For jobs writing through Core connections: queues a NOTIFY that Postgres
+    delivers to the workers (PUBSUB_BACKEND=database) only if `conn`'s
+    transaction commits.
+    """
+    items = [[i.entity, i.owner_id, i.version] for i in invalidations]
+    await conn.execute(select(func.pg_notify(CHANNEL, json.dumps({"items": items}))))
+
+
+invalidation_bus = InvalidationBus()
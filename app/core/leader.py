@@ -0,0 +1,63 @@
+"""
+Leader election between workers with a PostgreSQL advisory lock.
+
+Background work that must run in exactly one worker (the recurrence
+scheduler) asks `is_leader()` before each round. The lock is session-level
+and held by a dedicated connection outside the SQLAlchemy pool, like the
+LISTEN connection of app.core.pubsub: when the leader stops or loses that
+connection, Postgres releases the lock and the next worker to ask takes
+over. Restarts need no cleanup.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# How long the leader waits for its lock connection to answer a ping.
+PING_TIMEOUT_SECONDS = 5.0
+
+
+class AdvisoryLockLeader:
+    def __init__(self, db_engine: AsyncEngine, lock_key: int):
+        self.dsn = db_engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        self.lock_key = lock_key
+        self._connection: Optional[asyncpg.Connection] = None
+        self._leading = False
+
+    async def is_leader(self) -> bool:
+        """Whether this worker holds the lock, trying to take it if not."""
+        try:
+            if self._leading:
+                # A dead connection has already released the lock server-side.
+                await asyncio.wait_for(
+                    self._connection.fetchval("SELECT 1"), PING_TIMEOUT_SECONDS
+                )
+                return True
+            if self._connection is None or self._connection.is_closed():
+                self._connection = await asyncpg.connect(self.dsn)
+            self._leading = await self._connection.fetchval(
+                "SELECT pg_try_advisory_lock($1)", self.lock_key
+            )
+        except Exception:
+            logging.exception(
+                f"Leader election: connection for lock {self.lock_key} failed"
+            )
+            await self.release()
+            return False
+        if self._leading:
+            logging.info(f"Leader election: took lock {self.lock_key}")
+        return self._leading
+
+    async def release(self) -> None:
+        """Gives up the lock (if held) by closing its connection."""
+        connection, self._connection, self._leading = self._connection, None, False
+        if connection is not None and not connection.is_closed():
+            try:
+                await connection.close(timeout=PING_TIMEOUT_SECONDS)
+            except Exception:
+                connection.terminate()
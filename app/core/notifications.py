@@ -0,0 +1,97 @@
+"""
+Delivery channels for user notifications (due-date reminders).
+
+A channel takes a batch of Reminders, one per user, and either delivers
+all of them or raises; the sender only records progress after `send()`
+returns, so a failed batch is sent again on the next run. Delivery is
+therefore at least once.
+
+Two channels share the same interface, mirroring app.core.pubsub:
+
+* FileChannel: appends one JSON line per reminder to a local outbox file.
+  Stands in for an email sender in development; a mail relay can tail it.
+* WebhookChannel: POSTs each batch as one JSON document to a URL, e.g. a
+  mail or push service, and fails the batch on any non-2xx response.
+"""
+
+import asyncio
+import json
+from dataclasses import asdict, dataclass
+from datetime import date
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+
+@dataclass(frozen=True)
+class ReminderItem:
+    todo_id: int
+    title: str
+    due_date: date
+    priority: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Reminder:
+    owner_id: int
+    email: str
+    items: List[ReminderItem]
+
+    def to_message(self) -> dict:
+        message = asdict(self)
+        for item in message["items"]:
+            item["due_date"] = item["due_date"].isoformat()
+        return message
+
+
+class FileChannel:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    async def send(self, reminders: List[Reminder]) -> None:
+        lines = "".join(
+            json.dumps(reminder.to_message()) + "\n" for reminder in reminders
+        )
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        with self.path.open("a", encoding="utf-8") as outbox:
+            outbox.write(lines)
+            outbox.flush()
+
+    async def close(self) -> None:
+        pass
+
+
+class WebhookChannel:
+    """One pooled HTTP client for the whole run; one request per batch."""
+
+    def __init__(self, url: str, timeout_seconds: float):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout_seconds)
+
+    async def send(self, reminders: List[Reminder]) -> None:
+        response = await self._client.post(
+            self.url,
+            json={"reminders": [reminder.to_message() for reminder in reminders]},
+        )
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def build_reminder_channel(
+    kind: str,
+    file_path: Optional[Path] = None,
+    webhook_url: Optional[str] = None,
+    webhook_timeout_seconds: float = 10,
+):
+    if kind == "file":
+        return FileChannel(file_path)
+    if kind == "webhook":
+        if not webhook_url:
+            raise ValueError("REMINDER_CHANNEL=webhook needs REMINDER_WEBHOOK_URL")
+        return WebhookChannel(webhook_url, webhook_timeout_seconds)
+    raise ValueError(f"Unknown REMINDER_CHANNEL: {kind}")
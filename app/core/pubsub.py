@@ -0,0 +1,154 @@
+"""
+Cross-worker publish/subscribe for small JSON messages.
+
+Handlers are registered per channel before `start()` and are called with
+each message (a dict) on the event loop; they must not block. A handler
+called with None must assume it missed messages (the listener lost its
+connection) and recover on its own, e.g. by asking its clients to reload.
+
+Two backends share the same interface, mirroring app.core.rate_limit:
+
+* InMemoryPubSub: delivers within this worker process only, no I/O. Enough
+  for a single uvicorn worker and for tests.
+* DatabasePubSub: NOTIFY / LISTEN on DATABASE_URL, so every worker on every
+  host sees every message, its own included. Messages are not stored:
+  a worker that is down or reconnecting misses them.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+Handler = Callable[[Optional[dict]], None]
+
+# Wait between attempts to re-establish the LISTEN connection.
+RECONNECT_SECONDS = 1.0
+
+
+class PubSubUnavailable(Exception):
+    """Raised by start() when the backend cannot be reached in time."""
+
+
+class InMemoryPubSub:
+    """Per-process backend; publish() calls the handlers directly."""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, channel: str, message: dict) -> None:
+        _deliver(self._handlers.get(channel, []), message)
+
+
+class DatabasePubSub:
+    """
+    One dedicated LISTEN connection per worker, outside the SQLAlchemy pool
+    so it never holds a pooled connection. Publishing borrows a pooled
+    connection for a single `SELECT pg_notify(...)`.
+    """
+
+    def __init__(self, db_engine: AsyncEngine, connect_timeout: float):
+        self.db_engine = db_engine
+        self.connect_timeout = connect_timeout
+        self.dsn = db_engine.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self._last_error: Optional[BaseException] = None
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self) -> None:
+        """Opens the LISTEN connection; gives up after `connect_timeout` seconds."""
+        self._task = asyncio.create_task(self._listen(), name="pubsub_listen")
+        try:
+            await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            await self.stop()
+            raise PubSubUnavailable(
+                f"Could not open the LISTEN connection within "
+                f"{self.connect_timeout}s: {self._last_error!r}"
+            ) from self._last_error
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def publish(self, channel: str, message: dict) -> None:
+        async with self.db_engine.connect() as conn:
+            await conn.execute(select(func.pg_notify(channel, json.dumps(message))))
+            await conn.commit()
+
+    def _on_notification(self, connection, pid, channel: str, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logging.warning(f"Ignoring malformed message on {channel}: {payload!r}")
+            return
+        _deliver(self._handlers.get(channel, []), message)
+
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except Exception as e:
+                self._last_error = e
+                logging.exception("PubSub: could not open the LISTEN connection")
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                for channel in self._handlers:
+                    await connection.add_listener(channel, self._on_notification)
+                if reconnecting:
+                    # Anything published while we were away is gone.
+                    for handlers in self._handlers.values():
+                        _deliver(handlers, None)
+                self._connected.set()
+                reconnecting = True
+                await lost.wait()
+                logging.warning("PubSub: LISTEN connection lost, reconnecting")
+            except Exception:
+                logging.exception("PubSub: LISTEN connection failed")
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+def _deliver(handlers: List[Handler], message: Optional[dict]) -> None:
+    for handler in handlers:
+        try:
+            handler(message)
+        except Exception:
+            logging.exception(f"PubSub handler {handler!r} failed")
+
+
+def build_pubsub(
+    kind: str, db_engine: Optional[AsyncEngine] = None, connect_timeout: float = 10
+):
+    if kind == "memory":
+        return InMemoryPubSub()
+    if kind == "database":
+        return DatabasePubSub(db_engine, connect_timeout)
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {kind}")
@@ -0,0 +1,171 @@
+"""
+Admission control for expensive endpoints (login and signup each cost a full
+password hash).
+
+Token buckets are keyed by strings such as "ip:203.0.113.7" or
+"email:<digest of the address>"; each bucket holds up to `burst` tokens and refills at
+`rate_per_second`. Two backends share the same interface:
+
+* InMemoryTokenBuckets: per worker process, no I/O.
+* DatabaseTokenBuckets: one Postgres row per key, shared by every worker and
+  host, updated with a single atomic upsert.
+
+HashingLimiter caps how many password hashes run at once, off the event
+loop, so auth load queues (and eventually sheds) instead of starving the
+todo routes of CPU.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from app.db.models import RateLimitBucket
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class BucketRule:
+    """`burst` attempts at once, refilled at `per_minute` attempts per minute."""
+
+    burst: int
+    per_minute: float
+
+    @property
+    def rate_per_second(self) -> float:
+        return self.per_minute / 60
+
+
+class InMemoryTokenBuckets:
+    """Per-process buckets; the least recently used keys are evicted past `max_keys`."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rule: BucketRule) -> float:
+        """Consumes one token. Returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (rule.burst, now))
+        tokens = min(rule.burst, tokens + (now - updated_at) * rule.rate_per_second)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / rule.rate_per_second
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    async def purge(self) -> None:
+        """Nothing to do; eviction happens inline."""
+
+
+class DatabaseTokenBuckets:
+    """Buckets stored in the `rate_limit_buckets` table (PostgreSQL only)."""
+
+    def __init__(self, session_factory: sessionmaker, idle_seconds: float = 3600):
+        self.session_factory = session_factory
+        self.idle_seconds = idle_seconds
+
+    async def take(self, key: str, rule: BucketRule) -> float:
+        table = RateLimitBucket.__table__
+        refilled = func.least(
+            rule.burst,
+            table.c.tokens
+            + func.extract("epoch", func.now() - table.c.updated_at)
+            * rule.rate_per_second,
+        )
+        stmt = insert(table).values(
+            key=key, tokens=rule.burst - 1, updated_at=func.now()
+        )
+        # The conflict branch only fires while a token is available, so an empty
+        # result means the attempt was rejected and the bucket left untouched.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"tokens": refilled - 1, "updated_at": func.now()},
+            where=refilled >= 1,
+        ).returning(table.c.key)
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                if (await session.execute(stmt)).first() is not None:
+                    return 0.0
+                tokens = (
+                    await session.execute(select(refilled).where(table.c.key == key))
+                ).scalar()
+        if tokens is None:
+            return 0.0
+        return (1 - float(tokens)) / rule.rate_per_second
+
+    async def purge(self) -> None:
+        """Deletes buckets untouched for `idle_seconds`; they would be full again anyway."""
+        table = RateLimitBucket.__table__
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.idle_seconds)
+        async with self.session_factory() as session:
+            async with session.begin():
+                await session.execute(delete(table).where(table.c.updated_at < cutoff))
+
+
+class RateLimiter:
+    """Checks a request against several buckets, e.g. per client IP and per email."""
+
+    def __init__(self, backend, rules: dict[str, BucketRule]):
+        self.backend = backend
+        self.rules = rules
+
+    async def check(self, keys: List[Tuple[str, str]]) -> float:
+        """
+        `keys` pairs a rule name with the value to limit, e.g. ("ip", "10.0.0.1").
+        Returns 0 if every bucket admitted the attempt, else the longest wait.
+        """
+        retry_after = 0.0
+        for rule_name, value in keys:
+            rule = self.rules[rule_name]
+            retry_after = max(
+                retry_after, await self.backend.take(f"{rule_name}:{value}", rule)
+            )
+        return retry_after
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+class HashingLimiter:
+    """Runs password hashing in the threadpool, at most `concurrency` at a time."""
+
+    def __init__(self, concurrency: int, queue_timeout_seconds: float):
+        self.concurrency = concurrency
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        try:
+            await asyncio.wait_for(
+                self._semaphore.acquire(), timeout=self.queue_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise HashingBusy()
+        try:
+            return await run_in_threadpool(fn, *args)
+        finally:
+            self._semaphore.release()
+
+
+def build_bucket_backend(kind: str, session_factory: Optional[sessionmaker] = None):
+    if kind == "memory":
+        return InMemoryTokenBuckets()
+    if kind == "database":
+        return DatabaseTokenBuckets(session_factory)
+    raise ValueError(f"Unknown AUTH_RATE_LIMIT_BACKEND: {kind}")
@@ -0,0 +1,192 @@
+"""
+RRULE-style recurrence rules for repeating todos.
+
+Supports the subset of RFC 5545 the forms and the API need:
+
+    FREQ=DAILY|WEEKLY|MONTHLY|YEARLY   required
+    INTERVAL=n                         every n days / weeks / months / years
+    BYDAY=MO,WE,FR                     weekdays, with FREQ=WEEKLY
+    BYMONTHDAY=d, BYMONTH=m            day (and month), with MONTHLY / YEARLY
+    UNTIL=YYYYMMDD                     last possible occurrence
+
+Occurrences are dates, like a todo's due_date. Rules are anchored to the
+due date when saved (`anchor_rule`), so a todo due on the 31st repeats on
+the last day of shorter months and goes back to the 31st afterwards.
+"""
+
+import calendar
+from dataclasses import dataclass, replace
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+WORKWEEK = (0, 1, 2, 3, 4)
+_PARTS = {"FREQ", "INTERVAL", "BYDAY", "BYMONTH", "BYMONTHDAY", "UNTIL"}
+_UNITS = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month", "YEARLY": "year"}
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    freq: str
+    interval: int = 1
+    by_day: Tuple[int, ...] = ()  # 0 = Monday, as date.weekday()
+    by_month: Optional[int] = None
+    by_month_day: Optional[int] = None
+    until: Optional[date] = None
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.by_day:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in self.by_day))
+        if self.by_month is not None:
+            parts.append(f"BYMONTH={self.by_month}")
+        if self.by_month_day is not None:
+            parts.append(f"BYMONTHDAY={self.by_month_day}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%d}")
+        return ";".join(parts)
+
+
+def parse_rule(text: str) -> RecurrenceRule:
+    """Parses e.g. "FREQ=WEEKLY;BYDAY=MO,WE"; raises ValueError if unsupported."""
+    text = text.strip()
+    if text.upper().startswith("RRULE:"):
+        text = text[len("RRULE:") :]
+    fields = {}
+    for part in filter(None, (part.strip() for part in text.split(";"))):
+        name, separator, value = part.partition("=")
+        if not separator:
+            raise ValueError(f"Malformed recurrence rule part: {part!r}")
+        fields[name.strip().upper()] = value.strip().upper()
+    unknown = set(fields) - _PARTS
+    if unknown:
+        raise ValueError(
+            f"Unsupported recurrence rule parts: {', '.join(sorted(unknown))}"
+        )
+    freq = fields.get("FREQ")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}.")
+    try:
+        interval = int(fields.get("INTERVAL", "1"))
+        by_day = (
+            tuple(sorted({WEEKDAYS.index(day) for day in fields["BYDAY"].split(",")}))
+            if "BYDAY" in fields
+            else ()
+        )
+        by_month = int(fields["BYMONTH"]) if "BYMONTH" in fields else None
+        by_month_day = int(fields["BYMONTHDAY"]) if "BYMONTHDAY" in fields else None
+        until = (
+            datetime.strptime(fields["UNTIL"][:8], "%Y%m%d").date()
+            if "UNTIL" in fields
+            else None
+        )
+    except ValueError:
+        raise ValueError(f"Malformed recurrence rule: {text!r}") from None
+    if not 1 <= interval <= 366:
+        raise ValueError("INTERVAL must be between 1 and 366.")
+    if by_day and freq != "WEEKLY":
+        raise ValueError("BYDAY is only supported with FREQ=WEEKLY.")
+    if by_month is not None and (freq != "YEARLY" or not 1 <= by_month <= 12):
+        raise ValueError("BYMONTH must be 1-12 and needs FREQ=YEARLY.")
+    if by_month_day is not None and (
+        freq not in ("MONTHLY", "YEARLY") or not 1 <= by_month_day <= 31
+    ):
+        raise ValueError("BYMONTHDAY must be 1-31 and needs FREQ=MONTHLY or YEARLY.")
+    return RecurrenceRule(freq, interval, by_day, by_month, by_month_day, until)
+
+
+def normalize_rule(text: str) -> str:
+    """The rule in canonical form; raises ValueError if unsupported."""
+    return str(parse_rule(text))
+
+
+def anchor_rule(text: str, due_date: Optional[date]) -> str:
+    """Pins MONTHLY and YEARLY rules to the due date unless they name a day."""
+    rule = parse_rule(text)
+    if due_date is not None and rule.freq in ("MONTHLY", "YEARLY"):
+        if rule.by_month_day is None:
+            rule = replace(rule, by_month_day=due_date.day)
+        if rule.freq == "YEARLY" and rule.by_month is None:
+            rule = replace(rule, by_month=due_date.month)
+    return str(rule)
+
+
+def unanchored_rule(text: str) -> str:
+    """The rule without the day `anchor_rule` added, to match form presets."""
+    return str(replace(parse_rule(text), by_month=None, by_month_day=None))
+
+
+def _month_day(year: int, month: int, day: int) -> date:
+    """`day` of the month, or its last day if the month is shorter."""
+    year, month = divmod(year * 12 + month - 1, 12)
+    return date(year, month + 1, min(day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _step(rule: RecurrenceRule, after: date) -> date:
+    """The first occurrence after `after`, itself taken to be an occurrence."""
+    if rule.freq == "DAILY":
+        return after + timedelta(days=rule.interval)
+    if rule.freq == "WEEKLY":
+        if not rule.by_day:
+            return after + timedelta(weeks=rule.interval)
+        later = [day for day in rule.by_day if day > after.weekday()]
+        if later:
+            return after + timedelta(days=later[0] - after.weekday())
+        monday = after - timedelta(days=after.weekday())
+        return monday + timedelta(weeks=rule.interval, days=rule.by_day[0])
+    if rule.freq == "MONTHLY":
+        return _month_day(
+            after.year, after.month + rule.interval, rule.by_month_day or after.day
+        )
+    return _month_day(
+        after.year + rule.interval,
+        rule.by_month or after.month,
+        rule.by_month_day or after.day,
+    )
+
+
+def next_occurrence(
+    text: str, after: date, not_before: Optional[date] = None
+) -> Optional[date]:
+    """
+    The first occurrence after `after` and, skipping any missed ones, on or
+    after `not_before`. None once the rule has ended (UNTIL).
+    """
+    rule = parse_rule(text)
+    occurrence = _step(rule, after)
+    if not_before is not None and occurrence < not_before:
+        if rule.freq == "DAILY" or (rule.freq == "WEEKLY" and not rule.by_day):
+            period = rule.interval * (1 if rule.freq == "DAILY" else 7)
+            periods = -(-(not_before - occurrence).days // period)
+            occurrence += timedelta(days=periods * period)
+        while occurrence < not_before:
+            occurrence = _step(rule, occurrence)
+    if rule.until is not None and occurrence > rule.until:
+        return None
+    return occurrence
+
+
+def occurrence_start(day: date) -> datetime:
+    """Start of a due date in the server's time zone, the one date.today() uses."""
+    return datetime.combine(day, time.min).astimezone()
+
+
+def describe_rule(text: Optional[str]) -> Optional[str]:
+    """Short label for the todo list, e.g. "Every 2 weeks on Mon, Thu"."""
+    if not text:
+        return None
+    rule = parse_rule(text)
+    if rule.interval == 1:
+        label = rule.freq.capitalize()
+    else:
+        label = f"Every {rule.interval} {_UNITS[rule.freq]}s"
+    if rule.by_day == WORKWEEK and rule.interval == 1:
+        label = "Every weekday"
+    elif rule.by_day:
+        label += " on " + ", ".join(calendar.day_abbr[day] for day in rule.by_day)
+    if rule.until is not None:
+        label += f" until {rule.until:%b %d, %Y}"
+    return label
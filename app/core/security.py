@@ -1,18 +1,75 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def build_crypt_context(
+    schemes: List[str],
+    bcrypt_rounds: int = 12,
+    argon2_time_cost: int = 3,
+    argon2_memory_cost_kib: int = 65536,
+    argon2_parallelism: int = 1,
+) -> CryptContext:
+    """
+    Hashes with the first scheme and marks every other scheme as deprecated.
+    Desired costs are pinned on both sides, so hashes made with different
+    costs also report `needs_update` and get rehashed after a login.
+    """
+    options = {"schemes": schemes, "deprecated": "auto"}
+    if "bcrypt" in schemes:
+        options.update(
+            bcrypt__rounds=bcrypt_rounds,
+            bcrypt__min_desired_rounds=bcrypt_rounds,
+            bcrypt__max_desired_rounds=bcrypt_rounds,
+        )
+    if "argon2" in schemes:
+        # Requires the optional argon2-cffi package.
+        options.update(
+            argon2__rounds=argon2_time_cost,
+            argon2__min_desired_rounds=argon2_time_cost,
+            argon2__max_desired_rounds=argon2_time_cost,
+            argon2__memory_cost=argon2_memory_cost_kib,
+            argon2__parallelism=argon2_parallelism,
+        )
+    return CryptContext(**options)
+
+
+pwd_context = build_crypt_context(
+    settings.PASSWORD_SCHEMES,
+    bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    argon2_time_cost=settings.PASSWORD_ARGON2_TIME_COST,
+    argon2_memory_cost_kib=settings.PASSWORD_ARGON2_MEMORY_COST_KIB,
+    argon2_parallelism=settings.PASSWORD_ARGON2_PARALLELISM,
+)
+
+# Version 3 tokens carry the user id and token generation, so protected routes
+# can authenticate without a database query. Only active users are issued one.
+TOKEN_VERSION = 3
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verifies the password and, if the hash is outdated, returns a new one."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def dummy_verify_password() -> bool:
+    """Takes as long as a real verify; used when the email is unknown."""
+    return pwd_context.dummy_verify()
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -32,15 +89,112 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def decode_access_token(token: str) -> Optional[str]:
-    """Decodes token and returns subject (e.g., username or user ID) or None if invalid."""
+class VerifiedTokenCache:
+    """
+    Bounded LRU of tokens whose signature has already been verified, keyed by
+    a SHA-256 of the token and holding the decoded claims until `exp`.
+    Only valid tokens are stored, and entries are dropped once expired.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, claims = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict) -> None:
+        if self.maxsize <= 0 or "exp" not in claims:
+            return
+        key = self._key(token)
+        self._entries[key] = (float(claims["exp"]), claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def decode_access_token_claims(
+    token: str, cache: Optional[VerifiedTokenCache] = None
+) -> Optional[dict]:
+    """
+    Verifies the token and returns its claims, or None if invalid or expired.
+    With a `cache`, tokens verified before skip the signature check.
+    """
+    if cache is not None:
+        cached = cache.get(token)
+        if cached is not None:
+            return dict(cached)
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
-        subject: Optional[str] = payload.get("sub")
-        if subject is None:
-            return None
-        return subject
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    if cache is not None:
+        cache.put(token, payload)
+    return dict(payload)
+
+
+def decode_access_token(
+    token: str, cache: Optional[VerifiedTokenCache] = None
+) -> Optional[str]:
+    """Decodes token and returns subject (e.g., username or user ID) or None if invalid."""
+    claims = decode_access_token_claims(token, cache)
+    if claims is None:
+        return None
+    return claims["sub"]
+
+
+class TokenGenerationTable:
+    """
+    In-memory map of user id -> token generation, used to revoke stateless
+    tokens. Only users whose tokens were ever revoked (generation > 0) are
+    stored, so the table stays small; everyone else is implicitly 0.
+    """
+
+    def __init__(self):
+        self._generations: dict[int, int] = {}
+
+    def get(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def set(self, user_id: int, generation: int) -> None:
+        self._generations[user_id] = generation
+
+    def merge(self, entries: Iterable[Tuple[int, int]]) -> None:
+        """
+        Folds in generations loaded from the database. Generations only ever
+        grow, so the higher value wins: a revocation applied with `set()`
+        while the load was in flight is not rolled back by an older snapshot.
+        """
+        generations = self._generations
+        for user_id, generation in entries:
+            if generation > generations.get(user_id, 0):
+                generations[user_id] = generation
+
+    def __len__(self) -> int:
+        return len(self._generations)
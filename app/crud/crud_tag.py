@@ -0,0 +1,200 @@
+from typing import Dict, List, Sequence
+
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.db.models import Tag, TodoTag
+from app.db.sharding import shard_router
+
+
+def tagged_todo_ids(owner_id: int, tag_names: Sequence[str], match_all: bool):
+    """
+    Subquery of the owner's todo ids carrying any (or, with `match_all`,
+    every one) of `tag_names`. Resolves the names through ix_tags_owner_id_name
+    and reads only those tags' entries of ix_todo_tags_tag_id_todo_id.
+    """
+    stmt = (
+        select(TodoTag.todo_id)
+        .join(Tag, Tag.id == TodoTag.tag_id)
+        .filter(Tag.owner_id == owner_id, Tag.name.in_(tag_names))
+    )
+    if match_all:
+        stmt = stmt.group_by(TodoTag.todo_id).having(
+            func.count() == len(set(tag_names))
+        )
+    return stmt
+
+
+async def get_tags_by_owner(db: AsyncSession, owner_id: int) -> List[Tag]:
+    """The owner's tags in use, by name, with their precomputed counts."""
+    result = await db.execute(
+        select(Tag)
+        .filter(Tag.owner_id == owner_id, Tag.todo_count > 0)
+        .order_by(Tag.name),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return result.scalars().all()
+
+
+async def get_tags_for_todos(
+    db: AsyncSession, owner_id: int, todo_ids: Sequence[int]
+) -> Dict[int, List[str]]:
+    """Tag names of every todo in `todo_ids`, read with one IN query."""
+    if not todo_ids:
+        return {}
+    result = await db.execute(
+        select(TodoTag.todo_id, Tag.name)
+        .join(Tag, Tag.id == TodoTag.tag_id)
+        .filter(TodoTag.owner_id == owner_id, TodoTag.todo_id.in_(todo_ids))
+        .order_by(Tag.name),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    tags: Dict[int, List[str]] = {}
+    for todo_id, name in result:
+        tags.setdefault(todo_id, []).append(name)
+    return tags
+
+
+async def _get_or_create_tag_ids(
+    db: AsyncSession, owner_id: int, tag_names: Sequence[str]
+) -> Dict[str, int]:
+    bind_arguments = shard_router.bind_arguments(owner_id)
+    result = await db.execute(
+        insert(Tag)
+        .values([{"owner_id": owner_id, "name": name} for name in tag_names])
+        .on_conflict_do_nothing(index_elements=["owner_id", "name"])
+        .returning(Tag.name, Tag.id),
+        bind_arguments=bind_arguments,
+    )
+    tag_ids = dict(result.all())
+    existing = [name for name in tag_names if name not in tag_ids]
+    if existing:
+        result = await db.execute(
+            select(Tag.name, Tag.id).filter(
+                Tag.owner_id == owner_id, Tag.name.in_(existing)
+            ),
+            bind_arguments=bind_arguments,
+        )
+        tag_ids.update(result.all())
+    return tag_ids
+
+
+async def adjust_tag_counts(
+    db: AsyncSession, owner_id: int, delta: Dict[int, int]
+) -> None:
+    """Adds `delta` (tag id -> change) to the tags' counts in one UPDATE."""
+    delta = {tag_id: value for tag_id, value in delta.items() if value}
+    if not delta:
+        return
+    await db.execute(
+        update(Tag)
+        .where(Tag.owner_id == owner_id, Tag.id.in_(delta))
+        .values(todo_count=Tag.todo_count + case(delta, value=Tag.id))
+        .execution_options(synchronize_session=False),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+
+
+async def set_todo_tags(
+    db: AsyncSession, *, owner_id: int, todo_id: int, tag_names: Sequence[str]
+) -> None:
+    """
+    Makes `tag_names` the todo's tags, creating missing tags, and moves the
+    counts of the tags added or removed. Only the difference is written.
+    """
+    bind_arguments = shard_router.bind_arguments(owner_id)
+    result = await db.execute(
+        select(TodoTag.tag_id).filter(
+            TodoTag.owner_id == owner_id, TodoTag.todo_id == todo_id
+        ),
+        bind_arguments=bind_arguments,
+    )
+    current = set(result.scalars().all())
+    wanted = (
+        set((await _get_or_create_tag_ids(db, owner_id, tag_names)).values())
+        if tag_names
+        else set()
+    )
+
+    added, removed = wanted - current, current - wanted
+    if removed:
+        await db.execute(
+            delete(TodoTag).where(
+                TodoTag.owner_id == owner_id,
+                TodoTag.todo_id == todo_id,
+                TodoTag.tag_id.in_(removed),
+            ),
+            bind_arguments=bind_arguments,
+        )
+    if added:
+        await db.execute(
+            insert(TodoTag).values(
+                [
+                    {"todo_id": todo_id, "tag_id": tag_id, "owner_id": owner_id}
+                    for tag_id in added
+                ]
+            ),
+            bind_arguments=bind_arguments,
+        )
+    await adjust_tag_counts(
+        db, owner_id, {**{t: 1 for t in added}, **{t: -1 for t in removed}}
+    )
+
+
+async def adjust_counts_for_todos(
+    db: AsyncSession, *, owner_id: int, todo_ids: Sequence[int], delta: int
+) -> None:
+    """
+    Moves each tag's count by `delta` for every todo in `todo_ids` carrying
+    it, in one UPDATE (soft delete / undo).
+    """
+    per_tag = (
+        select(TodoTag.tag_id, func.count().label("todos"))
+        .filter(TodoTag.owner_id == owner_id, TodoTag.todo_id.in_(todo_ids))
+        .group_by(TodoTag.tag_id)
+        .subquery()
+    )
+    await db.execute(
+        update(Tag)
+        .where(Tag.owner_id == owner_id, Tag.id == per_tag.c.tag_id)
+        .values(todo_count=Tag.todo_count + delta * per_tag.c.todos)
+        .execution_options(synchronize_session=False),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+
+
+async def copy_todo_tags(
+    db: AsyncSession, *, shard_id: str, copies: Dict[int, int]
+) -> None:
+    """
+    Gives each new todo in `copies` (source todo id -> new todo id, any
+    owners on the shard) the tags of its source, in one INSERT.
+    """
+    if not copies:
+        return
+    bind_arguments = shard_router.shard_bind_arguments(shard_id)
+    result = await db.execute(
+        select(TodoTag.todo_id, TodoTag.tag_id, TodoTag.owner_id).filter(
+            TodoTag.todo_id.in_(copies)
+        ),
+        bind_arguments=bind_arguments,
+    )
+    rows = [
+        {"todo_id": copies[todo_id], "tag_id": tag_id, "owner_id": owner_id}
+        for todo_id, tag_id, owner_id in result
+    ]
+    if not rows:
+        return
+    await db.execute(insert(TodoTag).values(rows), bind_arguments=bind_arguments)
+    added: Dict[int, int] = {}
+    for row in rows:
+        added[row["tag_id"]] = added.get(row["tag_id"], 0) + 1
+    await db.execute(
+        update(Tag)
+        .where(Tag.id.in_(added))
+        .values(todo_count=Tag.todo_count + case(added, value=Tag.id))
+        .execution_options(synchronize_session=False),
+        bind_arguments=bind_arguments,
+    )
@@ -1,15 +1,42 @@
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
-from sqlalchemy import update, delete, asc, desc, or_
+from sqlalchemy import (
+    update,
+    asc,
+    desc,
+    or_,
+    case,
+    exists,
+    func,
+    literal,
+    tuple_,
+    Select,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.exc import StaleDataError
 
-from app.db.models import Todo
+from app.core.invalidation import invalidation_bus
+from app.core.recurrence import anchor_rule, next_occurrence, occurrence_start
+from app.crud import crud_tag, crud_todo_stats
+from app.db.models import Todo, TodoArchive
+from app.db.sharding import shard_router
 from app.schemas.todo import TodoCreate, TodoUpdate
 
+# sort option -> (column name, descending)
+TODO_SORT_COLUMNS = {
+    "created_at": ("created_at", True),
+    "created_at_asc": ("created_at", False),
+    "due_date_asc": ("due_date", False),
+    "due_date_desc": ("due_date", True),
+    "priority_asc": ("priority", False),
+    "priority_desc": ("priority", True),
+}
 
-async def get_todos_by_owner(
-    db: AsyncSession,
+
+def build_todos_query(
     owner_id: int,
     skip: int = 0,
     limit: int = 100,
@@ -17,55 +44,320 @@ async def get_todos_by_owner(
     filter_priority: Optional[int] = None,
     sort_by: str = "created_at",
     search_term: Optional[str] = None,
-) -> List[Todo]:
+    tag_names: Sequence[str] = (),
+    match_all_tags: bool = True,
+    roots_only: bool = False,
+    model=Todo,
+) -> Select:
     """
-    Get todos for a specific owner with filtering, sorting, and searching.
+    Build the list query used by get_todos_by_owner.
+    Kept separate so benchmarks and query plan tests can inspect the exact statement.
+    `model` may be TodoArchive to run the same filters against the archive.
+    `tag_names` keeps todos carrying all of them, or any with `match_all_tags` off.
+    `roots_only` skips subtasks.
     """
-    stmt = select(Todo).filter(Todo.owner_id == owner_id)
+    stmt = select(model).filter(model.owner_id == owner_id)
+    if model is Todo:
+        # Archived rows are never soft-deleted.
+        stmt = stmt.filter(Todo.deleted_at.is_(None))
+    if roots_only:
+        stmt = stmt.filter(model.parent_id.is_(None))
 
     if filter_status:
-        stmt = stmt.filter(Todo.status == filter_status)
+        stmt = stmt.filter(model.status == filter_status)
     if filter_priority is not None:
-        stmt = stmt.filter(Todo.priority == filter_priority)
+        stmt = stmt.filter(model.priority == filter_priority)
 
     if search_term:
         search_pattern = f"%{search_term}%"
         stmt = stmt.filter(
             or_(
-                Todo.title.ilike(search_pattern), Todo.description.ilike(search_pattern)
+                model.title.ilike(search_pattern),
+                model.description.ilike(search_pattern),
             )
         )
+    if tag_names:
+        stmt = stmt.filter(
+            model.id.in_(crud_tag.tagged_todo_ids(owner_id, tag_names, match_all_tags))
+        )
+
+    column_name, descending = TODO_SORT_COLUMNS.get(
+        sort_by, TODO_SORT_COLUMNS["created_at"]
+    )
+    sort_direction = desc if descending else asc
+    stmt = stmt.order_by(sort_direction(getattr(model, column_name)))
+
+    return stmt.offset(skip).limit(limit)
+
+
+def build_todo_tree_query(
+    roots: Select, owner_id: int, max_depth: int, sort_by: str = "created_at"
+) -> Select:
+    """
+    Wraps `roots` (a select of todos, e.g. a page from build_todos_query or a
+    single todo) in one recursive CTE that also returns every subtask below
+    them, at most `max_depth` levels in all, through ix_todos_owner_id_parent_id.
+    Rows are (todo, depth, root_id), one level after another, each level in
+    `sort_by` order.
+    """
+    # Selected from as a subquery: SQLite rejects a parenthesized anchor with
+    # its own ORDER BY / LIMIT, and PostgreSQL plans both forms the same way.
+    page = aliased(Todo, roots.subquery("roots"), name="page")
+    tree = select(page, literal(0).label("depth"), page.id.label("root_id")).cte(
+        "todo_tree", recursive=True
+    )
+    child = aliased(Todo, name="child")
+    tree = tree.union_all(
+        select(child, tree.c.depth + 1, tree.c.root_id)
+        .join(tree, child.parent_id == tree.c.id)
+        .filter(
+            child.owner_id == owner_id,
+            child.deleted_at.is_(None),
+            tree.c.depth < max_depth - 1,
+        )
+    )
+    node = aliased(Todo, tree, name="node")
+    column_name, descending = TODO_SORT_COLUMNS.get(
+        sort_by, TODO_SORT_COLUMNS["created_at"]
+    )
+    sort_direction = desc if descending else asc
+    return select(node, tree.c.depth, tree.c.root_id).order_by(
+        tree.c.depth, sort_direction(getattr(node, column_name))
+    )
+
 
-    sort_column = Todo.created_at
-    sort_direction = desc
+def _sort_key(column_name: str):
+    # PostgreSQL sorts NULLs as larger than any value.
+    def key(todo):
+        value = getattr(todo, column_name)
+        return (value is None, value if value is not None else 0)
 
-    if sort_by == "due_date_asc":
-        sort_column = Todo.due_date
-        sort_direction = asc
-    elif sort_by == "due_date_desc":
-        sort_column = Todo.due_date
-        sort_direction = desc
-    elif sort_by == "priority_asc":
-        sort_column = Todo.priority
-        sort_direction = asc
-    elif sort_by == "priority_desc":
-        sort_column = Todo.priority
-        sort_direction = desc
-    elif sort_by == "created_at_asc":
-        sort_column = Todo.created_at
-        sort_direction = asc
+    return key
 
-    stmt = stmt.order_by(sort_direction(sort_column))
 
-    stmt = stmt.offset(skip).limit(limit)
+async def get_todos_by_owner(
+    db: AsyncSession,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    filter_status: Optional[str] = None,
+    filter_priority: Optional[int] = None,
+    sort_by: str = "created_at",
+    search_term: Optional[str] = None,
+    tag_names: Sequence[str] = (),
+    match_all_tags: bool = True,
+    include_archived: bool = False,
+    max_depth: int = 1,
+) -> List[Union[Todo, TodoArchive]]:
+    """
+    Get todos for a specific owner with filtering, sorting, and searching.
+    Filters pick a page of top-level todos; their subtasks (up to
+    `max_depth` levels in all) follow the page, loaded by the same query.
+    Archived todos are only read when `include_archived` is set; they are
+    merged into the page in the requested order, subtasks or not.
+    """
+    query_args = dict(
+        owner_id=owner_id,
+        filter_status=filter_status,
+        filter_priority=filter_priority,
+        sort_by=sort_by,
+        search_term=search_term,
+        tag_names=tag_names,
+        match_all_tags=match_all_tags,
+    )
+    bind_arguments = shard_router.bind_arguments(owner_id)
+    if not include_archived:
+        roots = build_todos_query(skip=skip, limit=limit, roots_only=True, **query_args)
+        result = await db.execute(
+            build_todo_tree_query(roots, owner_id, max_depth, sort_by),
+            bind_arguments=bind_arguments,
+        )
+        return [todo for todo, _, _ in result]
+
+    # Each table returns its first skip + limit rows; the page is cut from the merge.
+    roots = build_todos_query(limit=skip + limit, roots_only=True, **query_args)
+    result = await db.execute(
+        build_todo_tree_query(roots, owner_id, max_depth, sort_by),
+        bind_arguments=bind_arguments,
+    )
+    tree = result.all()
+    todos = [todo for todo, depth, _ in tree if depth == 0]
+    result = await db.execute(
+        build_todos_query(limit=skip + limit, model=TodoArchive, **query_args),
+        bind_arguments=bind_arguments,
+    )
+    todos.extend(result.scalars().all())
+    column_name, descending = TODO_SORT_COLUMNS.get(
+        sort_by, TODO_SORT_COLUMNS["created_at"]
+    )
+    todos.sort(key=_sort_key(column_name), reverse=descending)
+    page = todos[skip : skip + limit]
+    shown = {todo.id for todo in page}
+    return page + [
+        todo for todo, depth, root_id in tree if depth > 0 and root_id in shown
+    ]
+
+
+def build_todo_changes_query(
+    owner_id: int,
+    since: Optional[int] = None,
+    since_id: int = 0,
+    limit: int = 500,
+) -> Select:
+    """
+    Build the sync query used by get_todo_changes: the owner's todos changed
+    after the (since, since_id) high-water mark, oldest first, read in
+    (change_seq, id) order from ix_todos_owner_id_change_seq_id. Without a
+    high-water mark this is a full download, so deleted rows are skipped.
+    """
+    stmt = select(Todo).filter(Todo.owner_id == owner_id)
+    if since is None:
+        stmt = stmt.filter(Todo.deleted_at.is_(None))
+    else:
+        stmt = stmt.filter(tuple_(Todo.change_seq, Todo.id) > tuple_(since, since_id))
+    return stmt.order_by(Todo.change_seq, Todo.id).limit(limit)
 
-    result = await db.execute(stmt)
+
+async def get_todo_changes(
+    db: AsyncSession,
+    owner_id: int,
+    since: Optional[int] = None,
+    since_id: int = 0,
+    limit: int = 500,
+) -> List[Todo]:
+    """Changed todos for sync, including soft-deleted ones (deleted_at set)."""
+    result = await db.execute(
+        build_todo_changes_query(owner_id, since, since_id, limit),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
     return result.scalars().all()
 
 
+async def get_todo_subtree(
+    db: AsyncSession, todo_id: int, owner_id: int, max_depth: int
+) -> List[Todo]:
+    """The todo's subtasks at every level below it, in one query."""
+    roots = select(Todo).filter(
+        Todo.id == todo_id, Todo.owner_id == owner_id, Todo.deleted_at.is_(None)
+    )
+    result = await db.execute(
+        build_todo_tree_query(roots, owner_id, max_depth, "created_at_asc"),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return [todo for todo, depth, _ in result if depth > 0]
+
+
+async def get_todo_depth(db: AsyncSession, todo_id: int, owner_id: int) -> int:
+    """Level of the todo in its tree (1 at the top), walking up its parents."""
+    ancestors = (
+        select(Todo.id, Todo.parent_id, literal(1).label("depth"))
+        .filter(Todo.id == todo_id, Todo.owner_id == owner_id)
+        .cte("ancestors", recursive=True)
+    )
+    parent = aliased(Todo, name="parent")
+    ancestors = ancestors.union_all(
+        select(parent.id, parent.parent_id, ancestors.c.depth + 1)
+        .join(ancestors, parent.id == ancestors.c.parent_id)
+        .filter(parent.owner_id == owner_id)
+    )
+    result = await db.execute(
+        select(func.max(ancestors.c.depth)),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return result.scalar() or 0
+
+
+def subtask_rollup(status: str) -> Tuple[int, int]:
+    """(subtask_count, subtasks_done) one subtask with this status accounts for."""
+    return 1, int(status == "Done")
+
+
+async def apply_subtask_rollups(
+    db: AsyncSession, owner_id: int, deltas: Dict[int, Tuple[int, int]]
+) -> int:
+    """
+    Adds (subtask_count, subtasks_done) deltas to parent todos in one UPDATE.
+    Leaves version and updated_at alone, so a roll-up change never makes an
+    open edit form of the parent stale. Skips deleted parents; returns how
+    many were updated.
+    """
+    deltas = {parent_id: delta for parent_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return 0
+    result = await db.execute(
+        update(Todo)
+        .where(
+            Todo.owner_id == owner_id,
+            Todo.id.in_(deltas),
+            Todo.deleted_at.is_(None),
+        )
+        .values(
+            subtask_count=Todo.subtask_count
+            + case({i: d[0] for i, d in deltas.items()}, value=Todo.id, else_=0),
+            subtasks_done=Todo.subtasks_done
+            + case({i: d[1] for i, d in deltas.items()}, value=Todo.id, else_=0),
+            updated_at=Todo.updated_at,
+        )
+        .execution_options(synchronize_session=False),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return result.rowcount
+
+
+async def _stamp_changes(
+    db: AsyncSession, owner_id: int, todo_ids: Sequence[int], change_seq: int
+) -> None:
+    """
+    Stamps the change sequence number the write took (record_todo_change)
+    on the todos it changed, for sync. Runs last, on rows the write has
+    already locked, and leaves updated_at alone like the roll-ups do.
+    """
+    await db.execute(
+        update(Todo)
+        .where(Todo.owner_id == owner_id, Todo.id.in_(set(todo_ids)))
+        .values(change_seq=change_seq, updated_at=Todo.updated_at)
+        .execution_options(synchronize_session=False),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+
+
+async def touch_todo(db: AsyncSession, *, owner_id: int, todo_id: int) -> None:
+    """
+    Records a change that leaves the todo's own columns alone (its tags), so
+    sync sends it again. Locks the todo first, in the same order as the
+    other writes.
+    """
+    await db.execute(
+        select(Todo.id)
+        .filter(Todo.id == todo_id, Todo.owner_id == owner_id)
+        .with_for_update(),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    change_seq = await crud_todo_stats.record_todo_change(db, owner_id, {})
+    await _stamp_changes(db, owner_id, [todo_id], change_seq)
+
+
+def recurrence_fields(rule: Optional[str], due_date: Optional[date]) -> Dict[str, Any]:
+    """
+    Column values for repeating a todo due on `due_date` by `rule`: the rule
+    anchored to that date, and when its next occurrence starts. Both None
+    when it does not repeat (any more).
+    """
+    following = None
+    if rule and due_date is not None:
+        rule = anchor_rule(rule, due_date)
+        following = next_occurrence(rule, due_date)
+    if following is None:
+        return {"recurrence_rule": None, "recurrence_next_at": None}
+    return {"recurrence_rule": rule, "recurrence_next_at": occurrence_start(following)}
+
+
 async def get_todo(db: AsyncSession, todo_id: int, owner_id: int) -> Optional[Todo]:
     result = await db.execute(
-        select(Todo).filter(Todo.id == todo_id, Todo.owner_id == owner_id)
+        select(Todo).filter(
+            Todo.id == todo_id, Todo.owner_id == owner_id, Todo.deleted_at.is_(None)
+        ),
+        bind_arguments=shard_router.bind_arguments(owner_id),
     )
     return result.scalars().first()
 
@@ -77,43 +369,446 @@ async def create_todo(
     owner_id: int,
     photo_filename: Optional[str] = None,
 ) -> Todo:
+    """
+    Inserts the todo. A subtask then bumps its parent's roll-up, after the
+    stats row like every other write, so the two locks are always taken in
+    the same order. Raises StaleDataError if the parent has been deleted;
+    the caller must roll back.
+    """
     db_todo = Todo(
         **todo_in.model_dump(), owner_id=owner_id, photo_filename=photo_filename
     )
+    if db_todo.recurrence_rule:
+        for column, value in recurrence_fields(
+            db_todo.recurrence_rule, db_todo.due_date
+        ).items():
+            setattr(db_todo, column, value)
+        invalidation_bus.publish_after_commit(db, "recurrence", owner_id)
     db.add(db_todo)
+    # eager_defaults: the INSERT returns id and server defaults, no refresh needed.
     await db.flush()
-    await db.refresh(db_todo)
+    today = date.today()
+    change_seq = await crud_todo_stats.record_todo_change(
+        db, owner_id, crud_todo_stats.contribution_of(db_todo, today), today
+    )
+    changed_ids = [db_todo.id]
+    if db_todo.parent_id is not None:
+        updated = await apply_subtask_rollups(
+            db, owner_id, {db_todo.parent_id: subtask_rollup(db_todo.status)}
+        )
+        if not updated:
+            raise StaleDataError(f"Parent todo {db_todo.parent_id} was deleted")
+        changed_ids.append(db_todo.parent_id)
+    await _stamp_changes(db, owner_id, changed_ids, change_seq)
     return db_todo
 
 
-async def update_todo(db: AsyncSession, *, db_todo: Todo, todo_in: TodoUpdate) -> Todo:
+async def update_todo(
+    db: AsyncSession,
+    *,
+    db_todo: Todo,
+    todo_in: TodoUpdate,
+    expected_version: Optional[int] = None,
+) -> Todo:
+    """
+    Applies the update in one UPDATE ... RETURNING round trip, guarded by the
+    version the caller saw (`expected_version`, e.g. from the edit form) or,
+    failing that, the version loaded in this request.
+    Raises StaleDataError if the todo changed in the meantime.
+    """
     update_data = todo_in.model_dump(exclude_unset=True)
     if not update_data:
         return db_todo
+    if expected_version is not None and expected_version != db_todo.version:
+        raise StaleDataError(
+            f"Todo {db_todo.id} is at version {db_todo.version}, not {expected_version}"
+        )
+    today = date.today()
+    before = crud_todo_stats.contribution_of(db_todo, today)
+    rollup_before = subtask_rollup(db_todo.status)
+    next_at_before = db_todo.recurrence_next_at
+    if "recurrence_rule" in update_data or "due_date" in update_data:
+        update_data.update(
+            recurrence_fields(
+                update_data.get("recurrence_rule", db_todo.recurrence_rule),
+                update_data.get("due_date", db_todo.due_date),
+            )
+        )
 
     stmt = (
         update(Todo)
-        .where(Todo.id == db_todo.id, Todo.owner_id == db_todo.owner_id)
-        .values(**update_data)
-        .execution_options(synchronize_session="fetch")
+        .where(
+            Todo.id == db_todo.id,
+            Todo.owner_id == db_todo.owner_id,
+            Todo.version == db_todo.version,
+            Todo.deleted_at.is_(None),
+        )
+        .values(**update_data, version=Todo.version + 1)
+        .returning(Todo)
+        .execution_options(synchronize_session=False, populate_existing=True)
     )
-    await db.execute(stmt)
+    result = await db.execute(
+        stmt, bind_arguments=shard_router.bind_arguments(db_todo.owner_id)
+    )
+    updated_todo = result.scalars().first()
+    if updated_todo is None:
+        raise StaleDataError(f"Todo {db_todo.id} was modified concurrently")
 
-    await db.flush()
+    change_seq = await crud_todo_stats.record_todo_change(
+        db,
+        updated_todo.owner_id,
+        crud_todo_stats.diff_contributions(
+            before, crud_todo_stats.contribution_of(updated_todo, today)
+        ),
+        today,
+    )
+    changed_ids = [updated_todo.id]
+    if updated_todo.parent_id is not None:
+        rollup_after = subtask_rollup(updated_todo.status)
+        if await apply_subtask_rollups(
+            db,
+            updated_todo.owner_id,
+            {updated_todo.parent_id: (0, rollup_after[1] - rollup_before[1])},
+        ):
+            changed_ids.append(updated_todo.parent_id)
+    await _stamp_changes(db, updated_todo.owner_id, changed_ids, change_seq)
+    if updated_todo.recurrence_next_at != next_at_before:
+        invalidation_bus.publish_after_commit(db, "recurrence", updated_todo.owner_id)
+    return updated_todo
+
+
+async def update_todo_statuses(
+    db: AsyncSession,
+    *,
+    owner_id: int,
+    changes: Dict[int, Tuple[str, Optional[int]]],
+) -> List[int]:
+    """
+    Applies many status changes for one owner with one locking SELECT and
+    one UPDATE. `changes` maps todo id to (new status, expected version).
+    Todos that are gone, already have the status, or moved past the expected
+    version are skipped. Returns the ids that were updated.
+    """
+    bind_arguments = shard_router.bind_arguments(owner_id)
+    result = await db.execute(
+        select(
+            Todo.id,
+            Todo.status,
+            Todo.priority,
+            Todo.due_date,
+            Todo.version,
+            Todo.parent_id,
+        )
+        .filter(
+            Todo.owner_id == owner_id,
+            Todo.id.in_(changes),
+            Todo.deleted_at.is_(None),
+        )
+        .with_for_update(),
+        bind_arguments=bind_arguments,
+    )
+    today = date.today()
+    new_statuses: Dict[int, str] = {}
+    delta: Dict[str, int] = {}
+    rollups: Dict[int, Tuple[int, int]] = {}
+    for row in result:
+        new_status, expected_version = changes[row.id]
+        if row.status == new_status or (
+            expected_version is not None and expected_version != row.version
+        ):
+            continue
+        new_statuses[row.id] = new_status
+        for column, value in crud_todo_stats.diff_contributions(
+            crud_todo_stats.todo_contribution(
+                row.status, row.priority, row.due_date, today
+            ),
+            crud_todo_stats.todo_contribution(
+                new_status, row.priority, row.due_date, today
+            ),
+        ).items():
+            delta[column] = delta.get(column, 0) + value
+        if row.parent_id is not None:
+            done_delta = subtask_rollup(new_status)[1] - subtask_rollup(row.status)[1]
+            rollups[row.parent_id] = (
+                0,
+                rollups.get(row.parent_id, (0, 0))[1] + done_delta,
+            )
+    if not new_statuses:
+        return []
+
+    await db.execute(
+        update(Todo)
+        .where(Todo.owner_id == owner_id, Todo.id.in_(new_statuses))
+        .values(
+            status=case(new_statuses, value=Todo.id),
+            version=Todo.version + 1,
+        )
+        .execution_options(synchronize_session=False),
+        bind_arguments=bind_arguments,
+    )
+    change_seq = await crud_todo_stats.record_todo_change(db, owner_id, delta, today)
+    await apply_subtask_rollups(db, owner_id, rollups)
+    await _stamp_changes(
+        db,
+        owner_id,
+        [*new_statuses, *(parent_id for parent_id, d in rollups.items() if any(d))],
+        change_seq,
+    )
+    return list(new_statuses)
+
+
+def _subtree_ids(owner_id: int, todo_id: int, deleted: bool) -> Select:
+    """
+    Ids of the todo and of the subtasks a delete (or its undo) applies to.
+    Deleting takes every live subtask. Undoing takes back only the subtasks
+    deleted together with the todo, and only while the todo's parent is live.
+    """
+    anchor = select(Todo.id, Todo.deleted_at).filter(
+        Todo.id == todo_id, Todo.owner_id == owner_id
+    )
+    if deleted:
+        anchor = anchor.filter(Todo.deleted_at.is_(None))
+    else:
+        parent = aliased(Todo, name="parent")
+        anchor = anchor.filter(
+            Todo.deleted_at.is_not(None),
+            or_(
+                Todo.parent_id.is_(None),
+                exists().where(
+                    parent.id == Todo.parent_id,
+                    parent.owner_id == owner_id,
+                    parent.deleted_at.is_(None),
+                ),
+            ),
+        )
+    subtree = anchor.cte("subtree", recursive=True)
+    child = aliased(Todo, name="child")
+    subtree = subtree.union_all(
+        select(child.id, child.deleted_at)
+        .join(subtree, child.parent_id == subtree.c.id)
+        .filter(
+            child.owner_id == owner_id,
+            (
+                child.deleted_at.is_(None)
+                if deleted
+                else child.deleted_at == subtree.c.deleted_at
+            ),
+        )
+    )
+    return select(subtree.c.id)
+
+
+async def _set_deleted_at(
+    db: AsyncSession, *, todo_id: int, owner_id: int, deleted: bool
+) -> Optional[Todo]:
+    stmt = (
+        update(Todo)
+        .where(
+            Todo.owner_id == owner_id,
+            Todo.id.in_(_subtree_ids(owner_id, todo_id, deleted)),
+            Todo.deleted_at.is_(None) if deleted else Todo.deleted_at.is_not(None),
+        )
+        .values(deleted_at=func.now() if deleted else None, version=Todo.version + 1)
+        .returning(Todo)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    result = await db.execute(
+        stmt, bind_arguments=shard_router.bind_arguments(owner_id)
+    )
+    todos = result.scalars().all()
+    db_todo = next((todo for todo in todos if todo.id == todo_id), None)
+    if db_todo is None:
+        return None
 
-    await db.refresh(db_todo)
+    today = date.today()
+    contribution: Dict[str, int] = {}
+    for todo in todos:
+        for column, value in crud_todo_stats.contribution_of(todo, today).items():
+            contribution[column] = contribution.get(column, 0) + value
+    change_seq = await crud_todo_stats.record_todo_change(
+        db,
+        owner_id,
+        crud_todo_stats.negate_contribution(contribution) if deleted else contribution,
+        today,
+    )
+    await crud_tag.adjust_counts_for_todos(
+        db,
+        owner_id=owner_id,
+        todo_ids=[todo.id for todo in todos],
+        delta=-1 if deleted else 1,
+    )
+    changed_ids = [todo.id for todo in todos]
+    if db_todo.parent_id is not None:
+        count, done = subtask_rollup(db_todo.status)
+        sign = -1 if deleted else 1
+        if await apply_subtask_rollups(
+            db, owner_id, {db_todo.parent_id: (sign * count, sign * done)}
+        ):
+            changed_ids.append(db_todo.parent_id)
+    await _stamp_changes(db, owner_id, changed_ids, change_seq)
+    if any(todo.recurrence_next_at is not None for todo in todos):
+        invalidation_bus.publish_after_commit(db, "recurrence", owner_id)
     return db_todo
 
 
 async def delete_todo(
     db: AsyncSession, *, todo_id: int, owner_id: int
 ) -> Optional[Todo]:
-    db_todo = await get_todo(db=db, todo_id=todo_id, owner_id=owner_id)
-    if not db_todo:
-        return None
+    """
+    Soft-deletes the todo and its subtasks with one UPDATE ... RETURNING. The
+    rows and photos stay until the purge_todos job removes them, so
+    restore_todo can undo it.
+    """
+    return await _set_deleted_at(db, todo_id=todo_id, owner_id=owner_id, deleted=True)
+
+
+async def restore_todo(
+    db: AsyncSession, *, todo_id: int, owner_id: int
+) -> Optional[Todo]:
+    """Undoes delete_todo, unless the todo has been purged already."""
+    return await _set_deleted_at(db, todo_id=todo_id, owner_id=owner_id, deleted=False)
+
+
+def build_recurrences_due_query(
+    until: datetime,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 500,
+) -> Select:
+    """
+    Recurring todos of every owner whose next occurrence starts by `until`,
+    in (recurrence_next_at, id) order after the keyset `after`. A range
+    scan of ix_todos_recurrence_next_at_id, however many rules exist.
+    """
+    stmt = select(Todo.id, Todo.recurrence_next_at).filter(
+        Todo.recurrence_next_at <= until, Todo.deleted_at.is_(None)
+    )
+    if after is not None:
+        stmt = stmt.filter(tuple_(Todo.recurrence_next_at, Todo.id) > after)
+    return stmt.order_by(Todo.recurrence_next_at, Todo.id).limit(limit)
+
+
+async def get_recurrences_due(
+    db: AsyncSession,
+    *,
+    shard_id: str,
+    until: datetime,
+    after: Optional[Tuple[datetime, int]] = None,
+    limit: int = 500,
+) -> List[Tuple[int, datetime]]:
+    result = await db.execute(
+        build_recurrences_due_query(until, after, limit),
+        bind_arguments=shard_router.shard_bind_arguments(shard_id),
+    )
+    return [tuple(row) for row in result]
+
+
+async def create_next_occurrences(
+    db: AsyncSession,
+    *,
+    shard_id: str,
+    todo_ids: Sequence[int],
+    due_by: datetime,
+    today: date,
+) -> Dict[int, Optional[Todo]]:
+    """
+    Creates the next instance of every recurring todo in `todo_ids` whose
+    next occurrence starts by `due_by`, with one batched INSERT, and moves
+    the rule onto it. Occurrences missed while nothing ran are skipped:
+    instances are never due before `today`. Returns the new instance per
+    processed todo (None if its rule has ended); rows locked by a
+    concurrent edit are left for the next round.
+    """
+    bind_arguments = shard_router.shard_bind_arguments(shard_id)
+    result = await db.execute(
+        select(Todo)
+        .filter(
+            Todo.id.in_(todo_ids),
+            Todo.recurrence_next_at <= due_by,
+            Todo.deleted_at.is_(None),
+        )
+        .with_for_update(skip_locked=True),
+        bind_arguments=bind_arguments,
+    )
+    series = result.scalars().all()
+    if not series:
+        return {}
 
-    stmt = delete(Todo).where(Todo.id == todo_id, Todo.owner_id == owner_id)
-    await db.execute(stmt)
+    instances: Dict[int, Optional[Todo]] = {}
+    for todo in series:
+        due_date = next_occurrence(
+            todo.recurrence_rule, todo.due_date or today, not_before=today
+        )
+        instances[todo.id] = (
+            Todo(
+                title=todo.title,
+                description=todo.description,
+                status="Not Started",
+                priority=todo.priority,
+                due_date=due_date,
+                owner_id=todo.owner_id,
+                **recurrence_fields(todo.recurrence_rule, due_date),
+            )
+            if due_date is not None
+            else None
+        )
+    # The rule now lives on the new instance; stale edit forms of the old one
+    # must not bring it back, hence the version bump.
+    await db.execute(
+        update(Todo)
+        .where(Todo.id.in_(instances))
+        .values(recurrence_rule=None, recurrence_next_at=None, version=Todo.version + 1)
+        .execution_options(synchronize_session=False),
+        bind_arguments=bind_arguments,
+    )
+    created = [todo for todo in instances.values() if todo is not None]
+    db.add_all(created)
+    # eager_defaults: one multi-row INSERT ... RETURNING for the whole batch.
     await db.flush()
 
-    return db_todo
+    deltas: Dict[int, Dict[str, int]] = {todo.owner_id: {} for todo in series}
+    changed_ids: Dict[int, List[int]] = {todo.owner_id: [] for todo in series}
+    for todo in series:
+        changed_ids[todo.owner_id].append(todo.id)
+    for todo in created:
+        changed_ids[todo.owner_id].append(todo.id)
+        delta = deltas[todo.owner_id]
+        for column, value in crud_todo_stats.contribution_of(todo, today).items():
+            delta[column] = delta.get(column, 0) + value
+    change_seqs = {
+        owner_id: await crud_todo_stats.record_todo_change(db, owner_id, delta, today)
+        for owner_id, delta in deltas.items()
+    }
+    await crud_tag.copy_todo_tags(
+        db,
+        shard_id=shard_id,
+        copies={
+            todo_id: todo.id for todo_id, todo in instances.items() if todo is not None
+        },
+    )
+    for owner_id, change_seq in change_seqs.items():
+        await _stamp_changes(db, owner_id, changed_ids[owner_id], change_seq)
+    return instances
+
+
+def build_due_reminders_query(
+    due_from: date,
+    due_until: date,
+    after: Optional[Tuple[date, int, int]] = None,
+    limit: int = 1000,
+) -> Select:
+    """
+    Unfinished todos of every owner due between `due_from` and `due_until`,
+    in (due_date, owner_id, id) order after the keyset `after`. A range
+    scan of ix_todos_reminder_due_date_owner_id_id.
+    """
+    stmt = select(
+        Todo.id, Todo.owner_id, Todo.title, Todo.priority, Todo.due_date
+    ).filter(
+        Todo.due_date >= due_from,
+        Todo.due_date <= due_until,
+        Todo.deleted_at.is_(None),
+        Todo.status != "Done",
+    )
+    if after is not None:
+        stmt = stmt.filter(tuple_(Todo.due_date, Todo.owner_id, Todo.id) > after)
+    return stmt.order_by(Todo.due_date, Todo.owner_id, Todo.id).limit(limit)
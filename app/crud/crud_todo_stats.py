@@ -0,0 +1,220 @@
+from datetime import date
+from typing import Dict, Optional
+
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.db.models import Todo, TodoArchive, TodoStats
+from app.db.sharding import OwnerMoved, shard_router
+from app.schemas.todo import (
+    PRIORITY_STATS_COLUMNS,
+    STATUS_STATS_COLUMNS,
+    TodoStatsSummary,
+)
+
+COUNTER_COLUMNS = list(TodoStatsSummary.model_fields)
+
+
+def is_overdue(status: str, due_date: Optional[date], today: date) -> bool:
+    return due_date is not None and due_date < today and status != "Done"
+
+
+def todo_contribution(
+    status: str, priority: Optional[int], due_date: Optional[date], today: date
+) -> Dict[str, int]:
+    """Counter increments one todo with these values accounts for."""
+    contribution = {"total": 1}
+    if status in STATUS_STATS_COLUMNS:
+        contribution[STATUS_STATS_COLUMNS[status]] = 1
+    if priority in PRIORITY_STATS_COLUMNS:
+        contribution[PRIORITY_STATS_COLUMNS[priority]] = 1
+    if is_overdue(status, due_date, today):
+        contribution["overdue"] = 1
+    return contribution
+
+
+def contribution_of(todo: Todo, today: date) -> Dict[str, int]:
+    return todo_contribution(todo.status, todo.priority, todo.due_date, today)
+
+
+def diff_contributions(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {
+        column: after.get(column, 0) - before.get(column, 0)
+        for column in set(before) | set(after)
+        if after.get(column, 0) != before.get(column, 0)
+    }
+
+
+def negate_contribution(contribution: Dict[str, int]) -> Dict[str, int]:
+    return {column: -value for column, value in contribution.items()}
+
+
+def stats_aggregates(today: date, model=Todo) -> list:
+    """SELECT list computing every counter over a set of todos (or archived todos)."""
+    status_done = model.status == "Done"
+
+    def count_where(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    return [
+        func.count(model.id).label("total"),
+        *[
+            count_where(model.status == status).label(column)
+            for status, column in STATUS_STATS_COLUMNS.items()
+        ],
+        *[
+            count_where(model.priority == priority).label(column)
+            for priority, column in PRIORITY_STATS_COLUMNS.items()
+        ],
+        count_where((model.due_date < today) & ~status_done).label("overdue"),
+    ]
+
+
+def counted_rows(model=Todo) -> list:
+    """WHERE clauses selecting the rows the counters include (not soft-deleted)."""
+    if model is Todo:
+        return [Todo.deleted_at.is_(None)]
+    return []
+
+
+async def compute_todo_stats(
+    db: AsyncSession, owner_id: int, today: date
+) -> Dict[str, int]:
+    """Counts the owner's todos, archived ones included, from scratch."""
+    counts = {column: 0 for column in COUNTER_COLUMNS}
+    for model in (Todo, TodoArchive):
+        result = await db.execute(
+            select(*stats_aggregates(today, model)).filter(
+                model.owner_id == owner_id, *counted_rows(model)
+            ),
+            bind_arguments=shard_router.bind_arguments(owner_id),
+        )
+        for column, value in result.mappings().one().items():
+            counts[column] += value
+    return counts
+
+
+async def compute_overdue(db: AsyncSession, owner_id: int, today: date) -> int:
+    result = await db.execute(
+        select(func.count(Todo.id)).filter(
+            Todo.owner_id == owner_id,
+            Todo.due_date < today,
+            Todo.status != "Done",
+            *counted_rows(),
+        ),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return result.scalar_one()
+
+
+def upsert_todo_stats(owner_id: int, values: Dict[str, int], today: date):
+    """
+    INSERT of the owner's counters that overwrites an existing row in place,
+    so two writers creating the same missing row cannot both insert it.
+    """
+    stmt = insert(TodoStats).values(owner_id=owner_id, **values, overdue_as_of=today)
+    return stmt.on_conflict_do_update(
+        index_elements=["owner_id"],
+        set_={
+            **{column: stmt.excluded[column] for column in values},
+            "overdue_as_of": stmt.excluded.overdue_as_of,
+            "updated_at": func.now(),
+        },
+    )
+
+
+async def recompute_todo_stats(
+    db: AsyncSession, owner_id: int, today: Optional[date] = None
+) -> Dict[str, int]:
+    """Overwrites (or creates) the owner's stats row with freshly counted values."""
+    today = today or date.today()
+    values = await compute_todo_stats(db, owner_id, today)
+    await db.execute(
+        upsert_todo_stats(owner_id, values, today),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return values
+
+
+async def record_todo_change(
+    db: AsyncSession,
+    owner_id: int,
+    delta: Dict[str, int],
+    today: Optional[date] = None,
+) -> int:
+    """
+    Adds `delta` to the owner's counters and takes the owner's next change
+    sequence number, in one UPDATE ... RETURNING; returns the number. Every
+    write of the owner's todos calls this once it has locked the rows it
+    changes, and holds the stats row lock until it commits, so changes
+    numbered N are visible before N + 1 is handed out. A missing stats row
+    is rebuilt by counting, which includes the change itself.
+
+    Raises OwnerMoved (after pointing the router at the new shard) if the
+    owner has been moved off this shard; the caller must roll back.
+    """
+    delta = {column: value for column, value in delta.items() if value}
+    today = today or date.today()
+
+    values = {
+        column: getattr(TodoStats, column) + value
+        for column, value in delta.items()
+        if column != "overdue"
+    }
+    if "overdue" in delta:
+        # A stale overdue count is recomputed on read, so only adjust today's.
+        values["overdue"] = case(
+            (TodoStats.overdue_as_of == today, TodoStats.overdue + delta["overdue"]),
+            else_=TodoStats.overdue,
+        )
+
+    result = await db.execute(
+        update(TodoStats)
+        .where(TodoStats.owner_id == owner_id)
+        .values(**values, change_seq=TodoStats.change_seq + 1)
+        .returning(TodoStats.change_seq, TodoStats.moved_to)
+        .execution_options(synchronize_session=False),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    row = result.one_or_none()
+    if row is None:
+        await recompute_todo_stats(db, owner_id, today)
+        return await record_todo_change(db, owner_id, {}, today)
+    if row.moved_to is not None:
+        shard_router.assign(owner_id, row.moved_to)
+        raise OwnerMoved(owner_id, row.moved_to)
+    return row.change_seq
+
+
+async def get_purged_seq(db: AsyncSession, owner_id: int) -> int:
+    """Highest change sequence number among the owner's purged tombstones."""
+    result = await db.execute(
+        select(TodoStats.purged_seq).filter(TodoStats.owner_id == owner_id),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    return result.scalar_one_or_none() or 0
+
+
+async def get_todo_stats(
+    db: AsyncSession, owner_id: int, today: Optional[date] = None
+) -> TodoStatsSummary:
+    """
+    Reads the owner's counters. Never writes, so it is safe on a read
+    replica: a missing row is counted live, and a stale overdue count is
+    recomputed live until the daily job refreshes it.
+    """
+    today = today or date.today()
+    result = await db.execute(
+        select(TodoStats).filter(TodoStats.owner_id == owner_id),
+        bind_arguments=shard_router.bind_arguments(owner_id),
+    )
+    stats = result.scalars().first()
+    if stats is None:
+        return TodoStatsSummary(**await compute_todo_stats(db, owner_id, today))
+
+    summary = TodoStatsSummary.model_validate(stats)
+    if stats.overdue_as_of != today:
+        summary.overdue = await compute_overdue(db, owner_id, today)
+    return summary
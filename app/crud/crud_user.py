@@ -1,10 +1,13 @@
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 
+from sqlalchemy import func, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.core.invalidation import invalidation_bus
 from app.core.security import get_password_hash
-from app.db.models import User
+from app.db.models import User, UserShard
+from app.db.sharding import shard_router, DIRECTORY_STRATEGY
 from app.schemas.user import UserCreate
 
 
@@ -18,10 +21,110 @@ async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
     return result.scalars().first()
 
 
-async def create_user(db: AsyncSession, *, user_in: UserCreate) -> User:
-    hashed_password = get_password_hash(user_in.password)
+async def count_users(db: AsyncSession) -> int:
+    result = await db.execute(select(func.count(User.id)))
+    return result.scalar_one()
+
+
+async def get_user_emails_after(
+    db: AsyncSession, *, after_id: int = 0, limit: int = 10_000
+) -> List[Tuple[int, str]]:
+    """Keyset-paginated (id, email) pairs, for loading users in batches."""
+    result = await db.execute(
+        select(User.id, User.email)
+        .filter(User.id > after_id)
+        .order_by(User.id)
+        .limit(limit)
+    )
+    return [(row.id, row.email) for row in result]
+
+
+async def get_user_emails_by_ids(
+    db: AsyncSession, user_ids: Sequence[int]
+) -> List[Tuple[int, str]]:
+    """(id, email) pairs of whichever of `user_ids` exist (and are visible yet)."""
+    if not user_ids:
+        return []
+    result = await db.execute(select(User.id, User.email).filter(User.id.in_(user_ids)))
+    return [(row.id, row.email) for row in result]
+
+
+async def create_user(
+    db: AsyncSession, *, user_in: UserCreate, hashed_password: Optional[str] = None
+) -> User:
+    if hashed_password is None:
+        hashed_password = get_password_hash(user_in.password)
     db_user = User(email=user_in.email, hashed_password=hashed_password)
     db.add(db_user)
     await db.flush()
     await db.refresh(db_user)
+    if shard_router.enabled:
+        await place_user_on_shard(db, user=db_user)
+    invalidation_bus.publish_after_commit(
+        db, "user", db_user.id, db_user.token_generation
+    )
     return db_user
+
+
+async def update_password_hash(
+    db: AsyncSession, *, user: User, hashed_password: str
+) -> User:
+    user.hashed_password = hashed_password
+    await db.flush()
+    invalidation_bus.publish_after_commit(db, "user", user.id, user.token_generation)
+    return user
+
+
+async def place_user_on_shard(
+    db: AsyncSession, *, user: User, shard_id: Optional[str] = None
+) -> str:
+    """
+    Records the user's shard in the directory (directory strategy only) and
+    mirrors the user row onto that shard so shard-local foreign keys hold.
+    The mirror carries no password hash; authentication always uses the primary.
+    """
+    shard_id = shard_id or shard_router.shard_for(user.id)
+    if shard_router.strategy == DIRECTORY_STRATEGY:
+        await db.merge(UserShard(user_id=user.id, shard_id=shard_id))
+        await db.flush()
+    await db.execute(
+        insert(User.__table__).values(
+            id=user.id, email=user.email, hashed_password="", is_active=user.is_active
+        ),
+        bind_arguments={"shard_id": shard_id},
+    )
+    shard_router.assign(user.id, shard_id)
+    invalidation_bus.publish_after_commit(db, "user_shard", user.id)
+    return shard_id
+
+
+async def get_shard_directory(db: AsyncSession) -> List[Tuple[int, str]]:
+    result = await db.execute(select(UserShard.user_id, UserShard.shard_id))
+    return [(row.user_id, row.shard_id) for row in result]
+
+
+async def get_user_shard(db: AsyncSession, user_id: int) -> Optional[str]:
+    result = await db.execute(
+        select(UserShard.shard_id).filter(UserShard.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_token_generations(db: AsyncSession) -> List[Tuple[int, int]]:
+    """Users whose tokens were revoked at least once, with their current generation."""
+    result = await db.execute(
+        select(User.id, User.token_generation).filter(User.token_generation > 0)
+    )
+    return [(row.id, row.token_generation) for row in result]
+
+
+async def bump_token_generation(db: AsyncSession, *, user_id: int) -> int:
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_generation=User.token_generation + 1)
+        .returning(User.token_generation)
+    )
+    generation = result.scalar_one()
+    invalidation_bus.publish_after_commit(db, "user", user_id, generation)
+    return generation
@@ -1,26 +1,141 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, List, Set
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
 from app.core.config import settings
+from app.db.sharding import shard_router
 
 engine = create_async_engine(settings.DATABASE_URL, echo=True)
-
-AsyncSessionFactory = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
-    autocommit=False,
+read_engine = (
+    create_async_engine(settings.DATABASE_READ_URL, echo=True)
+    if settings.DATABASE_READ_URL
+    else engine
 )
 
+
+class TrackedSession(Session):
+    """
+    Session that records whether the current transaction wrote anything,
+    so read-only requests can skip the COMMIT round trip.
+    """
+
+
+@event.listens_for(TrackedSession, "after_flush")
+def _mark_flush_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(TrackedSession, "do_orm_execute")
+def _mark_statement_writes(orm_execute_state):
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(TrackedSession, "after_commit")
+@event.listens_for(TrackedSession, "after_rollback")
+def _clear_writes(session):
+    session.info.pop("has_writes", None)
+
+
+@event.listens_for(TrackedSession, "after_commit")
+def _run_after_commit(session):
+    for callback, items in session.info.pop("after_commit", {}).values():
+        task = asyncio.get_running_loop().create_task(callback(items))
+        _after_commit_tasks.add(task)
+        task.add_done_callback(_after_commit_tasks.discard)
+
+
+@event.listens_for(TrackedSession, "after_rollback")
+def _drop_after_commit(session):
+    session.info.pop("after_commit", None)
+
+
+_after_commit_tasks: Set[asyncio.Task] = set()
+
+
+def after_commit(
+    session: AsyncSession,
+    key: str,
+    item: Any,
+    callback: Callable[[List[Any]], Awaitable[None]],
+) -> None:
+    """
+    Collects `item` under `key` until the session's transaction commits, then
+    runs `callback(items)` once in a background task, so notifications about
+    a write never go out before (or without) the write itself.
+    A rollback drops them.
+    """
+    pending = session.info.setdefault("after_commit", {})
+    if key in pending:
+        pending[key][1].append(item)
+    else:
+        pending[key] = (callback, [item])
+
+
+async def wait_for_after_commit_tasks() -> None:
+    """Waits for after_commit callbacks still running; called on shutdown."""
+    await asyncio.gather(*_after_commit_tasks, return_exceptions=True)
+
+
+class TrackedShardedSession(TrackedSession, ShardedSession):
+    """TrackedSession that routes owner-scoped tables through the shard router."""
+
+
+def _make_session_factory(bind) -> sessionmaker:
+    if shard_router.enabled:
+        return sessionmaker(
+            class_=AsyncSession,
+            sync_session_class=TrackedShardedSession,
+            expire_on_commit=False,
+            autoflush=False,
+            autocommit=False,
+            **shard_router.session_options(bind),
+        )
+    return sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        sync_session_class=TrackedSession,
+        expire_on_commit=False,
+        autoflush=False,
+        autocommit=False,
+    )
+
+
+AsyncSessionFactory = _make_session_factory(engine)
+AsyncReadSessionFactory = _make_session_factory(read_engine)
+
 Base = declarative_base()
 
 
-async def get_db():
-    async with AsyncSessionFactory() as session:
+def session_has_writes(session: AsyncSession) -> bool:
+    return bool(session.info.get("has_writes"))
+
+
+def read_replica_enabled() -> bool:
+    return read_engine is not engine
+
+
+@asynccontextmanager
+async def session_scope(session_factory: sessionmaker = AsyncSessionFactory):
+    """
+    AsyncSession only checks out a pooled connection on its first statement,
+    so scopes that never query (e.g. failed auth) never touch the pool, and
+    read-only scopes skip the COMMIT round trip.
+    """
+    async with session_factory() as session:
         try:
             yield session
-            await session.commit()
+            if session_has_writes(session):
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
@@ -28,6 +143,32 @@ async def get_db():
             await session.close()
 
 
+async def get_db():
+    """Request-scoped session on the primary database."""
+    async with session_scope(AsyncSessionFactory) as session:
+        yield session
+
+
+async def release_db(session: AsyncSession) -> None:
+    """
+    Ends the session's transaction and returns its connection to the pool
+    before slow non-database work such as template rendering. Pending writes
+    are committed; loaded objects stay usable because nothing is expired.
+    The session checks out a fresh connection if it is queried again.
+    """
+    if session_has_writes(session):
+        await session.commit()
+    else:
+        await session.close()
+
+
+def owner_scoped_engines() -> List[AsyncEngine]:
+    """Databases holding todos: every shard when sharding, else the primary."""
+    if shard_router.enabled:
+        return list(shard_router.engines.values())
+    return [engine]
+
+
 async def create_tables():
     async with engine.begin() as conn:
         # await conn.run_sync(Base.metadata.drop_all)
@@ -1,9 +1,21 @@
 from typing import Optional
 from datetime import datetime, date
 
-from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Date
+from sqlalchemy import (
+    Integer,
+    String,
+    Boolean,
+    ForeignKey,
+    DateTime,
+    Date,
+    Index,
+    Float,
+    JSON,
+    LargeBinary,
+    BigInteger,
+)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from app.db.base import Base
 
@@ -15,6 +27,10 @@ class User(Base):
     email: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Bumped to revoke every access token issued before the change.
+    token_generation: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
 
     todos: Mapped[list["Todo"]] = relationship(
         "Todo", back_populates="owner", cascade="all, delete-orphan"
@@ -23,6 +39,60 @@ class User(Base):
 
 class Todo(Base):
     __tablename__ = "todos"
+    __table_args__ = (
+        # Every list query is scoped to one owner, defaults to newest first and
+        # skips soft-deleted rows, which therefore never enter this index.
+        Index(
+            "ix_todos_owner_id_created_at",
+            "owner_id",
+            "created_at",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # Lets the purge_todos job find soft-deleted rows without a full scan.
+        Index(
+            "ix_todos_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+        # Sync reads an owner's changes in (change_seq, id) order from a
+        # client's high-water mark; deleted rows stay in as tombstones.
+        Index("ix_todos_owner_id_change_seq_id", "owner_id", "change_seq", "id"),
+        # Lets the archive_todos job find old Done todos without a full scan.
+        Index(
+            "ix_todos_done_updated_at",
+            "updated_at",
+            postgresql_where=text("status = 'Done'"),
+        ),
+        # Each step of the subtask tree query looks up children by parent.
+        Index(
+            "ix_todos_owner_id_parent_id",
+            "owner_id",
+            "parent_id",
+            postgresql_where=text("parent_id IS NOT NULL"),
+        ),
+        # The recurrence scheduler reads the rules coming due next, across
+        # owners, in (recurrence_next_at, id) keyset order.
+        Index(
+            "ix_todos_recurrence_next_at_id",
+            "recurrence_next_at",
+            "id",
+            postgresql_where=text(
+                "recurrence_next_at IS NOT NULL AND deleted_at IS NULL"
+            ),
+        ),
+        # The send_reminders job reads unfinished todos coming due, across
+        # owners, in (due_date, owner_id, id) keyset order.
+        Index(
+            "ix_todos_reminder_due_date_owner_id_id",
+            "due_date",
+            "owner_id",
+            "id",
+            postgresql_where=text(
+                "due_date IS NOT NULL AND deleted_at IS NULL AND status != 'Done'"
+            ),
+        ),
+        {"info": {"shard_key": "owner_id"}},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String, index=True, nullable=False)
@@ -47,5 +117,227 @@ class Todo(Base):
     priority: Mapped[int] = mapped_column(
         Integer, default=2, nullable=True, index=True
     )  # 1: High, 2: Medium, 3: Low
+    # Optimistic concurrency: every UPDATE must match the version it read.
+    version: Mapped[int] = mapped_column(
+        Integer, default=1, server_default="1", nullable=False
+    )
+    # Soft delete: set by the delete action, cleared by undo; the purge_todos
+    # job hard-deletes the row (and its photo) later.
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Subtasks point at their parent todo. No foreign key: the parent may be
+    # archived or purged on its own schedule, keeping its id.
+    parent_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Roll-up of the direct subtasks (archived ones included, deleted ones
+    # not); crud_todo keeps it in step without touching version or updated_at.
+    subtask_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    subtasks_done: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    # Repeating todos (app.core.recurrence): only the latest instance of a
+    # series carries the rule, and with it when its next occurrence starts.
+    # The recurrence scheduler creates that instance and moves the rule on.
+    recurrence_rule: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    recurrence_next_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # The owner's todo_stats.change_seq of the last write that changed this
+    # todo, its tags or its subtask roll-up; sync pages through it.
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0", nullable=False
+    )
 
     owner: Mapped["User"] = relationship("User", back_populates="todos")
+
+    __mapper_args__ = {
+        "version_id_col": version,
+        # Fetch server-generated columns (created_at, updated_at) via RETURNING
+        # on INSERT/UPDATE instead of a follow-up SELECT.
+        "eager_defaults": True,
+    }
+
+
+class TodoArchive(Base):
+    """
+    Done todos moved out of `todos` by the archive_todos job, so the hot table
+    and its indexes only hold active work. Rows keep their original id.
+    Only read when a list is filtered to Done or asks for archived todos.
+    """
+
+    __tablename__ = "todos_archive"
+    __table_args__ = (
+        Index("ix_todos_archive_owner_id_created_at", "owner_id", "created_at"),
+        Index(
+            "ix_todos_archive_owner_id_parent_id",
+            "owner_id",
+            "parent_id",
+            postgresql_where=text("parent_id IS NOT NULL"),
+        ),
+        {"info": {"shard_key": "owner_id"}},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    status: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    photo_filename: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    due_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    priority: Mapped[int] = mapped_column(Integer, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    parent_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class Tag(Base):
+    """
+    A label an owner puts on todos. `todo_count` is the number of the owner's
+    todos carrying it (archived ones included, soft-deleted ones not); crud_tag
+    keeps it in step on every change so the tag list needs no counting.
+    """
+
+    __tablename__ = "tags"
+    __table_args__ = (
+        # Resolves the names in a filter or form; also lists tags by name.
+        Index("ix_tags_owner_id_name", "owner_id", "name", unique=True),
+        {"info": {"shard_key": "owner_id"}},
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    todo_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+
+
+class TodoTag(Base):
+    """
+    Which todos carry which tag. The primary key loads the tags of a page of
+    todos; ix_todo_tags_tag_id_todo_id is the inverted index tag filters
+    read. todo_id has no foreign key because the todo may have moved to
+    todos_archive, keeping its id and its tags.
+    """
+
+    __tablename__ = "todo_tags"
+    __table_args__ = (
+        Index("ix_todo_tags_tag_id_todo_id", "tag_id", "todo_id"),
+        {"info": {"shard_key": "owner_id"}},
+    )
+
+    todo_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tag_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True
+    )
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), nullable=False
+    )
+
+
+class TodoStats(Base):
+    """
+    Per-owner todo counters, kept in step by crud_todo on every write so the
+    list page can show them with a single primary key lookup. `overdue` is
+    only valid for `overdue_as_of`; the todo_stats job refreshes it daily.
+
+    Every write also takes the next `change_seq` here and stamps it on the
+    todos it changed. The row lock orders the owner's writes, so numbers
+    commit in order and sync can page through them without missing one.
+    `purged_seq` is the highest number purge_todos has hard-deleted.
+    `moved_to` is set on the shard an owner was moved away from (see
+    app.jobs.shards), and turns away writes that still arrive there.
+    """
+
+    __tablename__ = "todo_stats"
+    __table_args__ = ({"info": {"shard_key": "owner_id"}},)
+
+    owner_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), primary_key=True
+    )
+    total: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    not_started: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    in_progress: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    done: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    priority_high: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    priority_medium: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    priority_low: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    overdue: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    overdue_as_of: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    change_seq: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0", nullable=False
+    )
+    purged_seq: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0", nullable=False
+    )
+    moved_to: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class UserShard(Base):
+    """Directory of which shard holds a user's todos (SHARD_STRATEGY=directory)."""
+
+    __tablename__ = "user_shards"
+
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id"), primary_key=True
+    )
+    shard_id: Mapped[str] = mapped_column(String, nullable=False)
+
+
+class ReminderCheckpoint(Base):
+    """
+    How far the send_reminders job has got on this database: the
+    (due_date, owner_id, todo_id) keyset of the last todo it reminded about.
+    One row per job name on each database holding todos.
+    """
+
+    __tablename__ = "reminder_checkpoints"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    due_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    owner_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    todo_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class RateLimitBucket(Base):
+    """Shared token bucket for AUTH_RATE_LIMIT_BACKEND=database."""
+
+    __tablename__ = "rate_limit_buckets"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class IdempotencyRecord(Base):
+    """Claimed idempotency key and, once finished, its response (IDEMPOTENCY_BACKEND=database)."""
+
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String, nullable=False)
+    # NULL while the first request holding the key is still running.
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    headers: Mapped[Optional[list]] = mapped_column(JSON, nullable=True)
+    body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -0,0 +1,140 @@
+"""
+Horizontal sharding of owner-scoped tables across several databases.
+
+Users and the `user_shards` directory stay on the primary DATABASE_URL.
+Tables whose `Table.info` declares a "shard_key" (e.g. todos) live on one of
+DATABASE_SHARD_URLS, picked per owner either by hash or from the directory.
+Each shard also keeps a mirror row of its users so foreign keys still hold.
+"""
+
+import logging
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.core.config import settings
+
+PRIMARY_SHARD = "primary"
+HASH_STRATEGY = "hash"
+DIRECTORY_STRATEGY = "directory"
+
+
+class OwnerMoved(Exception):
+    """A write reached the shard its owner has been moved away from."""
+
+    def __init__(self, owner_id: int, shard_id: str):
+        super().__init__(f"Owner {owner_id} has moved to {shard_id}")
+        self.owner_id = owner_id
+        self.shard_id = shard_id
+
+
+def shard_key_of(mapper) -> Optional[str]:
+    """Name of the owner column a mapped table is sharded by, if any."""
+    if mapper is None:
+        return None
+    return mapper.local_table.info.get("shard_key")
+
+
+class ShardRouter:
+    """Maps owners to shard ids and owns one engine (and pool) per shard."""
+
+    def __init__(self, shard_urls: List[str], strategy: str = HASH_STRATEGY):
+        if strategy not in (HASH_STRATEGY, DIRECTORY_STRATEGY):
+            raise ValueError(f"Unknown SHARD_STRATEGY: {strategy}")
+        self.strategy = strategy
+        self.engines: Dict[str, AsyncEngine] = {
+            f"shard{index}": create_async_engine(url)
+            for index, url in enumerate(shard_urls)
+        }
+        self.shard_ids = list(self.engines)
+        self._directory: Dict[int, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def hash_shard(self, owner_id: int) -> str:
+        index = zlib.crc32(str(owner_id).encode()) % len(self.shard_ids)
+        return self.shard_ids[index]
+
+    def shard_for(self, owner_id: int) -> str:
+        """Shard holding this owner's rows. Directory entries win over the hash."""
+        if not self.enabled:
+            return PRIMARY_SHARD
+        if self.strategy == DIRECTORY_STRATEGY:
+            shard_id = self._directory.get(owner_id)
+            if shard_id is not None:
+                return shard_id
+        return self.hash_shard(owner_id)
+
+    def bind_arguments(self, owner_id: int) -> Optional[dict]:
+        """`bind_arguments` for Session.execute pinning a statement to the owner's shard."""
+        if not self.enabled:
+            return None
+        return {"shard_id": self.shard_for(owner_id)}
+
+    def shard_bind_arguments(self, shard_id: str) -> Optional[dict]:
+        """`bind_arguments` pinning a statement to one shard, for work that walks them all."""
+        if not self.enabled:
+            return None
+        return {"shard_id": shard_id}
+
+    def owner_shard_ids(self) -> List[str]:
+        """Shards holding todos, as owner_scoped_engines(): the primary when not sharding."""
+        return list(self.shard_ids) if self.enabled else [PRIMARY_SHARD]
+
+    def load_directory(self, entries: Iterable[Tuple[int, str]]) -> None:
+        directory = {}
+        for user_id, shard_id in entries:
+            if shard_id in self.engines:
+                directory[user_id] = shard_id
+            else:
+                logging.error(f"Directory maps user {user_id} to unknown {shard_id}")
+        self._directory = directory
+
+    def assign(self, owner_id: int, shard_id: str) -> None:
+        if self.strategy == DIRECTORY_STRATEGY:
+            self._directory[owner_id] = shard_id
+
+    # --- ShardedSession callbacks ---
+
+    def choose_shard(self, mapper, instance, clause=None, **kw) -> str:
+        shard_key = shard_key_of(mapper)
+        if shard_key is None:
+            return PRIMARY_SHARD
+        if instance is None or getattr(instance, shard_key, None) is None:
+            raise ValueError(
+                f"Cannot pick a shard for {mapper.class_.__name__} without {shard_key}"
+            )
+        return self.shard_for(getattr(instance, shard_key))
+
+    def choose_identity_shards(self, mapper, primary_key, **kw) -> List[str]:
+        return list(self.shard_ids) if shard_key_of(mapper) else [PRIMARY_SHARD]
+
+    def choose_execute_shards(self, orm_context) -> List[str]:
+        """Statements not pinned via bind_arguments fan out to every shard."""
+        for mapper in orm_context.all_mappers:
+            if shard_key_of(mapper):
+                return list(self.shard_ids)
+        return [PRIMARY_SHARD]
+
+    def session_options(self, primary_bind: AsyncEngine) -> dict:
+        """Keyword arguments configuring a ShardedSession for this router."""
+        shards = {PRIMARY_SHARD: primary_bind.sync_engine}
+        shards.update(
+            {shard_id: engine.sync_engine for shard_id, engine in self.engines.items()}
+        )
+        return {
+            "shards": shards,
+            "shard_chooser": self.choose_shard,
+            "identity_chooser": self.choose_identity_shards,
+            "execute_chooser": self.choose_execute_shards,
+        }
+
+    async def dispose(self) -> None:
+        for engine in self.engines.values():
+            await engine.dispose()
+
+
+shard_router = ShardRouter(settings.DATABASE_SHARD_URLS, settings.SHARD_STRATEGY)
@@ -0,0 +1,132 @@
+"""
+Moves old Done todos from todos into todos_archive.
+
+    python -m app.jobs.archive_todos
+    python -m app.jobs.archive_todos --after-days 7 --batch-size 500
+
+Every list query scans the owner's slice of todos, so finished work that
+is never looked at again only makes the hot table and its indexes bigger.
+This job moves todos that have been Done for ARCHIVE_DONE_AFTER_DAYS, in
+batches of ARCHIVE_BATCH_SIZE on every shard. Each batch is one
+DELETE ... RETURNING feeding an INSERT, so a todo is always in exactly one
+of the two tables. Rows being edited at that moment are skipped and picked
+up by the next run. A todo with live subtasks stays until they are gone,
+and a subtask stays while its parent is unfinished: list pages only show
+subtasks under a parent that is still in todos. The latest todo of a
+repeating series stays too, as it carries the rule. Schedule it daily; it is
+safe to run while the app serves traffic and to run several copies at once.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.db.base import engine, owner_scoped_engines
+from app.db.models import Todo, TodoArchive
+from app.db.sharding import shard_router
+
+
+async def archive_batch(
+    db_engine: AsyncEngine, done_before: datetime, batch_size: int
+) -> int:
+    """Moves one batch of todos Done since before `done_before`; returns how many."""
+    todos = Todo.__table__
+    columns = [
+        column.name
+        for column in TodoArchive.__table__.columns
+        if column.name != "archived_at"
+    ]
+    children = todos.alias("children")
+    parents = todos.alias("parents")
+    batch = (
+        select(todos.c.id)
+        .where(
+            todos.c.status == "Done",
+            todos.c.updated_at < done_before,
+            todos.c.deleted_at.is_(None),
+            todos.c.recurrence_rule.is_(None),
+            ~exists().where(
+                children.c.owner_id == todos.c.owner_id,
+                children.c.parent_id == todos.c.id,
+                children.c.deleted_at.is_(None),
+            ),
+            ~exists().where(
+                parents.c.id == todos.c.parent_id,
+                parents.c.status != "Done",
+                parents.c.deleted_at.is_(None),
+            ),
+        )
+        .order_by(todos.c.updated_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    moved = (
+        delete(todos)
+        .where(todos.c.id.in_(batch.scalar_subquery()))
+        .returning(*[todos.c[name] for name in columns])
+        .cte("moved")
+    )
+    async with db_engine.begin() as conn:
+        result = await conn.execute(
+            insert(TodoArchive.__table__).from_select(
+                columns, select(*[moved.c[name] for name in columns])
+            )
+        )
+    return result.rowcount
+
+
+async def archive(
+    db_engine: AsyncEngine,
+    done_before: datetime,
+    batch_size: int,
+    pause_seconds: float,
+) -> int:
+    """Archives batches until none are left; pauses between them to spare the database."""
+    archived = 0
+    while True:
+        moved = await archive_batch(db_engine, done_before, batch_size)
+        archived += moved
+        # Parents become eligible once their subtasks moved, so go until empty.
+        if not moved:
+            return archived
+        logging.info(f"{db_engine.url.database}: archived {archived} todos so far")
+        await asyncio.sleep(pause_seconds)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Archive old Done todos.")
+    parser.add_argument(
+        "--after-days", type=float, default=settings.ARCHIVE_DONE_AFTER_DAYS
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    parser.add_argument(
+        "--pause-seconds",
+        type=float,
+        default=0.5,
+        help="Sleep between batches so the mover never hogs the database.",
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    done_before = datetime.now(timezone.utc) - timedelta(days=args.after_days)
+    try:
+        for db_engine in owner_scoped_engines():
+            archived = await archive(
+                db_engine, done_before, args.batch_size, args.pause_seconds
+            )
+            print(f"{db_engine.url.database}: archived {archived} todos.")
+    finally:
+        await shard_router.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
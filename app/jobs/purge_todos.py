@@ -0,0 +1,154 @@
+"""
+Hard-deletes soft-deleted todos and their photos.
+
+    python -m app.jobs.purge_todos
+    python -m app.jobs.purge_todos --after-hours 1 --max-runtime-minutes 30
+
+Deleting a todo in the app only stamps deleted_at, so it can be undone and
+the interactive request never touches Cloudinary. This job removes todos
+deleted more than TODO_PURGE_AFTER_HOURS ago, oldest first, in batches of
+TODO_PURGE_BATCH_SIZE on every shard. Each batch's photos are deleted in
+the same transaction as its rows: if Cloudinary fails, the batch is rolled
+back and retried on the next run, so no photo is ever orphaned. Schedule
+it in an off-peak window and cap it with --max-runtime-minutes; rows locked
+by a concurrent undo are skipped.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.db.base import engine, owner_scoped_engines
+from app.db.models import Todo, TodoStats, TodoTag
+from app.db.sharding import shard_router
+from app.services.todo_service import TodoService
+
+
+async def purge_batch(
+    db_engine: AsyncEngine, deleted_before: datetime, batch_size: int
+) -> int:
+    """Purges one batch of todos deleted before `deleted_before`; returns how many."""
+    todos = Todo.__table__
+    batch = (
+        select(todos.c.id)
+        .where(todos.c.deleted_at < deleted_before)
+        .order_by(todos.c.deleted_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    async with db_engine.begin() as conn:
+        result = await conn.execute(
+            delete(todos)
+            .where(todos.c.id.in_(batch.scalar_subquery()))
+            .returning(
+                todos.c.id, todos.c.owner_id, todos.c.change_seq, todos.c.photo_filename
+            )
+        )
+        rows = result.all()
+        # Sync clients whose high-water mark is below a purged tombstone
+        # never saw that delete, so they are sent into a full resync.
+        purged_seqs: Dict[int, int] = {}
+        for row in rows:
+            purged_seqs[row.owner_id] = max(
+                purged_seqs.get(row.owner_id, 0), row.change_seq
+            )
+        if purged_seqs:
+            todo_stats = TodoStats.__table__
+            await conn.execute(
+                update(todo_stats)
+                .where(todo_stats.c.owner_id.in_(purged_seqs))
+                .values(
+                    purged_seq=func.greatest(
+                        todo_stats.c.purged_seq,
+                        case(purged_seqs, value=todo_stats.c.owner_id),
+                    )
+                )
+            )
+        # Tag counts already dropped these todos when they were soft-deleted.
+        todo_tags = TodoTag.__table__
+        await conn.execute(
+            delete(todo_tags).where(todo_tags.c.todo_id.in_([row.id for row in rows]))
+        )
+        # Blocking HTTP calls; run them off the loop but inside the transaction.
+        await asyncio.to_thread(
+            TodoService.delete_photos,
+            [row.photo_filename for row in rows if row.photo_filename],
+        )
+    return len(rows)
+
+
+async def purge(
+    db_engine: AsyncEngine,
+    deleted_before: datetime,
+    batch_size: int,
+    pause_seconds: float,
+    stop_at: Optional[float] = None,
+) -> int:
+    """Purges batches until none are left or `stop_at` (monotonic) has passed."""
+    purged = 0
+    while True:
+        removed = await purge_batch(db_engine, deleted_before, batch_size)
+        purged += removed
+        if removed < batch_size:
+            return purged
+        if stop_at is not None and time.monotonic() >= stop_at:
+            logging.info(f"{db_engine.url.database}: out of time, stopping early")
+            return purged
+        logging.info(f"{db_engine.url.database}: purged {purged} todos so far")
+        await asyncio.sleep(pause_seconds)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Purge soft-deleted todos.")
+    parser.add_argument(
+        "--after-hours", type=float, default=settings.TODO_PURGE_AFTER_HOURS
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.TODO_PURGE_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--pause-seconds",
+        type=float,
+        default=0.5,
+        help="Sleep between batches so the purge never hogs the database.",
+    )
+    parser.add_argument(
+        "--max-runtime-minutes",
+        type=float,
+        default=None,
+        help="Stop starting new batches after this long; the next run resumes.",
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    deleted_before = datetime.now(timezone.utc) - timedelta(hours=args.after_hours)
+    stop_at = (
+        time.monotonic() + args.max_runtime_minutes * 60
+        if args.max_runtime_minutes is not None
+        else None
+    )
+    try:
+        for db_engine in owner_scoped_engines():
+            purged = await purge(
+                db_engine, deleted_before, args.batch_size, args.pause_seconds, stop_at
+            )
+            print(f"{db_engine.url.database}: purged {purged} todos.")
+            if stop_at is not None and time.monotonic() >= stop_at:
+                break
+    finally:
+        await shard_router.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
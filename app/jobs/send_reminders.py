@@ -0,0 +1,197 @@
+"""
+Sends due-date reminders for unfinished todos.
+
+    python -m app.jobs.send_reminders
+    python -m app.jobs.send_reminders --days-ahead 0 --max-runtime-minutes 10
+
+Finds the todos due between today and REMINDER_DAYS_AHEAD days from now
+that are not Done, in batches of REMINDER_BATCH_SIZE read with keyset
+range scans of ix_todos_reminder_due_date_owner_id_id on every shard, and
+hands each batch to the REMINDER_CHANNEL (app.core.notifications) as one
+message per user. A user's todos due on the same day never straddle two
+batches unless there are more of them than fit in one.
+
+Progress is kept per database in reminder_checkpoints, updated in the
+same transaction that read the batch and only once the channel accepted
+it: each todo is reminded about once, a failed batch is retried by the
+next run, and memory stays bounded by the batch size however many todos
+are due. A todo whose due date is moved later is reminded about again;
+one added with a due date the checkpoint has already passed is not.
+Schedule it daily; copies running at once wait for each other on the
+checkpoint row.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.notifications import Reminder, ReminderItem, build_reminder_channel
+from app.crud.crud_todo import build_due_reminders_query
+from app.db.base import engine, owner_scoped_engines
+from app.db.models import ReminderCheckpoint, User
+from app.db.sharding import shard_router
+
+CHECKPOINT = "due_reminders"
+
+
+async def remind_batch(
+    db_engine: AsyncEngine,
+    channel,
+    due_from: date,
+    due_until: date,
+    batch_size: int,
+) -> Tuple[int, int, bool]:
+    """
+    Sends one batch of reminders past the checkpoint. Returns how many todos
+    and users it covered, and whether it was the last batch.
+    """
+    checkpoints = ReminderCheckpoint.__table__
+    users = User.__table__
+    async with db_engine.begin() as conn:
+        await conn.execute(
+            insert(checkpoints)
+            .values(name=CHECKPOINT)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        checkpoint = (
+            await conn.execute(
+                select(checkpoints)
+                .where(checkpoints.c.name == CHECKPOINT)
+                .with_for_update()
+            )
+        ).one()
+        after = (
+            (checkpoint.due_date, checkpoint.owner_id, checkpoint.todo_id)
+            if checkpoint.due_date is not None
+            else None
+        )
+        rows = (
+            await conn.execute(
+                build_due_reminders_query(due_from, due_until, after, batch_size)
+            )
+        ).all()
+        last_batch = len(rows) < batch_size
+        if not last_batch:
+            # Leave the last user's todos for that day to the next batch.
+            tail = (rows[-1].due_date, rows[-1].owner_id)
+            whole = [row for row in rows if (row.due_date, row.owner_id) != tail]
+            rows = whole or rows
+        if not rows:
+            return 0, 0, True
+
+        owner_ids = {row.owner_id for row in rows}
+        emails = dict(
+            (
+                await conn.execute(
+                    select(users.c.id, users.c.email).where(
+                        users.c.id.in_(owner_ids), users.c.is_active.is_(True)
+                    )
+                )
+            ).all()
+        )
+        items: Dict[int, List[ReminderItem]] = {}
+        for row in rows:
+            if row.owner_id in emails:
+                items.setdefault(row.owner_id, []).append(
+                    ReminderItem(row.id, row.title, row.due_date, row.priority)
+                )
+        reminders = [
+            Reminder(owner_id, emails[owner_id], owner_items)
+            for owner_id, owner_items in items.items()
+        ]
+        if reminders:
+            # Inside the transaction: if delivery fails, the checkpoint stays.
+            await channel.send(reminders)
+        last = rows[-1]
+        await conn.execute(
+            update(checkpoints)
+            .where(checkpoints.c.name == CHECKPOINT)
+            .values(due_date=last.due_date, owner_id=last.owner_id, todo_id=last.id)
+        )
+    return len(rows), len(reminders), last_batch
+
+
+async def remind(
+    db_engine: AsyncEngine,
+    channel,
+    due_from: date,
+    due_until: date,
+    batch_size: int,
+    stop_at: Optional[float] = None,
+) -> Tuple[int, int]:
+    """Sends batches until none are left or `stop_at` (monotonic) has passed."""
+    todos, messages = 0, 0
+    while True:
+        batch_todos, batch_messages, last_batch = await remind_batch(
+            db_engine, channel, due_from, due_until, batch_size
+        )
+        todos += batch_todos
+        messages += batch_messages
+        if last_batch:
+            return todos, messages
+        if stop_at is not None and time.monotonic() >= stop_at:
+            logging.info(f"{db_engine.url.database}: out of time, stopping early")
+            return todos, messages
+        logging.info(f"{db_engine.url.database}: {todos} todos reminded so far")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Send due-date reminders.")
+    parser.add_argument("--days-ahead", type=int, default=settings.REMINDER_DAYS_AHEAD)
+    parser.add_argument("--batch-size", type=int, default=settings.REMINDER_BATCH_SIZE)
+    parser.add_argument(
+        "--max-runtime-minutes",
+        type=float,
+        default=None,
+        help="Stop starting new batches after this long; the next run resumes.",
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    today = date.today()
+    stop_at = (
+        time.monotonic() + args.max_runtime_minutes * 60
+        if args.max_runtime_minutes is not None
+        else None
+    )
+    channel = build_reminder_channel(
+        settings.REMINDER_CHANNEL,
+        file_path=settings.REMINDER_FILE_PATH,
+        webhook_url=settings.REMINDER_WEBHOOK_URL,
+        webhook_timeout_seconds=settings.REMINDER_WEBHOOK_TIMEOUT_SECONDS,
+    )
+    try:
+        for db_engine in owner_scoped_engines():
+            todos, messages = await remind(
+                db_engine,
+                channel,
+                today,
+                today + timedelta(days=args.days_ahead),
+                args.batch_size,
+                stop_at,
+            )
+            print(
+                f"{db_engine.url.database}: reminded {messages} users "
+                f"of {todos} todos."
+            )
+            if stop_at is not None and time.monotonic() >= stop_at:
+                break
+    finally:
+        await channel.close()
+        await shard_router.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,247 @@
+"""
+Shard maintenance tool.
+
+    python -m app.jobs.shards prepare
+        Staggers the id sequences of sharded tables so ids stay globally
+        unique and rows can move between shards. Run once per shard after
+        `alembic upgrade head` has been applied to it (and again when adding
+        shards).
+
+    python -m app.jobs.shards move --user-id 42 --target shard1
+        Moves one user's rows to another shard while the app keeps serving
+        (requires SHARD_STRATEGY=directory):
+          1. lock the user's todos and todo_stats row on the source, which
+             holds back every write of the user there (each one ends by
+             updating that row, see crud_todo_stats.record_todo_change),
+          2. copy the user's rows to the target shard,
+          3. point the directory at the target,
+          4. mark the source's todo_stats row as moved and commit: writes
+             held back, or sent later by workers that have not refreshed
+             their directory yet, fail there and are retried on the target,
+          5. wait for every worker to refresh its directory, then delete
+             the rows from the source.
+        The user's writes pause for the copy only; nothing written on the
+        target is ever overwritten by the source.
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from sqlalchemy import Table, delete, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import settings
+from app.core.invalidation import Invalidation, notify_in_transaction
+from app.db.base import Base, engine
+from app.db.models import Todo, TodoStats, User, UserShard
+from app.db.sharding import shard_router, PRIMARY_SHARD, DIRECTORY_STRATEGY
+
+# Ids on shard k are congruent to k + 1 modulo this stride, so it caps the shard count.
+SEQUENCE_STRIDE = 1024
+
+
+def sharded_tables() -> List[Table]:
+    """Owner-scoped tables in foreign key dependency order."""
+    return [
+        table for table in Base.metadata.sorted_tables if table.info.get("shard_key")
+    ]
+
+
+def engine_for(shard_id: str) -> AsyncEngine:
+    return engine if shard_id == PRIMARY_SHARD else shard_router.engines[shard_id]
+
+
+async def prepare_sequences() -> None:
+    for table in sharded_tables():
+        pk_columns = list(table.primary_key.columns)
+        if len(pk_columns) != 1 or pk_columns[0].autoincrement is False:
+            continue
+        pk = pk_columns[0]
+
+        highest = 0
+        for shard_engine in [engine, *shard_router.engines.values()]:
+            async with shard_engine.connect() as conn:
+                highest = max(
+                    highest, (await conn.execute(select(func.max(pk)))).scalar() or 0
+                )
+        base_value = (highest // SEQUENCE_STRIDE + 1) * SEQUENCE_STRIDE
+
+        for index, (shard_id, shard_engine) in enumerate(shard_router.engines.items()):
+            async with shard_engine.begin() as conn:
+                sequence = (
+                    await conn.execute(
+                        text("SELECT pg_get_serial_sequence(:table, :column)"),
+                        {"table": table.name, "column": pk.name},
+                    )
+                ).scalar()
+                await conn.execute(
+                    text(
+                        f"ALTER SEQUENCE {sequence} INCREMENT BY {SEQUENCE_STRIDE} "
+                        f"RESTART WITH {base_value + index + 1}"
+                    )
+                )
+            print(
+                f"{shard_id}: {table.name}.{pk.name} restarts at "
+                f"{base_value + index + 1}, step {SEQUENCE_STRIDE}"
+            )
+
+
+async def _upsert_rows(conn: AsyncConnection, table: Table, rows: list) -> None:
+    if not rows:
+        return
+    pk_columns = list(table.primary_key.columns)
+    for row in rows:
+        await conn.execute(
+            delete(table).where(*[column == row[column.name] for column in pk_columns])
+        )
+    await conn.execute(insert(table), [dict(row) for row in rows])
+
+
+async def _copy_owner_rows(
+    source: AsyncConnection, target: AsyncConnection, user_id: int
+) -> int:
+    """Replaces the user's rows on the target with those on the source."""
+    tables = sharded_tables()
+    for table in reversed(tables):
+        await target.execute(
+            delete(table).where(table.c[table.info["shard_key"]] == user_id)
+        )
+    copied = 0
+    for table in tables:
+        rows = (
+            (
+                await source.execute(
+                    select(table).where(table.c[table.info["shard_key"]] == user_id)
+                )
+            )
+            .mappings()
+            .all()
+        )
+        if rows:
+            await target.execute(insert(table), [dict(row) for row in rows])
+        copied += len(rows)
+    return copied
+
+
+async def _hold_owner_writes(source: AsyncConnection, user_id: int) -> None:
+    """
+    Locks the user's todos, then their todo_stats row (the order writes take
+    them in), until the transaction ends. Jobs skip locked todos; every other
+    write waits at the todo_stats row.
+    """
+    todos, todo_stats = Todo.__table__, TodoStats.__table__
+    await source.execute(
+        select(todos.c.id).where(todos.c.owner_id == user_id).with_for_update()
+    )
+    await source.execute(
+        pg_insert(todo_stats)
+        .values(owner_id=user_id)
+        .on_conflict_do_nothing(index_elements=["owner_id"])
+    )
+    await source.execute(
+        select(todo_stats.c.owner_id)
+        .where(todo_stats.c.owner_id == user_id)
+        .with_for_update()
+    )
+
+
+async def move_user(user_id: int, target: str, settle_seconds: float) -> None:
+    if shard_router.strategy != DIRECTORY_STRATEGY:
+        raise SystemExit("Moving users requires SHARD_STRATEGY=directory.")
+    if target not in shard_router.engines:
+        raise SystemExit(f"Unknown target shard {target}.")
+
+    async with engine.connect() as primary:
+        shard_router.load_directory(
+            (await primary.execute(select(UserShard.user_id, UserShard.shard_id))).all()
+        )
+        user_row = (
+            (await primary.execute(select(User.__table__).where(User.id == user_id)))
+            .mappings()
+            .one()
+        )
+    source = shard_router.shard_for(user_id)
+    if source == target:
+        print(f"User {user_id} already lives on {target}.")
+        return
+
+    source_engine, target_engine = engine_for(source), engine_for(target)
+
+    async with source_engine.begin() as src:
+        await _hold_owner_writes(src, user_id)
+        async with target_engine.begin() as dst:
+            # In place: a todo_stats row left by an earlier move references it.
+            mirror = dict(user_row, hashed_password="")
+            await dst.execute(
+                pg_insert(User.__table__)
+                .values(mirror)
+                .on_conflict_do_update(index_elements=["id"], set_=mirror)
+            )
+            copied = await _copy_owner_rows(src, dst, user_id)
+        print(f"Copied {copied} rows of user {user_id} from {source} to {target}.")
+
+        async with engine.begin() as primary:
+            await _upsert_rows(
+                primary,
+                UserShard.__table__,
+                [{"user_id": user_id, "shard_id": target}],
+            )
+            # Workers on PUBSUB_BACKEND=database reload the entry right away;
+            # the others learn it from their first write turned away below.
+            await notify_in_transaction(primary, [Invalidation("user_shard", user_id)])
+        todo_stats = TodoStats.__table__
+        await src.execute(
+            update(todo_stats)
+            .where(todo_stats.c.owner_id == user_id)
+            .values(moved_to=target)
+        )
+    print(f"Directory now points at {target}; waiting {settle_seconds}s for workers.")
+    await asyncio.sleep(settle_seconds)
+
+    async with source_engine.begin() as src:
+        for table in reversed(sharded_tables()):
+            if table is TodoStats.__table__:
+                # Kept, with its mirror user, to turn away late writes.
+                continue
+            await src.execute(
+                delete(table).where(table.c[table.info["shard_key"]] == user_id)
+            )
+    print(f"Removed user {user_id}'s rows from {source}.")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Shard maintenance tool.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("prepare", help="Stagger id sequences across shards.")
+    move = commands.add_parser("move", help="Move one user's rows to another shard.")
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--target", required=True, help="Target shard id, e.g. shard1")
+    move.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=settings.SHARD_DIRECTORY_REFRESH_SECONDS * 2,
+        help="How long to wait for workers to pick up the new directory entry.",
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    if not shard_router.enabled:
+        raise SystemExit("DATABASE_SHARD_URLS is not configured.")
+    try:
+        if args.command == "prepare":
+            await prepare_sequences()
+        else:
+            await move_user(args.user_id, args.target, args.settle_seconds)
+    finally:
+        await shard_router.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,198 @@
+"""
+Rebuilds the todo_stats counters from the todos and todos_archive tables.
+
+    python -m app.jobs.todo_stats
+    python -m app.jobs.todo_stats --owner-id 42
+
+crud_todo keeps the counters up to date on every write, but overdue counts
+change with the calendar and rows can drift (manual SQL, a failed deploy, a
+shard move). Run this once a day shortly after midnight: it recounts every
+owner on every shard in one aggregate query per shard, rewrites the rows
+that differ and stamps overdue_as_of with today's date. Tag counts
+(tags.todo_count) and subtask roll-ups (todos.subtask_count and
+subtasks_done) are recounted the same way.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import exists, func, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.crud.crud_todo_stats import (
+    COUNTER_COLUMNS,
+    counted_rows,
+    stats_aggregates,
+    upsert_todo_stats,
+)
+from app.db.base import engine, owner_scoped_engines
+from app.db.models import Tag, Todo, TodoArchive, TodoStats, TodoTag
+from app.db.sharding import shard_router
+
+
+async def reconcile(
+    db_engine: AsyncEngine, today: date, owner_id: Optional[int] = None
+) -> tuple[int, int]:
+    """Returns (owners checked, rows rewritten) for one database."""
+    counted_stmts = [
+        select(model.owner_id, *stats_aggregates(today, model))
+        .where(*counted_rows(model))
+        .group_by(model.owner_id)
+        for model in (Todo, TodoArchive)
+    ]
+    stored_stmt = select(TodoStats)
+    if owner_id is not None:
+        counted_stmts = [
+            stmt.where(stmt.selected_columns.owner_id == owner_id)
+            for stmt in counted_stmts
+        ]
+        stored_stmt = stored_stmt.where(TodoStats.owner_id == owner_id)
+
+    async with db_engine.begin() as conn:
+        counted = {}
+        for counted_stmt in counted_stmts:
+            for row in (await conn.execute(counted_stmt)).mappings():
+                counts = counted.setdefault(
+                    row["owner_id"], {column: 0 for column in COUNTER_COLUMNS}
+                )
+                for column in COUNTER_COLUMNS:
+                    counts[column] += row[column]
+        stored = {
+            row["owner_id"]: row for row in (await conn.execute(stored_stmt)).mappings()
+        }
+
+        rewritten = 0
+        for stats_owner_id in counted.keys() | stored.keys():
+            expected = counted.get(
+                stats_owner_id, {column: 0 for column in COUNTER_COLUMNS}
+            )
+            current = stored.get(stats_owner_id)
+            if (
+                current is not None
+                and current["overdue_as_of"] == today
+                and all(current[column] == expected[column] for column in expected)
+            ):
+                continue
+            if current is not None and any(
+                current[column] != expected[column]
+                for column in expected
+                if column != "overdue"
+            ):
+                logging.warning(
+                    f"todo_stats drift for owner {stats_owner_id}: "
+                    f"{ {c: current[c] for c in expected} } -> {expected}"
+                )
+            await conn.execute(upsert_todo_stats(stats_owner_id, expected, today))
+            rewritten += 1
+    return len(counted.keys() | stored.keys()), rewritten
+
+
+async def reconcile_tag_counts(
+    db_engine: AsyncEngine, owner_id: Optional[int] = None
+) -> int:
+    """Recounts every tag's todos in one UPDATE; returns how many counts drifted."""
+    counted = (
+        select(func.count())
+        .select_from(TodoTag)
+        .where(
+            TodoTag.tag_id == Tag.id,
+            or_(
+                exists().where(Todo.id == TodoTag.todo_id, *counted_rows(Todo)),
+                exists().where(TodoArchive.id == TodoTag.todo_id),
+            ),
+        )
+        .scalar_subquery()
+    )
+    stmt = update(Tag).where(Tag.todo_count != counted).values(todo_count=counted)
+    if owner_id is not None:
+        stmt = stmt.where(Tag.owner_id == owner_id)
+    async with db_engine.begin() as conn:
+        result = await conn.execute(stmt)
+    return result.rowcount
+
+
+async def reconcile_subtask_counts(
+    db_engine: AsyncEngine, owner_id: Optional[int] = None
+) -> int:
+    """Recounts every todo's subtask roll-up in one UPDATE; returns how many drifted."""
+    todos, archive = Todo.__table__, TodoArchive.__table__
+    children = union_all(
+        select(todos.c.parent_id, todos.c.status).where(
+            todos.c.parent_id.is_not(None), todos.c.deleted_at.is_(None)
+        ),
+        select(archive.c.parent_id, archive.c.status).where(
+            archive.c.parent_id.is_not(None)
+        ),
+    ).subquery("children")
+    counted = (
+        select(
+            children.c.parent_id,
+            func.count().label("subtask_count"),
+            func.count().filter(children.c.status == "Done").label("subtasks_done"),
+        )
+        .group_by(children.c.parent_id)
+        .subquery("counted")
+    )
+    parents = todos.alias("parents")
+    expected = (
+        select(
+            parents.c.id,
+            func.coalesce(counted.c.subtask_count, 0).label("subtask_count"),
+            func.coalesce(counted.c.subtasks_done, 0).label("subtasks_done"),
+        )
+        .outerjoin(counted, counted.c.parent_id == parents.c.id)
+        .subquery("expected")
+    )
+    stmt = (
+        update(todos).where(
+            todos.c.id == expected.c.id,
+            or_(
+                todos.c.subtask_count != expected.c.subtask_count,
+                todos.c.subtasks_done != expected.c.subtasks_done,
+            ),
+        )
+        # A repaired roll-up is not an edit: keep updated_at (sync, archiving).
+        .values(
+            subtask_count=expected.c.subtask_count,
+            subtasks_done=expected.c.subtasks_done,
+            updated_at=todos.c.updated_at,
+        )
+    )
+    if owner_id is not None:
+        stmt = stmt.where(todos.c.owner_id == owner_id)
+    async with db_engine.begin() as conn:
+        result = await conn.execute(stmt)
+    return result.rowcount
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild todo_stats counters.")
+    parser.add_argument("--owner-id", type=int, default=None)
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    today = date.today()
+    try:
+        for db_engine in owner_scoped_engines():
+            checked, rewritten = await reconcile(db_engine, today, args.owner_id)
+            print(
+                f"{db_engine.url.database}: checked {checked} owners, "
+                f"rewrote {rewritten} todo_stats rows."
+            )
+            drifted = await reconcile_tag_counts(db_engine, args.owner_id)
+            print(f"{db_engine.url.database}: fixed {drifted} tag counts.")
+            drifted = await reconcile_subtask_counts(db_engine, args.owner_id)
+            print(f"{db_engine.url.database}: fixed {drifted} subtask roll-ups.")
+    finally:
+        await shard_router.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, HTTPException, status
@@ -5,15 +6,21 @@ from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.core.config import settings
+from app.db.base import read_replica_enabled
+from app.services.container import ServiceContainer
 from app.web.routes import auth as web_auth_router
 from app.web.routes import todos as web_todos_router
+from app.web.deps import LAST_WRITE_COOKIE, set_access_token_cookie
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application startup...")
+    app.state.services = ServiceContainer()
+    await app.state.services.start()
     yield
     print("Application shutdown...")
+    await app.state.services.stop()
 
 
 app = FastAPI(
@@ -29,6 +36,39 @@ app.include_router(web_auth_router.router, tags=["Web Authentication"], prefix="
 app.include_router(web_todos_router.router, tags=["Web Todos"], prefix="/todos")
 
 
+@app.middleware("http")
+async def read_your_writes_middleware(request: Request, call_next):
+    """
+    Marks clients that just mutated data so their next page loads are
+    served by the primary instead of a possibly lagging read replica.
+    """
+    response = await call_next(request)
+    if (
+        read_replica_enabled()
+        and request.method == "POST"
+        and response.status_code < status.HTTP_400_BAD_REQUEST
+    ):
+        response.set_cookie(
+            key=LAST_WRITE_COOKIE,
+            value=f"{time.time():.3f}",
+            max_age=settings.READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            secure=False,
+            samesite="lax",
+        )
+    return response
+
+
+@app.middleware("http")
+async def session_renewal_middleware(request: Request, call_next):
+    """Sets the cookie for a token renewed by the auth dependency."""
+    response = await call_next(request)
+    renewed_access_token = getattr(request.state, "renewed_access_token", None)
+    if renewed_access_token and response.status_code < status.HTTP_400_BAD_REQUEST:
+        set_access_token_cookie(response, renewed_access_token)
+    return response
+
+
 @app.get("/", tags=["Root"], include_in_schema=False)
 async def read_root(request: Request):
     if request.cookies.get("access_token"):
@@ -1,10 +1,42 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.recurrence import normalize_rule
 
 PRIORITY_MAP = {1: "High", 2: "Medium", 3: "Low"}
 VALID_PRIORITIES = list(PRIORITY_MAP.keys())
+STATUS_STATS_COLUMNS = {
+    "Not Started": "not_started",
+    "In Progress": "in_progress",
+    "Done": "done",
+}
+PRIORITY_STATS_COLUMNS = {1: "priority_high", 2: "priority_medium", 3: "priority_low"}
+MAX_TAGS_PER_TODO = 10
+MAX_TAG_LENGTH = 32
+
+
+def parse_tag_names(raw: Optional[str]) -> List[str]:
+    """
+    Splits a comma-separated tags field into distinct lower-case names, in
+    the order given. Raises ValueError for names or lists that are too long.
+    """
+    names: List[str] = []
+    for part in (raw or "").split(","):
+        name = " ".join(part.split()).lower()
+        if not name or name in names:
+            continue
+        if len(name) > MAX_TAG_LENGTH:
+            raise ValueError(f"Tags can be at most {MAX_TAG_LENGTH} characters long.")
+        names.append(name)
+    if len(names) > MAX_TAGS_PER_TODO:
+        raise ValueError(f"A todo can have at most {MAX_TAGS_PER_TODO} tags.")
+    return names
+
+
+def _normalize_recurrence_rule(value: Optional[str]) -> Optional[str]:
+    return normalize_rule(value) if value and value.strip() else None
 
 
 class TodoBase(BaseModel):
@@ -15,6 +47,14 @@ class TodoBase(BaseModel):
     status: str = "Not Started"
     due_date: Optional[date] = None
     priority: int = Field(default=2, ge=min(VALID_PRIORITIES), le=max(VALID_PRIORITIES))
+    # Set on subtasks; a todo never moves to another parent.
+    parent_id: Optional[int] = None
+    # RRULE-style repetition, e.g. "FREQ=WEEKLY;BYDAY=MO,WE" (app.core.recurrence).
+    recurrence_rule: Optional[str] = None
+
+    _check_recurrence_rule = field_validator("recurrence_rule")(
+        _normalize_recurrence_rule
+    )
 
 
 class TodoCreate(TodoBase):
@@ -33,6 +73,12 @@ class TodoUpdate(BaseModel):
     priority: Optional[int] = Field(
         default=None, ge=min(VALID_PRIORITIES), le=max(VALID_PRIORITIES)
     )
+    # None stops the todo repeating.
+    recurrence_rule: Optional[str] = None
+
+    _check_recurrence_rule = field_validator("recurrence_rule")(
+        _normalize_recurrence_rule
+    )
 
 
 class TodoInDBBase(TodoBase):
@@ -57,3 +103,69 @@ class Todo(TodoInDBBase):
     @property
     def priority_str(self) -> str:
         return PRIORITY_MAP.get(self.priority, "Unknown")
+
+
+class TodoSyncItem(Todo):
+    """A changed todo, with the version clients send back on update"""
+
+    version: int
+    tags: List[str] = []
+
+
+class TodoTombstone(BaseModel):
+    """A todo deleted since the client's high-water mark"""
+
+    id: int
+    deleted_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TodoSyncPage(BaseModel):
+    """
+    One page of changes for GET /todos/sync. Pass `since` (a change sequence
+    number) and `since_id` back to get the next page; `has_more` says whether
+    to do so right away. With `full_resync` the client's high-water mark is
+    too old for the deletes still on record: drop local todos and sync again
+    without one.
+    """
+
+    todos: List[TodoSyncItem] = []
+    deleted: List[TodoTombstone] = []
+    since: Optional[int] = None
+    since_id: Optional[int] = None
+    has_more: bool = False
+    full_resync: bool = False
+
+
+class TagSummary(BaseModel):
+    """A tag and how many of the user's todos carry it"""
+
+    name: str
+    todo_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class TodoStatsSummary(BaseModel):
+    """Counts shown as badges on the todo list"""
+
+    total: int = 0
+    not_started: int = 0
+    in_progress: int = 0
+    done: int = 0
+    priority_high: int = 0
+    priority_medium: int = 0
+    priority_low: int = 0
+    overdue: int = 0
+
+    class Config:
+        from_attributes = True
+
+    def for_status(self, status: str) -> int:
+        return getattr(self, STATUS_STATS_COLUMNS[status])
+
+    def for_priority(self, priority: int) -> int:
+        return getattr(self, PRIORITY_STATS_COLUMNS[priority])
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel, EmailStr
@@ -41,3 +42,13 @@ class UserInDB(UserInDBBase):
     """Additional properties stored in DB"""
 
     hashed_password: str
+
+
+class Principal(BaseModel):
+    """Authenticated user as carried by the access token, built without a DB query"""
+
+    id: int
+    email: str
+    is_active: bool = True
+    token_generation: int = 0
+    expires_at: Optional[datetime] = None
@@ -1,26 +1,96 @@
-from typing import Optional
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Union
 
 from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import verify_password, create_access_token
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.core.rate_limit import HashingLimiter, HashingBusy
+from app.core.security import (
+    dummy_verify_password,
+    get_password_hash,
+    verify_and_update_password,
+    create_access_token,
+    decode_access_token_claims,
+    TokenGenerationTable,
+    VerifiedTokenCache,
+    TOKEN_VERSION,
+)
 from app.crud import crud_user
 from app.db.models import User
-from app.schemas.user import UserCreate
+from app.schemas.user import UserCreate, Principal
+
+# How long the email filter keeps re-reading a user id it skipped over: an
+# INSERT that took a lower id but committed after a higher one. Ids still
+# missing after this belong to rolled-back signups (e.g. duplicate emails).
+EMAIL_FILTER_GAP_SECONDS = 300
+# Larger jumps in users.id come from a sequence reset, not in-flight signups.
+EMAIL_FILTER_MAX_GAP = 1_000
 
 
 class AuthService:
-    async def register_user(self, db: AsyncSession, user_in: UserCreate) -> User:
-        """Handles user registration business logic."""
+    def __init__(
+        self,
+        token_generations: Optional[TokenGenerationTable] = None,
+        hashing: Optional[HashingLimiter] = None,
+        token_cache: Optional[VerifiedTokenCache] = None,
+    ):
+        if token_generations is None:
+            token_generations = TokenGenerationTable()
+        self.token_generations = token_generations
+        if token_cache is None:
+            token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE)
+        self.token_cache = token_cache
+        self.hashing = hashing or HashingLimiter(
+            settings.AUTH_HASH_CONCURRENCY or os.cpu_count() or 1,
+            settings.AUTH_HASH_QUEUE_TIMEOUT_SECONDS,
+        )
+        # Registered emails; None until loaded, and then only ever grows.
+        self.email_filter: Optional[BloomFilter] = None
+        self._email_filter_last_id = 0
+        # Ids below _email_filter_last_id not loaded yet -> when first noticed.
+        self._email_filter_gaps: Dict[int, float] = {}
+        # Logins and the periodic job refresh concurrently; one at a time.
+        self._email_filter_lock = asyncio.Lock()
 
-        existing_user = await crud_user.get_user_by_email(db, email=user_in.email)
-        if existing_user:
+    async def _hash(self, fn, *args):
+        """Runs a password hash off the event loop, within the hashing limit."""
+        try:
+            return await self.hashing.run(fn, *args)
+        except HashingBusy:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, please retry shortly",
+                headers={"Retry-After": "1"},
             )
 
-        user = await crud_user.create_user(db=db, user_in=user_in)
+    async def register_user(self, db: AsyncSession, user_in: UserCreate) -> User:
+        """Handles user registration business logic."""
+
+        email_taken = HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered",
+        )
+        if self.email_might_exist(user_in.email):
+            existing_user = await crud_user.get_user_by_email(db, email=user_in.email)
+            if existing_user:
+                raise email_taken
+
+        hashed_password = await self._hash(get_password_hash, user_in.password)
+        try:
+            user = await crud_user.create_user(
+                db=db, user_in=user_in, hashed_password=hashed_password
+            )
+        except IntegrityError:
+            # Registered through another worker since our filter last refreshed.
+            raise email_taken
+        if self.email_filter is not None:
+            self.email_filter.add(user.email)
         return user
 
     async def authenticate_user(
@@ -28,17 +98,182 @@ class AuthService:
     ) -> Optional[User]:
         """Handles user authentication business logic."""
 
+        if not self.email_might_exist(email):
+            # A user who just signed up through another worker can be missing
+            # from this worker's filter; top it up (a keyset read past the
+            # last loaded id, normally empty) before trusting the miss.
+            await self.refresh_email_filter(db)
+            if not self.email_might_exist(email):
+                await self._hash(dummy_verify_password)
+                return None
+
         user = await crud_user.get_user_by_email(db, email=email)
 
         if not user:
+            await self._hash(dummy_verify_password)
             return None
-        if not verify_password(password, user.hashed_password):
+        verified, new_hash = await self._hash(
+            verify_and_update_password, password, user.hashed_password
+        )
+        if not verified or not user.is_active:
             return None
+        if new_hash:
+            # The stored hash predates the current hashing policy.
+            await crud_user.update_password_hash(
+                db, user=user, hashed_password=new_hash
+            )
 
         return user
 
-    def create_jwt_token(self, user: User) -> str:
+    async def warm_up(self) -> None:
+        """passlib builds its dummy hash on first use; pay for it before serving logins."""
+        await self._hash(dummy_verify_password)
+
+    def email_might_exist(self, email: str) -> bool:
+        """
+        False for emails not registered as of the filter's last refresh.
+        Signups may trust it, as the unique index catches the rest; logins
+        refresh the filter before trusting a miss (see authenticate_user).
+        """
+        return self.email_filter is None or self.email_filter.might_contain(email)
+
+    def email_filter_covers(self, user_id: int) -> bool:
+        """Whether the filter has already loaded the user with this id."""
+        return (
+            self.email_filter is not None
+            and user_id <= self._email_filter_last_id
+            and user_id not in self._email_filter_gaps
+        )
+
+    async def refresh_email_filter(self, db: AsyncSession) -> None:
+        """
+        Builds the filter on first call, then adds users created since the
+        previous call (e.g. through other workers). Users are never deleted,
+        so the filter never needs to forget an email.
+
+        Ids are assigned at INSERT but become visible at COMMIT, so a lower
+        id can appear after a higher one was loaded. Ids skipped over are
+        kept as gaps and re-read on every refresh until they show up or
+        EMAIL_FILTER_GAP_SECONDS have passed.
+        """
+        async with self._email_filter_lock:
+            await self._refresh_email_filter(db)
+
+    async def _refresh_email_filter(self, db: AsyncSession) -> None:
+        email_filter = self.email_filter
+        if email_filter is None:
+            user_count = await crud_user.count_users(db)
+            email_filter = BloomFilter(
+                max(settings.EMAIL_FILTER_CAPACITY, user_count * 2),
+                settings.EMAIL_FILTER_FALSE_POSITIVE_RATE,
+            )
+
+        now = time.monotonic()
+        gaps = self._email_filter_gaps
+        if gaps:
+            for user_id, email in await crud_user.get_user_emails_by_ids(
+                db, list(gaps)
+            ):
+                email_filter.add(email)
+                del gaps[user_id]
+            for user_id, noticed_at in list(gaps.items()):
+                if now - noticed_at > EMAIL_FILTER_GAP_SECONDS:
+                    del gaps[user_id]
+
+        while True:
+            batch = await crud_user.get_user_emails_after(
+                db, after_id=self._email_filter_last_id
+            )
+            if not batch:
+                break
+            previous_id = self._email_filter_last_id
+            for user_id, email in batch:
+                # Nothing to wait for below the first load.
+                if self.email_filter is not None and (
+                    1 < user_id - previous_id <= EMAIL_FILTER_MAX_GAP
+                ):
+                    gaps.update(dict.fromkeys(range(previous_id + 1, user_id), now))
+                email_filter.add(email)
+                previous_id = user_id
+            self._email_filter_last_id = batch[-1][0]
+        self.email_filter = email_filter
+
+    def create_jwt_token(self, user: Union[User, Principal]) -> str:
         """Generates JWT token for the user."""
 
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(
+            data={
+                "sub": user.email,
+                "uid": user.id,
+                "gen": user.token_generation,
+                "ver": TOKEN_VERSION,
+            }
+        )
         return access_token
+
+    async def get_principal_from_token(
+        self, db: AsyncSession, token: str
+    ) -> Optional[Principal]:
+        """
+        Resolves the user behind an access token. Versioned tokens are trusted
+        without a query, unless their generation has been revoked; older
+        tokens are looked up and checked against the user's generation.
+        """
+        claims = decode_access_token_claims(token, self.token_cache)
+        if claims is None:
+            return None
+
+        if claims.get("ver") == TOKEN_VERSION:
+            user_id = claims.get("uid")
+            if user_id is None:
+                return None
+            if claims.get("gen", 0) < self.token_generations.get(user_id):
+                return None
+            return Principal(
+                id=user_id,
+                email=claims["sub"],
+                token_generation=claims.get("gen", 0),
+                expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc),
+            )
+
+        user = await crud_user.get_user_by_email(db, email=claims["sub"])
+        if user is None or not user.is_active:
+            return None
+        if claims.get("gen", 0) < user.token_generation:
+            return None
+        return Principal(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            token_generation=user.token_generation,
+            expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc),
+        )
+
+    def renew_jwt_token_if_expiring(self, principal: Principal) -> Optional[str]:
+        """
+        Sliding session: reissues the token once less than
+        ACCESS_TOKEN_RENEW_MINUTES (at most half its lifetime) is left, so
+        active users never have to log in (and pay for a password hash) again.
+        """
+        if principal.expires_at is None:
+            return None
+        renew_window = timedelta(
+            minutes=min(
+                settings.ACCESS_TOKEN_RENEW_MINUTES,
+                settings.ACCESS_TOKEN_EXPIRE_MINUTES / 2,
+            )
+        )
+        if principal.expires_at - datetime.now(timezone.utc) > renew_window:
+            return None
+        return self.create_jwt_token(principal)
+
+    async def revoke_tokens(self, db: AsyncSession, user_id: int) -> None:
+        """
+        Invalidates every token issued to the user so far. Deactivating a
+        user must call this too: tokens do not carry the active flag.
+        """
+        generation = await crud_user.bump_token_generation(db, user_id=user_id)
+        self.token_generations.set(user_id, generation)
+
+    async def refresh_token_generations(self, db: AsyncSession) -> None:
+        self.token_generations.merge(await crud_user.get_token_generations(db))
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.core.idempotency import build_idempotency_store
+from app.core.invalidation import Invalidation, invalidation_bus
+from app.core.leader import AdvisoryLockLeader
+from app.core.pubsub import build_pubsub
+from app.core.rate_limit import BucketRule, RateLimiter, build_bucket_backend
+from app.core.security import TokenGenerationTable, VerifiedTokenCache
+from app.crud import crud_user
+from app.db.base import (
+    engine,
+    session_scope,
+    wait_for_after_commit_tasks,
+    AsyncSessionFactory,
+)
+from app.db.sharding import shard_router, DIRECTORY_STRATEGY
+from app.services.auth_service import AuthService
+from app.services.orchestrator_service import OrchestratorService
+from app.services.recurrence_scheduler import LEADER_LOCK_KEY, RecurrenceScheduler
+from app.services.status_buffer import StatusWriteBuffer
+from app.services.todo_events import TodoEventBroker
+from app.services.todo_service import TodoService
+
+
+class StartupTimeout(Exception):
+    """Raised by ServiceContainer.start when startup database work hangs."""
+
+
+class ServiceContainer:
+    """
+    Application-scoped holder for the stateless services and any long-lived
+    resources (caches, worker pools, storage clients) they depend on.
+    Created once in the lifespan hook and stored on `app.state.services`.
+    """
+
+    def __init__(self):
+        self.token_generations = TokenGenerationTable()
+        self.token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE)
+        self.auth_rate_limiter = RateLimiter(
+            build_bucket_backend(settings.AUTH_RATE_LIMIT_BACKEND, AsyncSessionFactory),
+            rules={
+                "ip": BucketRule(
+                    settings.AUTH_RATE_LIMIT_IP_BURST,
+                    settings.AUTH_RATE_LIMIT_IP_PER_MINUTE,
+                ),
+                "email": BucketRule(
+                    settings.AUTH_RATE_LIMIT_EMAIL_BURST,
+                    settings.AUTH_RATE_LIMIT_EMAIL_PER_MINUTE,
+                ),
+            },
+        )
+        self.idempotency_store = build_idempotency_store(
+            settings.IDEMPOTENCY_BACKEND,
+            settings.IDEMPOTENCY_TTL_SECONDS,
+            settings.IDEMPOTENCY_WAIT_SECONDS,
+            AsyncSessionFactory,
+        )
+        self.auth_service = AuthService(
+            token_generations=self.token_generations, token_cache=self.token_cache
+        )
+        self.pubsub = build_pubsub(
+            settings.PUBSUB_BACKEND, engine, settings.STARTUP_TIMEOUT_SECONDS
+        )
+        self.todo_events = (
+            TodoEventBroker(self.pubsub, settings.TODO_EVENTS_QUEUE_SIZE)
+            if settings.TODO_EVENTS_ENABLED
+            else None
+        )
+        self.status_buffer = (
+            StatusWriteBuffer(
+                settings.STATUS_WRITE_BUFFER_WINDOW_SECONDS,
+                events=self.todo_events,
+                max_attempts=settings.STATUS_WRITE_BUFFER_MAX_ATTEMPTS,
+            )
+            if settings.STATUS_WRITE_BUFFER_ENABLED
+            else None
+        )
+        self.todo_service = TodoService(
+            status_buffer=self.status_buffer, events=self.todo_events
+        )
+        self.orchestrator = OrchestratorService(
+            auth_service=self.auth_service, todo_service=self.todo_service
+        )
+        self.recurrence_scheduler = (
+            RecurrenceScheduler(
+                AdvisoryLockLeader(engine, LEADER_LOCK_KEY),
+                lead=timedelta(minutes=settings.RECURRENCE_LEAD_MINUTES),
+                lookahead=timedelta(minutes=settings.RECURRENCE_LOOKAHEAD_MINUTES),
+                tick_seconds=settings.RECURRENCE_TICK_SECONDS,
+                batch_size=settings.RECURRENCE_BATCH_SIZE,
+                events=self.todo_events,
+            )
+            if settings.RECURRENCE_SCHEDULER_ENABLED
+            else None
+        )
+        self._tasks: List[asyncio.Task] = []
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._refresh_again: Set[str] = set()
+
+        invalidation_bus.attach(self.pubsub)
+        invalidation_bus.on("user", self.on_user_invalidated)
+        if shard_router.enabled and shard_router.strategy == DIRECTORY_STRATEGY:
+            invalidation_bus.on("user_shard", self.on_user_shard_invalidated)
+        if self.recurrence_scheduler is not None:
+            invalidation_bus.on("recurrence", self.recurrence_scheduler.on_invalidated)
+
+    async def start(self) -> None:
+        """
+        Acquire long-lived resources. Called once at application startup.
+        Fails (and releases what it acquired) if the database does not answer
+        within STARTUP_TIMEOUT_SECONDS, rather than leaving the worker hanging.
+        """
+        try:
+            await self._start()
+        except BaseException:
+            await self.stop()
+            raise
+        print("ServiceContainer: Started.")
+
+    async def _start(self) -> None:
+        await self.pubsub.start()
+        await self.within_startup_timeout(self.refresh_token_generations)
+        self.run_periodically(
+            settings.TOKEN_GENERATION_REFRESH_SECONDS, self.refresh_token_generations
+        )
+        self.run_periodically(3600, self.auth_rate_limiter.backend.purge)
+        self.run_periodically(
+            settings.IDEMPOTENCY_TTL_SECONDS, self.idempotency_store.purge
+        )
+        await self.auth_service.warm_up()
+        if settings.EMAIL_FILTER_ENABLED:
+            await self.within_startup_timeout(self.refresh_email_filter)
+            self.run_periodically(
+                settings.EMAIL_FILTER_REFRESH_SECONDS, self.refresh_email_filter
+            )
+        if shard_router.enabled and shard_router.strategy == DIRECTORY_STRATEGY:
+            await self.within_startup_timeout(self.refresh_shard_directory)
+            self.run_periodically(
+                settings.SHARD_DIRECTORY_REFRESH_SECONDS, self.refresh_shard_directory
+            )
+        if self.recurrence_scheduler is not None:
+            self.recurrence_scheduler.start()
+
+    async def within_startup_timeout(self, job: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await asyncio.wait_for(job(), settings.STARTUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise StartupTimeout(
+                f"{job.__name__} did not finish within "
+                f"{settings.STARTUP_TIMEOUT_SECONDS}s; is the database reachable?"
+            ) from None
+
+    async def stop(self) -> None:
+        """Release long-lived resources. Called once at application shutdown."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        invalidation_bus.detach()
+        for task in self._refreshing.values():
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        if self.recurrence_scheduler is not None:
+            await self.recurrence_scheduler.stop()
+        if self.status_buffer is not None:
+            await self.status_buffer.flush_all()
+        await wait_for_after_commit_tasks()
+        await self.pubsub.stop()
+        await shard_router.dispose()
+        print("ServiceContainer: Stopped.")
+
+    def run_periodically(
+        self, interval_seconds: float, job: Callable[[], Awaitable[None]]
+    ) -> None:
+        """Runs `job` every `interval_seconds` until the container stops."""
+
+        async def loop():
+            while True:
+                await asyncio.sleep(interval_seconds)
+                try:
+                    await job()
+                except Exception:
+                    logging.exception(f"Periodic job {job.__name__} failed")
+
+        self._tasks.append(asyncio.create_task(loop(), name=job.__name__))
+
+    def refresh_soon(self, key: str, job: Callable[[], Awaitable[None]]) -> None:
+        """
+        Runs `job` in the background. Requests for the same `key` while it is
+        running coalesce into a single rerun, so a burst of invalidations
+        costs at most two refreshes.
+        """
+        if key in self._refreshing:
+            self._refresh_again.add(key)
+            return
+
+        async def run():
+            try:
+                while True:
+                    self._refresh_again.discard(key)
+                    try:
+                        await job()
+                    except Exception:
+                        logging.exception(f"Refresh {key} failed")
+                    if key not in self._refresh_again:
+                        return
+            finally:
+                del self._refreshing[key]
+
+        self._refreshing[key] = asyncio.create_task(run(), name=f"refresh_{key}")
+
+    def on_user_invalidated(self, invalidation: Optional[Invalidation]) -> None:
+        """Another worker created a user or revoked their tokens."""
+        if invalidation is None:
+            self.refresh_soon("token_generations", self.refresh_token_generations)
+            if settings.EMAIL_FILTER_ENABLED:
+                self.refresh_soon("email_filter", self.refresh_email_filter)
+            return
+        user_id, generation = invalidation.owner_id, invalidation.version
+        if generation is not None and generation > self.token_generations.get(user_id):
+            self.token_generations.set(user_id, generation)
+        if settings.EMAIL_FILTER_ENABLED and not self.auth_service.email_filter_covers(
+            user_id
+        ):
+            self.refresh_soon("email_filter", self.refresh_email_filter)
+
+    def on_user_shard_invalidated(self, invalidation: Optional[Invalidation]) -> None:
+        """A user was placed on or moved to a shard."""
+        if invalidation is None:
+            self.refresh_soon("shard_directory", self.refresh_shard_directory)
+            return
+        user_id = invalidation.owner_id
+        self.refresh_soon(
+            f"user_shard_{user_id}", lambda: self.refresh_user_shard(user_id)
+        )
+
+    async def refresh_user_shard(self, user_id: int) -> None:
+        async with session_scope() as db:
+            shard_id = await crud_user.get_user_shard(db, user_id)
+        if shard_id is not None:
+            shard_router.assign(user_id, shard_id)
+
+    async def refresh_shard_directory(self) -> None:
+        async with session_scope() as db:
+            shard_router.load_directory(await crud_user.get_shard_directory(db))
+
+    async def refresh_token_generations(self) -> None:
+        async with session_scope() as db:
+            await self.auth_service.refresh_token_generations(db)
+
+    async def refresh_email_filter(self) -> None:
+        async with session_scope() as db:
+            await self.auth_service.refresh_email_filter(db)
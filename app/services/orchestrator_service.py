@@ -1,12 +1,20 @@
-from typing import List, Optional
+from typing import AsyncContextManager, Dict, List, Optional, Sequence
 
 from fastapi import UploadFile, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.models import User, Todo
-from app.schemas.todo import TodoCreate, TodoUpdate
-from app.schemas.user import UserCreate
+from app.schemas.todo import (
+    TagSummary,
+    TodoCreate,
+    TodoUpdate,
+    TodoStatsSummary,
+    TodoSyncPage,
+)
+from app.schemas.user import UserCreate, Principal
 from app.services.auth_service import AuthService
+from app.services.todo_events import Subscription
 from app.services.todo_service import TodoService
 
 
@@ -16,9 +24,13 @@ class OrchestratorService:
     Acts as the primary entry point for business logic from the presentation layer.
     """
 
-    def __init__(self):
-        self.auth_service = AuthService()
-        self.todo_service = TodoService()
+    def __init__(
+        self,
+        auth_service: Optional[AuthService] = None,
+        todo_service: Optional[TodoService] = None,
+    ):
+        self.auth_service = auth_service or AuthService()
+        self.todo_service = todo_service or TodoService()
 
     async def handle_signup(self, db: AsyncSession, user_in: UserCreate) -> User:
         """Orchestrates the user signup process."""
@@ -42,18 +54,27 @@ class OrchestratorService:
         print("Orchestrator: Login successful, token generated.")
         return user, token
 
+    async def handle_logout_everywhere(self, db: AsyncSession, user: Principal) -> None:
+        """Orchestrates signing the user out of every device."""
+        print(f"Orchestrator: Revoking all tokens for user {user.email}...")
+        await self.auth_service.revoke_tokens(db=db, user_id=user.id)
+        print("Orchestrator: Tokens revoked.")
+
     async def get_todos_for_user(
         self,
         db: AsyncSession,
-        user: User,
+        user: Principal,
         filter_status: Optional[str] = None,
         filter_priority: Optional[int] = None,
         sort_by: str = "created_at",
         search_term: Optional[str] = None,
+        tag_names: Sequence[str] = (),
+        match_all_tags: bool = True,
+        include_archived: bool = False,
     ) -> List[Todo]:
         """Orchestrates fetching todos for a specific user with filtering/sorting."""
         print(
-            f"Orchestrator: Getting todos for user {user.email} (Filters: status={filter_status}, priority={filter_priority}, Sort: {sort_by}, Search: '{search_term}')"
+            f"Orchestrator: Getting todos for user {user.email} (Filters: status={filter_status}, priority={filter_priority}, tags={list(tag_names)} ({'all' if match_all_tags else 'any'}), Sort: {sort_by}, Search: '{search_term}')"
         )
         todos = await self.todo_service.get_user_todos(
             db=db,
@@ -62,12 +83,58 @@ class OrchestratorService:
             filter_priority=filter_priority,
             sort_by=sort_by,
             search_term=search_term,
+            tag_names=tag_names,
+            match_all_tags=match_all_tags,
+            include_archived=include_archived,
         )
         print(f"Orchestrator: Found {len(todos)} todos.")
         return todos
 
+    async def get_tags_for_todos(
+        self, db: AsyncSession, user: Principal, todos: List[Todo]
+    ) -> Dict[int, List[str]]:
+        """Orchestrates loading the tags of a page of todos."""
+        return await self.todo_service.get_tags_for_todos(db=db, user=user, todos=todos)
+
+    async def get_tags_for_user(
+        self, db: AsyncSession, user: Principal
+    ) -> List[TagSummary]:
+        """Orchestrates fetching a user's tags and their counts."""
+        return await self.todo_service.get_user_tags(db=db, user=user)
+
+    async def get_todo_stats_for_user(
+        self, db: AsyncSession, user: Principal
+    ) -> TodoStatsSummary:
+        """Orchestrates fetching the badge counts for a user's todos."""
+        return await self.todo_service.get_user_todo_stats(db=db, user=user)
+
+    async def get_todo_changes_for_user(
+        self,
+        db: AsyncSession,
+        user: Principal,
+        since: Optional[int] = None,
+        since_id: int = 0,
+        limit: int = settings.SYNC_PAGE_SIZE,
+    ) -> TodoSyncPage:
+        """Orchestrates fetching a user's todo changes for an offline client."""
+        print(
+            f"Orchestrator: Syncing todos for user {user.email} since ({since}, {since_id})"
+        )
+        page = await self.todo_service.get_todo_changes(
+            db=db, user=user, since=since, since_id=since_id, limit=limit
+        )
+        print(f"Orchestrator: {len(page.todos)} changed, {len(page.deleted)} deleted.")
+        return page
+
+    def subscribe_to_todo_events(
+        self, user: Principal
+    ) -> AsyncContextManager[Subscription]:
+        """Orchestrates a live stream of a user's todo changes."""
+        print(f"Orchestrator: Opening todo event stream for user {user.email}")
+        return self.todo_service.subscribe_to_changes(user)
+
     async def get_single_todo_for_user(
-        self, db: AsyncSession, todo_id: int, user: User
+        self, db: AsyncSession, todo_id: int, user: Principal
     ) -> Todo:
         """Orchestrates fetching a single todo, ensuring ownership."""
 
@@ -78,19 +145,28 @@ class OrchestratorService:
         print(f"Orchestrator: Found todo ID {todo_id}.")
         return todo
 
+    async def get_subtasks_for_user(
+        self, db: AsyncSession, todo_id: int, user: Principal
+    ) -> List[Todo]:
+        """Orchestrates fetching the subtasks below one of a user's todos."""
+        return await self.todo_service.get_todo_subtasks(
+            db=db, todo_id=todo_id, user=user
+        )
+
     async def add_todo_for_user(
         self,
         db: AsyncSession,
         todo_in: TodoCreate,
-        user: User,
+        user: Principal,
         photo: Optional[UploadFile] = None,
+        tag_names: Sequence[str] = (),
     ) -> Todo:
         """Orchestrates adding a new todo for a user."""
 
         print(f"Orchestrator: Adding todo '{todo_in.title}' for user {user.email}")
         try:
             todo = await self.todo_service.create_new_todo(
-                db=db, todo_in=todo_in, user=user, photo=photo
+                db=db, todo_in=todo_in, user=user, photo=photo, tag_names=tag_names
             )
             print(f"Orchestrator: Todo added successfully (ID: {todo.id}).")
             return todo
@@ -106,14 +182,25 @@ class OrchestratorService:
             )
 
     async def update_todo_for_user(
-        self, db: AsyncSession, todo_id: int, todo_in: TodoUpdate, user: User
+        self,
+        db: AsyncSession,
+        todo_id: int,
+        todo_in: TodoUpdate,
+        user: Principal,
+        expected_version: Optional[int] = None,
+        tag_names: Optional[Sequence[str]] = None,
     ) -> Todo:
         """Orchestrates updating a todo for a user."""
 
         print(f"Orchestrator: Updating todo ID {todo_id} for user {user.email}")
         try:
             updated_todo = await self.todo_service.update_existing_todo(
-                db=db, todo_id=todo_id, todo_in=todo_in, user=user
+                db=db,
+                todo_id=todo_id,
+                todo_in=todo_in,
+                user=user,
+                expected_version=expected_version,
+                tag_names=tag_names,
             )
             print(f"Orchestrator: Todo ID {todo_id} updated successfully.")
             return updated_todo
@@ -128,8 +215,41 @@ class OrchestratorService:
                 detail="An unexpected error occurred while updating the todo.",
             )
 
+    async def update_todo_status_for_user(
+        self,
+        db: AsyncSession,
+        todo_id: int,
+        status_val: str,
+        user: Principal,
+        expected_version: Optional[int] = None,
+    ) -> None:
+        """Orchestrates changing only a todo's status for a user."""
+
+        print(
+            f"Orchestrator: Updating status of todo ID {todo_id} for user {user.email}"
+        )
+        try:
+            await self.todo_service.update_todo_status(
+                db=db,
+                todo_id=todo_id,
+                status_val=status_val,
+                user=user,
+                expected_version=expected_version,
+            )
+            print(f"Orchestrator: Todo ID {todo_id} status updated successfully.")
+        except HTTPException as e:
+            print(f"Orchestrator: Error updating todo status - {e.detail}")
+            raise e
+        except Exception as e:
+            print(f"Orchestrator: Unexpected error updating todo status - {e}")
+
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred while updating the todo status.",
+            )
+
     async def delete_todo_for_user(
-        self, db: AsyncSession, todo_id: int, user: User
+        self, db: AsyncSession, todo_id: int, user: Principal
     ) -> None:
         """Orchestrates deleting a todo for a user."""
         print(f"Orchestrator: Deleting todo ID {todo_id} for user {user.email}")
@@ -149,6 +269,23 @@ class OrchestratorService:
                 detail="An unexpected error occurred while deleting the todo.",
             )
 
+    async def restore_todo_for_user(
+        self, db: AsyncSession, todo_id: int, user: Principal
+    ) -> None:
+        """Orchestrates undoing a todo delete for a user."""
+        print(f"Orchestrator: Restoring todo ID {todo_id} for user {user.email}")
+        try:
+            await self.todo_service.restore_deleted_todo(
+                db=db, todo_id=todo_id, user=user
+            )
+            print(f"Orchestrator: Todo ID {todo_id} restored successfully.")
+        except HTTPException as e:
+            print(f"Orchestrator: Error restoring todo - {e.detail}")
+            raise e
+        except Exception as e:
+            print(f"Orchestrator: Unexpected error restoring todo - {e}")
 
-def get_orchestrator() -> OrchestratorService:
-    return OrchestratorService()
+            raise HTTPException(
+                status_code=500,
+                detail="An unexpected error occurred while restoring the todo.",
+            )
@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.invalidation import Invalidation
+from app.core.leader import AdvisoryLockLeader
+from app.crud import crud_todo
+from app.db.base import session_scope
+from app.db.models import Todo
+from app.db.sharding import shard_router
+from app.services.todo_events import TodoEvent, TodoEventBroker
+
+# pg_try_advisory_lock key of the scheduler; any constant no other lock uses.
+LEADER_LOCK_KEY = 4_902_351
+
+
+class RecurrenceScheduler:
+    """
+    Creates the next instance of repeating todos (RECURRENCE_SCHEDULER_ENABLED).
+
+    Each series stores when its next occurrence starts (recurrence_next_at,
+    indexed). Instead of scanning every rule on each tick, the scheduler
+    keeps the occurrences starting within `lead + lookahead` in a heap,
+    loaded shard by shard with keyset range scans that resume where the
+    previous one stopped, and pops those starting within `lead`: a todo
+    due tomorrow appears `lead` before midnight. Due series are created in
+    batches of `batch_size`, one transaction each.
+
+    Only one worker schedules: the one holding the advisory lock of
+    `leader`; the others just keep asking. Edits that move a series'
+    next occurrence arrive as "recurrence" invalidations and make the
+    leader rescan that shard.
+    """
+
+    def __init__(
+        self,
+        leader: AdvisoryLockLeader,
+        lead: timedelta,
+        lookahead: timedelta,
+        tick_seconds: float,
+        batch_size: int = 500,
+        events: Optional[TodoEventBroker] = None,
+    ):
+        self.leader = leader
+        self.lead = lead
+        self.lookahead = lookahead
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        # Bounds the heap when a large backlog is due at once (e.g. after an
+        # outage); the rest is loaded on later rounds, in order.
+        self.max_queued = batch_size * 20
+        self.events = events
+        self._heap: List[Tuple[datetime, str, int]] = []
+        # (shard_id, todo_id) -> starts_at of its live heap entry.
+        self._queued: Dict[Tuple[str, int], datetime] = {}
+        # Per shard, the (recurrence_next_at, id) keyset loaded up to.
+        self._cursors: Dict[str, Tuple[datetime, int]] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="recurrence_scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.leader.release()
+
+    def on_invalidated(self, invalidation: Optional[Invalidation]) -> None:
+        """A series was created, edited or deleted; rescan its shard."""
+        if invalidation is None:
+            self._cursors.clear()
+        else:
+            self._cursors.pop(shard_router.shard_for(invalidation.owner_id), None)
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logging.exception("Recurrence scheduler round failed")
+            delay = self.tick_seconds
+            if self._heap:
+                due_at = self._heap[0][0] - self.lead
+                delay = min(
+                    delay, (due_at - datetime.now(timezone.utc)).total_seconds()
+                )
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(delay, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """Loads, then creates everything due; returns how many todos were created."""
+        if not await self.leader.is_leader():
+            self._reset()
+            return 0
+        now = now or datetime.now(timezone.utc)
+        due_by = now + self.lead
+        horizon = due_by + self.lookahead
+        for shard_id in shard_router.owner_shard_ids():
+            await self._load(shard_id, horizon)
+
+        due: Dict[str, List[int]] = {}
+        while self._heap and self._heap[0][0] <= due_by:
+            starts_at, shard_id, todo_id = heapq.heappop(self._heap)
+            if self._queued.get((shard_id, todo_id)) != starts_at:
+                continue  # superseded by a later load
+            del self._queued[(shard_id, todo_id)]
+            due.setdefault(shard_id, []).append(todo_id)
+
+        today = now.astimezone().date()
+        created = 0
+        for shard_id, todo_ids in due.items():
+            for start in range(0, len(todo_ids), self.batch_size):
+                batch = todo_ids[start : start + self.batch_size]
+                try:
+                    instances = await self._create(shard_id, batch, due_by, today)
+                except Exception:
+                    logging.exception(
+                        f"Creating {len(batch)} recurring todos on {shard_id} failed"
+                    )
+                    instances = {}
+                if len(instances) < len(batch):
+                    # Locked, failed or no longer due: the next scan decides.
+                    self._cursors.pop(shard_id, None)
+                for instance in instances.values():
+                    if instance is None:
+                        continue
+                    created += 1
+                    starts_at = instance.recurrence_next_at
+                    if starts_at is not None and starts_at <= horizon:
+                        self._push(shard_id, instance.id, starts_at)
+        if created:
+            logging.info(
+                f"Recurrence scheduler: created {created} todos, "
+                f"{len(self._queued)} queued"
+            )
+        return created
+
+    async def _load(self, shard_id: str, horizon: datetime) -> None:
+        while len(self._queued) < self.max_queued:
+            async with session_scope() as db:
+                rows = await crud_todo.get_recurrences_due(
+                    db,
+                    shard_id=shard_id,
+                    until=horizon,
+                    after=self._cursors.get(shard_id),
+                    limit=self.batch_size,
+                )
+            for todo_id, starts_at in rows:
+                self._push(shard_id, todo_id, starts_at)
+            if rows:
+                todo_id, starts_at = rows[-1]
+                self._cursors[shard_id] = (starts_at, todo_id)
+            if len(rows) < self.batch_size:
+                return
+
+    async def _create(
+        self, shard_id: str, todo_ids: List[int], due_by: datetime, today: date
+    ) -> Dict[int, Optional[Todo]]:
+        async with session_scope() as db:
+            instances = await crud_todo.create_next_occurrences(
+                db, shard_id=shard_id, todo_ids=todo_ids, due_by=due_by, today=today
+            )
+            if self.events is not None:
+                for instance in instances.values():
+                    if instance is not None:
+                        self.events.publish_after_commit(
+                            db,
+                            TodoEvent(
+                                "created",
+                                instance.owner_id,
+                                instance.id,
+                                instance.version,
+                            ),
+                        )
+        return instances
+
+    def _push(self, shard_id: str, todo_id: int, starts_at: datetime) -> None:
+        if self._queued.get((shard_id, todo_id)) == starts_at:
+            return
+        self._queued[(shard_id, todo_id)] = starts_at
+        heapq.heappush(self._heap, (starts_at, shard_id, todo_id))
+
+    def _reset(self) -> None:
+        self._heap.clear()
+        self._queued.clear()
+        self._cursors.clear()
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.crud import crud_todo, crud_todo_stats
+from app.db.base import session_scope
+from app.db.models import Todo
+from app.services.todo_events import TodoEvent, TodoEventBroker
+
+
+@dataclass
+class PendingStatus:
+    status: str
+    expected_version: Optional[int]
+    # Stored counter change for this todo, known once its row has been read.
+    stats_delta: Optional[Dict[str, int]] = None
+    # Failed writes of this change so far.
+    attempts: int = 0
+
+
+class StatusWriteBuffer:
+    """
+    Write-behind buffer for status changes (STATUS_WRITE_BUFFER_ENABLED).
+
+    Status clicks are collected per user and written `window_seconds` after
+    the first one, as one batched UPDATE, so a burst of triage clicks costs
+    one transaction instead of one per click. Repeated clicks on the same
+    todo coalesce to the last status.
+
+    Reads keep seeing the user's own changes: the list page overlays
+    pending statuses onto the rows it loaded, and anything that cannot be
+    overlaid (a status filter, another write, the edit form) flushes the
+    user's changes first. The container flushes everything on shutdown.
+
+    A failed write is retried the next window, up to `max_attempts` times
+    per change, after which the change is logged and dropped. The buffer is
+    per worker process; a crash loses at most one window of status clicks.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        max_pending_per_user: int = 100,
+        events: Optional[TodoEventBroker] = None,
+        max_attempts: int = 5,
+    ):
+        self.window_seconds = window_seconds
+        self.events = events
+        self.max_pending_per_user = max_pending_per_user
+        self.max_attempts = max_attempts
+        # Set by flush_all: failed writes are retried there, not on a timer.
+        self._stopping = False
+        self._pending: Dict[int, Dict[int, PendingStatus]] = {}
+        self._timers: Dict[int, asyncio.Task] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    def has_pending(self, user_id: int) -> bool:
+        return bool(self._pending.get(user_id))
+
+    async def add(
+        self,
+        user_id: int,
+        todo_id: int,
+        status: str,
+        expected_version: Optional[int] = None,
+    ) -> None:
+        pending = self._pending.setdefault(user_id, {})
+        previous = pending.get(todo_id)
+        if previous is not None:
+            # Keep the version of the first click: later clicks were made on
+            # pages showing the overlaid status but the same stored version.
+            expected_version = previous.expected_version
+        pending[todo_id] = PendingStatus(status, expected_version)
+
+        if len(pending) >= self.max_pending_per_user:
+            await self.flush_user(user_id)
+        elif user_id not in self._timers:
+            self._timers[user_id] = asyncio.create_task(
+                self._flush_later(user_id), name=f"status_flush_{user_id}"
+            )
+
+    async def _flush_later(self, user_id: int) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._timers.pop(user_id, None)
+        await self.flush_user(user_id)
+
+    async def wait_for_flush(self, user_id: int) -> None:
+        """Waits until a flush already writing this user's changes has committed."""
+        while (task := self._inflight.get(user_id)) is not None:
+            await asyncio.shield(task)
+
+    async def flush_user(self, user_id: int) -> None:
+        """Writes the user's pending changes now and waits for the commit."""
+        await self.wait_for_flush(user_id)
+        timer = self._timers.pop(user_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        changes = self._pending.pop(user_id, None)
+        if not changes:
+            return
+
+        # Shielded so a client disconnecting mid-flush cannot drop the writes.
+        task = asyncio.create_task(self._write(user_id, changes))
+        self._inflight[user_id] = task
+        try:
+            await asyncio.shield(task)
+        finally:
+            if self._inflight.get(user_id) is task:
+                del self._inflight[user_id]
+
+    async def flush_all(self) -> None:
+        """
+        Writes every user's pending changes, on shutdown. Failed writes are
+        retried a window apart until each change runs out of attempts; what
+        still cannot be written is logged as lost.
+        """
+        self._stopping = True
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for attempt in range(self.max_attempts):
+            user_ids = list(self._pending.keys() | self._inflight.keys())
+            if not user_ids:
+                return
+            if attempt:
+                await asyncio.sleep(self.window_seconds)
+            for user_id in user_ids:
+                await self.flush_user(user_id)
+        for user_id, changes in self._pending.items():
+            logging.error(
+                f"Dropping {len(changes)} unwritten status changes for user "
+                f"{user_id} at shutdown: {self._describe(changes)}"
+            )
+        self._pending.clear()
+
+    async def _write(self, user_id: int, changes: Dict[int, PendingStatus]) -> None:
+        try:
+            async with session_scope() as db:
+                updated = await crud_todo.update_todo_statuses(
+                    db,
+                    owner_id=user_id,
+                    changes={
+                        todo_id: (change.status, change.expected_version)
+                        for todo_id, change in changes.items()
+                    },
+                )
+                if self.events is not None:
+                    for todo_id in updated:
+                        self.events.publish_after_commit(
+                            db, TodoEvent("updated", user_id, todo_id)
+                        )
+        except Exception:
+            logging.exception(
+                f"Flushing {len(changes)} status changes for user {user_id} failed"
+            )
+            # Put them back behind any newer clicks and try again next window.
+            pending = self._pending.setdefault(user_id, {})
+            dropped = {}
+            for todo_id, change in changes.items():
+                change.attempts += 1
+                if change.attempts >= self.max_attempts:
+                    dropped[todo_id] = change
+                else:
+                    pending.setdefault(todo_id, change)
+            if dropped:
+                logging.error(
+                    f"Dropping {len(dropped)} status changes for user {user_id} "
+                    f"after {self.max_attempts} failed writes: "
+                    f"{self._describe(dropped)}"
+                )
+            if not pending:
+                del self._pending[user_id]
+            elif user_id not in self._timers and not self._stopping:
+                self._timers[user_id] = asyncio.create_task(
+                    self._flush_later(user_id), name=f"status_flush_{user_id}"
+                )
+            return
+        logging.info(
+            f"Flushed {len(updated)} of {len(changes)} buffered status changes "
+            f"for user {user_id}"
+        )
+
+    @staticmethod
+    def _describe(changes: Dict[int, PendingStatus]) -> str:
+        return ", ".join(
+            f"todo {todo_id} -> {change.status}" for todo_id, change in changes.items()
+        )
+
+    def snapshot(self, user_id: int) -> Dict[int, PendingStatus]:
+        """
+        The user's pending changes, taken before a read so they can still be
+        overlaid if a flush commits while the read is running.
+        """
+        return dict(self._pending.get(user_id, {}))
+
+    def overlay(self, pending: Dict[int, PendingStatus], todos: List[Todo]) -> None:
+        """Shows pending statuses on loaded rows, without marking them dirty."""
+        today = date.today()
+        for todo in todos:
+            change = pending.get(todo.id)
+            if change is None:
+                continue
+            change.stats_delta = crud_todo_stats.diff_contributions(
+                crud_todo_stats.contribution_of(todo, today),
+                crud_todo_stats.todo_contribution(
+                    change.status, todo.priority, todo.due_date, today
+                ),
+            )
+            set_committed_value(todo, "status", change.status)
+
+    def stats_delta(self, user_id: int) -> Optional[Dict[str, int]]:
+        """
+        Net counter change of the user's pending statuses, or None if some
+        pending todo has not been read yet (the caller should flush instead).
+        """
+        delta: Dict[str, int] = {}
+        for change in self._pending.get(user_id, {}).values():
+            if change.stats_delta is None:
+                return None
+            for column, value in change.stats_delta.items():
+                delta[column] = delta.get(column, 0) + value
+        return delta
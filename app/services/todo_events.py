@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.base import after_commit
+
+CHANNEL = "todo_events"
+# Sent instead of the events a connection missed; the client reloads its list.
+RESYNC = "resync"
+# NOTIFY payloads are capped at 8000 bytes; stay well below with small batches.
+MAX_BATCH = 100
+
+
+@dataclass(frozen=True)
+class TodoEvent:
+    type: str  # "created", "updated", "deleted", "restored" or RESYNC
+    owner_id: int
+    todo_id: Optional[int] = None
+    version: Optional[int] = None
+
+    def for_client(self) -> dict:
+        return {"type": self.type, "todo_id": self.todo_id, "version": self.version}
+
+
+class Subscription:
+    """
+    One open event stream. Its queue is bounded: when the client falls that
+    far behind, the queued events are replaced by a single RESYNC and nothing
+    more is queued until it has been read, so a slow connection costs
+    constant memory and never slows down the writers.
+    """
+
+    def __init__(self, owner_id: int, queue_size: int):
+        self.owner_id = owner_id
+        self._queue: "asyncio.Queue[TodoEvent]" = asyncio.Queue(queue_size)
+        self._resyncing = False
+
+    def offer(self, todo_event: TodoEvent) -> None:
+        if self._resyncing:
+            return
+        if todo_event.type == RESYNC or self._queue.full():
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._resyncing = True
+            todo_event = TodoEvent(RESYNC, self.owner_id)
+        self._queue.put_nowait(todo_event)
+
+    async def get(self) -> TodoEvent:
+        todo_event = await self._queue.get()
+        if todo_event.type == RESYNC:
+            self._resyncing = False
+        return todo_event
+
+
+class TodoEventBroker:
+    """
+    Fans todo changes out to the user's open event streams (tabs, devices).
+
+    Events are published through a pubsub backend (app.core.pubsub) so that
+    streams held by other workers see them too; each worker then hands them
+    to its own subscriptions for that owner. Writers publish with
+    `publish_after_commit`, so nobody is told about a change that is rolled
+    back or that they cannot read yet.
+    """
+
+    def __init__(self, pubsub, queue_size: int):
+        self.pubsub = pubsub
+        self.queue_size = queue_size
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        pubsub.subscribe(CHANNEL, self._dispatch)
+
+    @asynccontextmanager
+    async def subscribe(self, owner_id: int) -> AsyncIterator[Subscription]:
+        subscription = Subscription(owner_id, self.queue_size)
+        self._subscriptions.setdefault(owner_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscriptions = self._subscriptions.get(owner_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[owner_id]
+
+    async def publish(self, todo_events: List[TodoEvent]) -> None:
+        # One message per commit, in commit order, split to fit NOTIFY.
+        entries = [
+            [event.type, event.owner_id, event.todo_id, event.version]
+            for event in todo_events
+        ]
+        for i in range(0, len(entries), MAX_BATCH):
+            try:
+                await self.pubsub.publish(
+                    CHANNEL, {"items": entries[i : i + MAX_BATCH]}
+                )
+            except Exception:
+                # A lost notification only delays other tabs; never fail the write for it.
+                logging.exception(f"Publishing {len(entries)} todo events failed")
+
+    def publish_after_commit(self, db: AsyncSession, todo_event: TodoEvent) -> None:
+        """Publishes `todo_event` once the session's transaction commits."""
+        after_commit(db, CHANNEL, todo_event, self.publish)
+
+    def _dispatch(self, message: Optional[dict]) -> None:
+        if message is None:
+            for subscriptions in self._subscriptions.values():
+                for subscription in subscriptions:
+                    subscription.offer(TodoEvent(RESYNC, subscription.owner_id))
+            return
+        for entry in message["items"]:
+            todo_event = TodoEvent(*entry)
+            for subscription in self._subscriptions.get(todo_event.owner_id, ()):
+                subscription.offer(todo_event)
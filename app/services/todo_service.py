@@ -1,5 +1,5 @@
 import logging
-from typing import List, Optional
+from typing import AsyncContextManager, Dict, List, Optional, Sequence
 from uuid import uuid4
 from datetime import date
 
@@ -9,11 +9,24 @@ import cloudinary.uploader
 from cloudinary.exceptions import Error as CloudinaryError
 from fastapi import HTTPException, status, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
 from app.core.config import settings
-from app.crud import crud_todo
-from app.db.models import Todo, User
-from app.schemas.todo import TodoCreate, TodoUpdate
+from app.crud import crud_tag, crud_todo, crud_todo_stats
+from app.db.models import Todo
+from app.db.sharding import OwnerMoved
+from app.schemas.todo import (
+    TagSummary,
+    TodoCreate,
+    TodoUpdate,
+    TodoStatsSummary,
+    TodoSyncItem,
+    TodoSyncPage,
+    TodoTombstone,
+)
+from app.schemas.user import Principal
+from app.services.status_buffer import StatusWriteBuffer
+from app.services.todo_events import Subscription, TodoEvent, TodoEventBroker
 
 if settings.CLOUDINARY_URL:
     try:
@@ -28,29 +41,171 @@ else:
 
 
 class TodoService:
+    def __init__(
+        self,
+        status_buffer: Optional[StatusWriteBuffer] = None,
+        events: Optional[TodoEventBroker] = None,
+    ):
+        self.status_buffer = status_buffer
+        self.events = events
+
+    def _publish(self, db: AsyncSession, event_type: str, todo: Todo) -> None:
+        """Tells the owner's other tabs and devices about a change once it commits."""
+        if self.events is not None:
+            self.events.publish_after_commit(
+                db, TodoEvent(event_type, todo.owner_id, todo.id, todo.version)
+            )
+
+    def subscribe_to_changes(
+        self, user: Principal
+    ) -> AsyncContextManager[Subscription]:
+        """Live change events for the user's todos, for as long as the block runs."""
+        if self.events is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Live updates are not enabled.",
+            )
+        return self.events.subscribe(user.id)
+
+    async def _flush_status_changes(self, user: Principal) -> None:
+        """Writes buffered status clicks before reads or writes that cannot overlay them."""
+        if self.status_buffer is not None:
+            await self.status_buffer.flush_user(user.id)
+
+    async def _moved_away(self, db: AsyncSession) -> HTTPException:
+        """
+        The user's todos moved to another shard while this write was on its
+        way (app.jobs.shards move). Drops what it wrote on the old shard; the
+        router already points at the new one, so a retry lands there.
+        """
+        await db.rollback()
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Your todos are being moved. Please try again.",
+            headers={"Retry-After": "1"},
+        )
+
     async def get_user_todos(
         self,
         db: AsyncSession,
-        user: User,
+        user: Principal,
         filter_status: Optional[str] = None,
         filter_priority: Optional[int] = None,
         sort_by: str = "created_at",
         search_term: Optional[str] = None,
+        tag_names: Sequence[str] = (),
+        match_all_tags: bool = True,
+        include_archived: bool = False,
     ) -> List[Todo]:
-        """Get todos for the current user with filtering and sorting."""
-        return await crud_todo.get_todos_by_owner(
+        """
+        Get todos for the current user with filtering and sorting. Archived
+        todos are all Done, so the archive is only read for the Done filter
+        or when history is explicitly requested for an unfiltered list.
+        """
+        pending = {}
+        if self.status_buffer is not None:
+            if filter_status:
+                await self.status_buffer.flush_user(user.id)
+            else:
+                await self.status_buffer.wait_for_flush(user.id)
+                pending = self.status_buffer.snapshot(user.id)
+
+        todos = await crud_todo.get_todos_by_owner(
             db=db,
             owner_id=user.id,
             filter_status=filter_status,
             filter_priority=filter_priority,
             sort_by=sort_by,
             search_term=search_term,
+            tag_names=tag_names,
+            match_all_tags=match_all_tags,
+            include_archived=filter_status == "Done"
+            or (include_archived and not filter_status),
+            max_depth=settings.TODO_MAX_SUBTASK_DEPTH,
         )
+        if pending:
+            self.status_buffer.overlay(pending, todos)
+        return todos
+
+    async def get_tags_for_todos(
+        self, db: AsyncSession, user: Principal, todos: List[Todo]
+    ) -> Dict[int, List[str]]:
+        """Tag names per todo id for a page of todos, in a single query."""
+        return await crud_tag.get_tags_for_todos(
+            db=db, owner_id=user.id, todo_ids=[todo.id for todo in todos]
+        )
+
+    async def get_user_tags(
+        self, db: AsyncSession, user: Principal
+    ) -> List[TagSummary]:
+        """Get the current user's tags with how many todos carry each."""
+        tags = await crud_tag.get_tags_by_owner(db=db, owner_id=user.id)
+        return [TagSummary.model_validate(tag) for tag in tags]
+
+    async def get_user_todo_stats(
+        self, db: AsyncSession, user: Principal
+    ) -> TodoStatsSummary:
+        """Get the precomputed status/priority/overdue counts for the current user."""
+        delta = None
+        if self.status_buffer is not None and self.status_buffer.has_pending(user.id):
+            delta = self.status_buffer.stats_delta(user.id)
+            if delta is None:
+                await self.status_buffer.flush_user(user.id)
+
+        stats = await crud_todo_stats.get_todo_stats(db=db, owner_id=user.id)
+        for column, value in (delta or {}).items():
+            setattr(stats, column, getattr(stats, column) + value)
+        return stats
+
+    async def get_todo_changes(
+        self,
+        db: AsyncSession,
+        user: Principal,
+        since: Optional[int] = None,
+        since_id: int = 0,
+        limit: int = settings.SYNC_PAGE_SIZE,
+    ) -> TodoSyncPage:
+        """
+        Get the todos changed after the client's (since, since_id) high-water
+        mark, deleted ones as tombstones. Tombstones only live until the
+        purge_todos job removes the row, so a mark older than the newest
+        purged one needs a full resync.
+        """
+        if since is not None:
+            # The client may not have seen a tombstone numbered `since` either.
+            purged_seq = await crud_todo_stats.get_purged_seq(db, owner_id=user.id)
+            if purged_seq and since <= purged_seq:
+                return TodoSyncPage(full_resync=True)
+
+        await self._flush_status_changes(user)
+        changed = await crud_todo.get_todo_changes(
+            db=db, owner_id=user.id, since=since, since_id=since_id, limit=limit + 1
+        )
+        page = TodoSyncPage(
+            since=since, since_id=since_id if since is not None else None
+        )
+        page.has_more = len(changed) > limit
+        changed = changed[:limit]
+        tags = await crud_tag.get_tags_for_todos(
+            db=db,
+            owner_id=user.id,
+            todo_ids=[todo.id for todo in changed if todo.deleted_at is None],
+        )
+        for todo in changed:
+            if todo.deleted_at is None:
+                item = TodoSyncItem.model_validate(todo)
+                item.tags = tags.get(todo.id, [])
+                page.todos.append(item)
+            else:
+                page.deleted.append(TodoTombstone.model_validate(todo))
+            page.since, page.since_id = todo.change_seq, todo.id
+        return page
 
     async def get_todo_for_user(
-        self, db: AsyncSession, todo_id: int, user: User
+        self, db: AsyncSession, todo_id: int, user: Principal
     ) -> Optional[Todo]:
         """Get a single todo item ensuring it belongs to the user."""
+        await self._flush_status_changes(user)
         todo = await crud_todo.get_todo(db=db, todo_id=todo_id, owner_id=user.id)
         if not todo:
             raise HTTPException(
@@ -58,14 +213,70 @@ class TodoService:
             )
         return todo
 
+    async def get_todo_subtasks(
+        self, db: AsyncSession, todo_id: int, user: Principal
+    ) -> List[Todo]:
+        """Get every subtask below a todo, loaded with a single query."""
+        return await crud_todo.get_todo_subtree(
+            db=db,
+            todo_id=todo_id,
+            owner_id=user.id,
+            max_depth=settings.TODO_MAX_SUBTASK_DEPTH,
+        )
+
+    async def _check_parent(
+        self, db: AsyncSession, parent_id: int, user: Principal
+    ) -> None:
+        """Rejects subtasks of missing todos or nested too deeply."""
+        parent = await crud_todo.get_todo(db=db, todo_id=parent_id, owner_id=user.id)
+        if not parent:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Parent todo not found"
+            )
+        depth = await crud_todo.get_todo_depth(
+            db=db, todo_id=parent_id, owner_id=user.id
+        )
+        if depth >= settings.TODO_MAX_SUBTASK_DEPTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Subtasks can be nested at most {settings.TODO_MAX_SUBTASK_DEPTH} levels deep.",
+            )
+
+    @staticmethod
+    def _check_recurrence(
+        recurrence_rule: Optional[str],
+        due_date: Optional[date],
+        parent_id: Optional[int],
+    ) -> None:
+        """Rejects repeating todos without a due date, and repeating subtasks."""
+        if not recurrence_rule:
+            return
+        if due_date is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A repeating todo needs a due date.",
+            )
+        if parent_id is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Subtasks cannot repeat.",
+            )
+
     async def create_new_todo(
         self,
         db: AsyncSession,
         todo_in: TodoCreate,
-        user: User,
+        user: Principal,
         photo: Optional[UploadFile] = None,
+        tag_names: Sequence[str] = (),
     ) -> Todo:
         """Create a new todo item, optionally uploading photo to Cloudinary."""
+        self._check_recurrence(
+            todo_in.recurrence_rule, todo_in.due_date, todo_in.parent_id
+        )
+        if todo_in.parent_id is not None:
+            await self._check_parent(db, todo_in.parent_id, user)
+
         photo_public_id = None
         if photo and photo.filename:
             if not settings.CLOUDINARY_URL:
@@ -109,72 +320,175 @@ class TodoService:
             finally:
                 await photo.close()
 
-        todo = await crud_todo.create_todo(
-            db=db, todo_in=todo_in, owner_id=user.id, photo_filename=photo_public_id
-        )
+        try:
+            todo = await crud_todo.create_todo(
+                db=db,
+                todo_in=todo_in,
+                owner_id=user.id,
+                photo_filename=photo_public_id,
+            )
+        except StaleDataError as e:
+            logging.info(f"Rejected subtask: {e}")
+            # The todo and its counters were already written.
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Parent todo not found"
+            )
+        except OwnerMoved:
+            raise await self._moved_away(db)
+        if tag_names:
+            await crud_tag.set_todo_tags(
+                db=db, owner_id=user.id, todo_id=todo.id, tag_names=tag_names
+            )
+        self._publish(db, "created", todo)
         return todo
 
     async def update_existing_todo(
-        self, db: AsyncSession, todo_id: int, todo_in: TodoUpdate, user: User
+        self,
+        db: AsyncSession,
+        todo_id: int,
+        todo_in: TodoUpdate,
+        user: Principal,
+        expected_version: Optional[int] = None,
+        tag_names: Optional[Sequence[str]] = None,
     ) -> Todo:
-        """Update an existing todo item."""
+        """
+        Update an existing todo item, rejecting edits based on a stale version.
+        Its tags are replaced by `tag_names` unless that is None.
+        """
+        await self._flush_status_changes(user)
 
         db_todo = await crud_todo.get_todo(db=db, todo_id=todo_id, owner_id=user.id)
         if not db_todo:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found"
             )
-
-        updated_todo = await crud_todo.update_todo(
-            db=db, db_todo=db_todo, todo_in=todo_in
+        changed = todo_in.model_fields_set
+        self._check_recurrence(
+            (
+                todo_in.recurrence_rule
+                if "recurrence_rule" in changed
+                else db_todo.recurrence_rule
+            ),
+            todo_in.due_date if "due_date" in changed else db_todo.due_date,
+            db_todo.parent_id,
         )
+
+        version_before = db_todo.version
+        try:
+            updated_todo = await crud_todo.update_todo(
+                db=db,
+                db_todo=db_todo,
+                todo_in=todo_in,
+                expected_version=expected_version,
+            )
+            if tag_names is not None and updated_todo.version == version_before:
+                # Nothing but the tags may change: record that for sync, which
+                # also takes the row lock the UPDATE would have.
+                await crud_todo.touch_todo(db, owner_id=user.id, todo_id=todo_id)
+        except StaleDataError as e:
+            logging.info(f"Rejected conflicting update: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="This todo was changed somewhere else. Review the latest version and try again.",
+            )
+        except OwnerMoved:
+            raise await self._moved_away(db)
+        if tag_names is not None:
+            # The UPDATE above holds the todo's row lock, so tag edits serialize.
+            await crud_tag.set_todo_tags(
+                db=db, owner_id=user.id, todo_id=todo_id, tag_names=tag_names
+            )
+        self._publish(db, "updated", updated_todo)
         return updated_todo
 
+    async def update_todo_status(
+        self,
+        db: AsyncSession,
+        todo_id: int,
+        status_val: str,
+        user: Principal,
+        expected_version: Optional[int] = None,
+    ) -> None:
+        """
+        Change only a todo's status. With the status write buffer enabled the
+        change is queued and written in the user's next batch.
+        """
+        if self.status_buffer is None:
+            await self.update_existing_todo(
+                db=db,
+                todo_id=todo_id,
+                todo_in=TodoUpdate(status=status_val),
+                user=user,
+                expected_version=expected_version,
+            )
+            return
+        await self.status_buffer.add(user.id, todo_id, status_val, expected_version)
+
     async def delete_existing_todo(
-        self, db: AsyncSession, todo_id: int, user: User
+        self, db: AsyncSession, todo_id: int, user: Principal
     ) -> None:
-        """Delete an existing todo item and its associated photo from Cloudinary."""
+        """
+        Soft-delete an existing todo item and its subtasks. Rows and photos are
+        removed later by the purge_todos job, so the delete can be undone
+        until then.
+        """
+        await self._flush_status_changes(user)
 
-        db_todo = await crud_todo.get_todo(db=db, todo_id=todo_id, owner_id=user.id)
+        try:
+            db_todo = await crud_todo.delete_todo(
+                db=db, todo_id=todo_id, owner_id=user.id
+            )
+        except OwnerMoved:
+            raise await self._moved_away(db)
         if not db_todo:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found"
             )
+        self._publish(db, "deleted", db_todo)
 
-        photo_public_id_to_delete = db_todo.photo_filename
-
-        await crud_todo.delete_todo(db=db, todo_id=todo_id, owner_id=user.id)
+    async def restore_deleted_todo(
+        self, db: AsyncSession, todo_id: int, user: Principal
+    ) -> Todo:
+        """Undo a delete that has not been purged yet."""
+        try:
+            db_todo = await crud_todo.restore_todo(
+                db=db, todo_id=todo_id, owner_id=user.id
+            )
+        except OwnerMoved:
+            raise await self._moved_away(db)
+        if not db_todo:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found"
+            )
+        self._publish(db, "restored", db_todo)
+        return db_todo
 
-        if photo_public_id_to_delete:
-            if not settings.CLOUDINARY_URL:
+    @staticmethod
+    def delete_photos(public_ids: List[str]) -> None:
+        """
+        Delete photos from Cloudinary in chunks of 100, the Admin API limit.
+        Raises CloudinaryError so the caller can keep the rows and retry.
+        """
+        if not public_ids:
+            return
+        if not settings.CLOUDINARY_URL:
+            logging.warning(
+                f"Cannot delete {len(public_ids)} photos: Cloudinary is not configured."
+            )
+            return
+        for i in range(0, len(public_ids), 100):
+            chunk = public_ids[i : i + 100]
+            result = cloudinary.api.delete_resources(chunk, resource_type="image")
+            not_found = [
+                public_id
+                for public_id, outcome in result.get("deleted", {}).items()
+                if outcome == "not_found"
+            ]
+            if not_found:
                 logging.warning(
-                    f"Cannot delete photo {photo_public_id_to_delete}: Cloudinary is not configured."
+                    f"{len(not_found)} photos not found in Cloudinary (maybe already deleted?)."
                 )
-            else:
-                try:
-                    logging.info(
-                        f"Deleting photo from Cloudinary: {photo_public_id_to_delete}"
-                    )
-                    result = cloudinary.uploader.destroy(
-                        photo_public_id_to_delete, resource_type="image"
-                    )
-                    if result.get("result") == "ok":
-                        logging.info(
-                            f"Successfully deleted {photo_public_id_to_delete} from Cloudinary."
-                        )
-                    elif result.get("result") == "not found":
-                        logging.warning(
-                            f"Photo {photo_public_id_to_delete} not found in Cloudinary (maybe already deleted?)."
-                        )
-                    else:
-                        logging.error(
-                            f"Failed to delete {photo_public_id_to_delete} from Cloudinary. Result: {result}"
-                        )
-                except CloudinaryError as e:
-                    logging.error(
-                        f"Error deleting photo {photo_public_id_to_delete} from Cloudinary: {e}"
-                    )
-                except Exception as e:
-                    logging.error(
-                        f"Unexpected error during Cloudinary deletion of {photo_public_id_to_delete}: {e}"
-                    )
+            logging.info(
+                f"Deleted {len(chunk) - len(not_found)} photos from Cloudinary."
+            )
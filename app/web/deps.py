@@ -1,42 +1,121 @@
+import functools
+import hashlib
+import logging
+import math
+import time
 from typing import Optional
+from urllib.parse import parse_qs, urlsplit
 
-from fastapi import Request, Depends, HTTPException, status
+from fastapi import Request, Response, Depends, HTTPException, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import decode_access_token
-from app.crud import crud_user
-from app.db.base import get_db
-from app.db.models import User
+from app.core.config import settings
+from app.core.idempotency import (
+    IdempotencyInProgress,
+    IdempotencyKeyReused,
+    StoredResponse,
+)
+from app.db.base import (
+    get_db,
+    read_replica_enabled,
+    release_db,
+    session_scope,
+    AsyncReadSessionFactory,
+)
+from app.schemas.user import Principal
+from app.services.container import ServiceContainer
+from app.services.orchestrator_service import OrchestratorService
+
+LAST_WRITE_COOKIE = "last_write"
+ACCESS_TOKEN_COOKIE = "access_token"
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_FIELD = "idempotency_key"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def set_access_token_cookie(response: Response, access_token: str) -> None:
+    response.set_cookie(
+        key=ACCESS_TOKEN_COOKIE,
+        value=f"Bearer {access_token}",
+        httponly=True,
+        secure=False,
+        samesite="lax",
+    )
+
+
+def wrote_recently(request: Request) -> bool:
+    """True if this client mutated data within the read-your-writes window."""
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return False
+    return time.time() - last_write < settings.READ_YOUR_WRITES_SECONDS
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Session for read-only page loads. Uses the read replica when one is
+    configured, unless the client wrote recently, in which case it shares
+    the request's primary session so the user sees their own changes.
+    """
+    if not read_replica_enabled() or wrote_recently(request):
+        yield db
+        return
+    async with session_scope(AsyncReadSessionFactory) as session:
+        yield session
+
+
+def get_services(request: Request) -> ServiceContainer:
+    """
+    Dependency returning the application-scoped service container, which
+    the lifespan hook creates and starts. Tests must run the lifespan too
+    (`with TestClient(app) as client`): a container that was never started
+    would serve without its caches, listeners and background jobs.
+    """
+    services = getattr(request.app.state, "services", None)
+    if services is None:
+        raise RuntimeError(
+            "ServiceContainer not started: the application lifespan has not run"
+        )
+    return services
+
+
+def get_orchestrator(
+    services: ServiceContainer = Depends(get_services),
+) -> OrchestratorService:
+    return services.orchestrator
 
 
 async def get_current_user_from_cookie(
-    request: Request, db: AsyncSession = Depends(get_db)
-) -> Optional[User]:
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    services: ServiceContainer = Depends(get_services),
+) -> Optional[Principal]:
     """
     Dependency to get the current user from the access token stored in a cookie.
-    Returns the user object or None if not authenticated or invalid token.
+    Returns the principal or None if not authenticated or invalid token.
+    Current tokens are verified without touching the database, and tokens
+    close to expiry are renewed on the response.
     """
-    token = request.cookies.get("access_token")
+    token = request.cookies.get(ACCESS_TOKEN_COOKIE)
     if not token:
         return None
 
     if token.startswith("Bearer "):
         token = token.split(" ")[1]
 
-    email = decode_access_token(token)
-    if email is None:
-        return None
-
-    user = await crud_user.get_user_by_email(db, email=email)
-    if user is None or not user.is_active:
-        return None
-
-    return user
+    principal = await services.auth_service.get_principal_from_token(db, token)
+    if principal is not None:
+        # Picked up by the session renewal middleware in app.main.
+        request.state.renewed_access_token = (
+            services.auth_service.renew_jwt_token_if_expiring(principal)
+        )
+    return principal
 
 
 async def get_current_active_user_from_cookie(
-    current_user: Optional[User] = Depends(get_current_user_from_cookie),
-) -> User:
+    current_user: Optional[Principal] = Depends(get_current_user_from_cookie),
+) -> Principal:
     """
     Dependency to get the current active user. Raises 401 if not authenticated.
     Use this to protect routes.
@@ -48,3 +127,140 @@ async def get_current_active_user_from_cookie(
             headers={"WWW-Authenticate": "Bearer"},
         )
     return current_user
+
+
+def email_digest(email: str) -> str:
+    """
+    Stand-in for a submitted email in rate limit keys and logs, so neither
+    the bucket table nor the log holds addresses.
+    """
+    return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:16]
+
+
+async def limit_auth_attempts(
+    request: Request, services: ServiceContainer = Depends(get_services)
+) -> None:
+    """
+    Token-bucket admission control for login/signup submissions, keyed per
+    client IP and per email, so password hashing cannot be used to flood
+    the workers. Rejected attempts get a 429 with Retry-After. Attached to
+    the login and signup POST routes only.
+    """
+    keys = [("ip", request.client.host if request.client else "unknown")]
+    email = (await request.form()).get("email")
+    if isinstance(email, str) and email:
+        keys.append(("email", email_digest(email)))
+
+    retry_after = await services.auth_rate_limiter.check(keys)
+    if retry_after > 0:
+        logging.warning(f"Rate limit: Rejected auth attempt for {keys}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def get_idempotency_key(request: Request) -> Optional[str]:
+    """
+    The client's idempotency key: the Idempotency-Key header for API clients,
+    else the hidden `idempotency_key` field the todo forms render.
+    """
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key is None and request.headers.get("content-type", "").startswith(
+        ("application/x-www-form-urlencoded", "multipart/form-data")
+    ):
+        field = (await request.form()).get(IDEMPOTENCY_KEY_FIELD)
+        key = field if isinstance(field, str) else None
+    if not key:
+        return None
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} must be at most "
+            f"{MAX_IDEMPOTENCY_KEY_LENGTH} characters",
+        )
+    return key
+
+
+async def request_fingerprint(request: Request) -> str:
+    """Digest of what a request asks for, to catch a key reused for something else."""
+    digest = hashlib.sha256(f"{request.method} {request.url.path}".encode())
+    form = await request.form()
+    for name, value in sorted(form.multi_items(), key=lambda item: item[0]):
+        if name == IDEMPOTENCY_KEY_FIELD:
+            continue
+        if isinstance(value, UploadFile):
+            value = f"file:{value.filename}:{value.size}"
+        digest.update(f"\0{name}\0{value}".encode())
+    return digest.hexdigest()
+
+
+def completed_write(response: Response) -> bool:
+    """
+    Whether a route's response reports a write that went through: a 2xx, or
+    a redirect that does not carry an `error` for the page to show.
+    """
+    if 200 <= response.status_code < 300:
+        return True
+    if response.status_code != status.HTTP_303_SEE_OTHER:
+        return False
+    query = urlsplit(response.headers.get("location", "")).query
+    return "error" not in parse_qs(query)
+
+
+def idempotent(endpoint):
+    """
+    Makes a mutating route safe to retry. The route must take `request`,
+    `db`, `current_user` and `idempotency_key: Optional[str] =
+    Depends(get_idempotency_key)`.
+
+    The first request with a key runs the route, commits its session and
+    stores the response; retries with the same key (per user) get the stored
+    response back without touching the database or Cloudinary again. A
+    response reporting a failure (see completed_write) is not stored, so the
+    key stays free for a retry. Requests without a key run as usual.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        key = kwargs.get("idempotency_key")
+        if not key:
+            return await endpoint(*args, **kwargs)
+
+        request: Request = kwargs["request"]
+        store = get_services(request).idempotency_store
+        scoped_key = f"{kwargs['current_user'].id}:{key}"
+        try:
+            stored = await store.begin(scoped_key, await request_fingerprint(request))
+        except IdempotencyKeyReused:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request",
+            )
+        except IdempotencyInProgress:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The original request is still being processed",
+                headers={"Retry-After": "1"},
+            )
+        if stored is not None:
+            logging.info(f"Idempotency: Replaying stored response for key {key}")
+            return stored.to_response()
+
+        try:
+            response = await endpoint(*args, **kwargs)
+            # Commit before storing the outcome, so a replay never reports a
+            # write that was rolled back.
+            await release_db(kwargs["db"])
+        except BaseException:
+            await store.abandon(scoped_key)
+            raise
+        if not completed_write(response):
+            logging.info(f"Idempotency: Not storing failed response for key {key}")
+            await store.abandon(scoped_key)
+            return response
+        await store.complete(scoped_key, StoredResponse.from_response(response))
+        return response
+
+    return wrapper
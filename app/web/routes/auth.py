@@ -4,8 +4,14 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import get_db
-from app.schemas.user import UserCreate
-from app.services.orchestrator_service import get_orchestrator, OrchestratorService
+from app.schemas.user import UserCreate, Principal
+from app.services.orchestrator_service import OrchestratorService
+from app.web.deps import (
+    get_current_active_user_from_cookie,
+    get_orchestrator,
+    limit_auth_attempts,
+    set_access_token_cookie,
+)
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/web/templates")
@@ -17,7 +23,7 @@ async def login_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 
-@router.post("/login", name="web_login")
+@router.post("/login", name="web_login", dependencies=[Depends(limit_auth_attempts)])
 async def login_for_access_token(
     response: Response,
     request: Request,
@@ -47,13 +53,7 @@ async def login_for_access_token(
     response = RedirectResponse(
         url=request.url_for("web_read_todos"), status_code=status.HTTP_303_SEE_OTHER
     )
-    response.set_cookie(
-        key="access_token",
-        value=f"Bearer {access_token}",
-        httponly=True,
-        secure=False,
-        samesite="lax",
-    )
+    set_access_token_cookie(response, access_token)
     return response
 
 
@@ -71,13 +71,33 @@ async def logout(request: Request):
     return response
 
 
+@router.post("/logout/all", name="web_logout_everywhere")
+async def logout_everywhere(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    orchestrator: OrchestratorService = Depends(get_orchestrator),
+):
+    """Revokes every token issued to the user, on all devices, and logs out."""
+
+    print("Route Handler: Logging out everywhere...")
+    await orchestrator.handle_logout_everywhere(db=db, user=current_user)
+
+    response = RedirectResponse(
+        url=request.url_for("web_login_form"), status_code=status.HTTP_303_SEE_OTHER
+    )
+    response.delete_cookie(key="access_token")
+    print("Route Handler: Tokens revoked. Redirecting to login.")
+    return response
+
+
 @router.get("/signup", response_class=HTMLResponse, name="web_signup_form")
 async def signup_form(request: Request):
     """Displays the signup form page."""
     return templates.TemplateResponse("signup.html", {"request": request})
 
 
-@router.post("/signup", name="web_signup")
+@router.post("/signup", name="web_signup", dependencies=[Depends(limit_auth_attempts)])
 async def create_user(
     request: Request,
     db: AsyncSession = Depends(get_db),
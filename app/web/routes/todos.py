@@ -1,6 +1,9 @@
+import asyncio
+import json
 import logging
+import uuid
 from datetime import date
-from typing import Optional, List, Any
+from typing import Dict, Optional, List, Any
 
 import cloudinary
 import cloudinary.utils
@@ -15,20 +18,37 @@ from fastapi import (
     File,
     Query,
 )
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.base import get_db
-from app.db.models import User, Todo
-from app.schemas.todo import TodoCreate, TodoUpdate, PRIORITY_MAP, VALID_PRIORITIES
-from app.services.orchestrator_service import get_orchestrator, OrchestratorService
-from app.web.deps import get_current_active_user_from_cookie
+from app.core.recurrence import describe_rule, unanchored_rule
+from app.db.base import get_db, release_db
+from app.db.models import Todo
+from app.schemas.todo import (
+    TodoCreate,
+    TodoUpdate,
+    TodoSyncPage,
+    PRIORITY_MAP,
+    VALID_PRIORITIES,
+    parse_tag_names,
+)
+from app.schemas.user import Principal
+from app.services.orchestrator_service import OrchestratorService
+from app.web.deps import (
+    get_current_active_user_from_cookie,
+    get_idempotency_key,
+    get_orchestrator,
+    get_read_db,
+    idempotent,
+)
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/web/templates")
+# Each rendered form gets its own key, so resubmitting it replays the outcome.
+templates.env.globals["new_idempotency_key"] = lambda: uuid.uuid4().hex
 
 TODO_STATUS_OPTIONS = ["Not Started", "In Progress", "Done"]
 TODO_PRIORITY_OPTIONS = PRIORITY_MAP
@@ -40,6 +60,15 @@ TODO_SORT_OPTIONS = {
     "priority_asc": "Priority (High First)",
     "priority_desc": "Priority (Low First)",
 }
+# Rules offered by the forms; the due date fills in the day (anchor_rule).
+RECURRENCE_OPTIONS = {
+    "": "Does not repeat",
+    "FREQ=DAILY": "Daily",
+    "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR": "Every weekday",
+    "FREQ=WEEKLY": "Weekly",
+    "FREQ=MONTHLY": "Monthly",
+    "FREQ=YEARLY": "Yearly",
+}
 
 
 def try_parse_int(value: Optional[str]) -> Optional[int]:
@@ -51,16 +80,78 @@ def try_parse_int(value: Optional[str]) -> Optional[int]:
         return None
 
 
+def prepare_todos_for_template(
+    todos_from_db: List[Todo], tags_by_todo: Optional[Dict[int, List[str]]] = None
+) -> List[dict[str, Any]]:
+    """
+    Converts todo rows into the dicts rendered by todos.html. Subtasks are
+    nested under their parent's "subtasks"; todos whose parent is not in
+    `todos_from_db` are returned at the top level.
+    """
+    tags_by_todo = tags_by_todo or {}
+    todos_for_template: List[dict[str, Any]] = []
+    if settings.CLOUDINARY_URL:
+        for todo in todos_from_db:
+            todo_dict = todo.__dict__.copy()
+            todo_dict["priority_str"] = PRIORITY_MAP.get(todo.priority, "Unknown")
+            todo_dict["tags"] = tags_by_todo.get(todo.id, [])
+            todo_dict["recurrence"] = describe_rule(
+                getattr(todo, "recurrence_rule", None)
+            )
+            if todo.photo_filename:
+                try:
+                    url, options = cloudinary.utils.cloudinary_url(
+                        todo.photo_filename,
+                        secure=True,
+                        fetch_format="auto",
+                        quality="auto",
+                    )
+                    todo_dict["photo_url"] = url
+                except Exception as e:
+                    logging.error(
+                        f"Error generating Cloudinary URL for {todo.photo_filename}: {e}"
+                    )
+                    todo_dict["photo_url"] = None
+            else:
+                todo_dict["photo_url"] = None
+            todos_for_template.append(todo_dict)
+    else:
+        logging.warning("Cloudinary not configured, photo URLs will not be generated.")
+        for todo in todos_from_db:
+            todo_dict = todo.__dict__.copy()
+            todo_dict["priority_str"] = PRIORITY_MAP.get(todo.priority, "Unknown")
+            todo_dict["tags"] = tags_by_todo.get(todo.id, [])
+            todo_dict["recurrence"] = describe_rule(
+                getattr(todo, "recurrence_rule", None)
+            )
+            todos_for_template.append(todo_dict)
+    return nest_subtasks(todos_for_template)
+
+
+def nest_subtasks(todo_dicts: List[dict[str, Any]]) -> List[dict[str, Any]]:
+    by_id = {todo_dict["id"]: todo_dict for todo_dict in todo_dicts}
+    top_level: List[dict[str, Any]] = []
+    for todo_dict in todo_dicts:
+        todo_dict["subtasks"] = []
+    for todo_dict in todo_dicts:
+        parent = by_id.get(todo_dict.get("parent_id"))
+        (parent["subtasks"] if parent else top_level).append(todo_dict)
+    return top_level
+
+
 @router.get("/", response_class=HTMLResponse, name="web_read_todos")
 async def read_todos_page(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     orchestrator: OrchestratorService = Depends(get_orchestrator),
-    current_user: User = Depends(get_current_active_user_from_cookie),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
     filter_status: Optional[str] = Query(None, alias="status"),
     filter_priority: Optional[str] = Query(None, alias="priority"),
     sort_by: Optional[str] = Query("created_at", alias="sort"),
     search_term: Optional[str] = Query(None, alias="search"),
+    show_archived: bool = Query(False, alias="archived"),
+    filter_tags: List[str] = Query([], alias="tag"),
+    tag_mode: str = Query("all"),
 ):
     """Displays the main todo list page for the logged-in user with filtering/sorting."""
     print(
@@ -75,6 +166,12 @@ async def read_todos_page(
     priority_int = try_parse_int(filter_priority)
     if priority_int is not None and priority_int not in VALID_PRIORITIES:
         priority_int = None
+    try:
+        filter_tags = parse_tag_names(",".join(filter_tags))
+    except ValueError:
+        filter_tags = []
+    if tag_mode not in ("all", "any"):
+        tag_mode = "all"
 
     try:
         todos_from_db: List[Todo] = await orchestrator.get_todos_for_user(
@@ -84,6 +181,16 @@ async def read_todos_page(
             filter_priority=priority_int,
             sort_by=sort_by,
             search_term=search_term,
+            tag_names=filter_tags,
+            match_all_tags=tag_mode == "all",
+            include_archived=show_archived,
+        )
+        tags_by_todo = await orchestrator.get_tags_for_todos(
+            db=db, user=current_user, todos=todos_from_db
+        )
+        user_tags = await orchestrator.get_tags_for_user(db=db, user=current_user)
+        todo_stats = await orchestrator.get_todo_stats_for_user(
+            db=db, user=current_user
         )
     except Exception as e:
         logging.exception("Error fetching todos in route handler")
@@ -97,12 +204,16 @@ async def read_todos_page(
                 "current_user": current_user,
                 "status_options": TODO_STATUS_OPTIONS,
                 "priority_options": TODO_PRIORITY_OPTIONS,
+                "recurrence_options": RECURRENCE_OPTIONS,
                 "sort_options": TODO_SORT_OPTIONS,
                 "filters": {
                     "status": filter_status,
                     "priority": filter_priority,
                     "sort": sort_by,
                     "search": search_term,
+                    "archived": show_archived,
+                    "tags": filter_tags,
+                    "tag_mode": tag_mode,
                 },
                 "error": f"An error occurred while fetching todos: {e}",
                 "message": None,
@@ -112,35 +223,8 @@ async def read_todos_page(
             status_code=500,
         )
 
-    todos_for_template: List[dict[str, Any]] = []
-    if settings.CLOUDINARY_URL:
-        for todo in todos_from_db:
-            todo_dict = todo.__dict__.copy()
-            todo_dict["priority_str"] = PRIORITY_MAP.get(todo.priority, "Unknown")
-            if todo.photo_filename:
-                try:
-                    url, options = cloudinary.utils.cloudinary_url(
-                        todo.photo_filename,
-                        secure=True,
-                        fetch_format="auto",
-                        quality="auto",
-                    )
-                    todo_dict["photo_url"] = url
-                except Exception as e:
-                    logging.error(
-                        f"Error generating Cloudinary URL for {todo.photo_filename}: {e}"
-                    )
-                    todo_dict["photo_url"] = None
-            else:
-                todo_dict["photo_url"] = None
-            todos_for_template.append(todo_dict)
-    else:
-        logging.warning("Cloudinary not configured, photo URLs will not be generated.")
-        todos_for_template = []
-        for todo in todos_from_db:
-            todo_dict = todo.__dict__.copy()
-            todo_dict["priority_str"] = PRIORITY_MAP.get(todo.priority, "Unknown")
-            todos_for_template.append(todo_dict)
+    await release_db(db)
+    todos_for_template = prepare_todos_for_template(todos_from_db, tags_by_todo)
 
     today = date.today()
     print("Route Handler: Data fetched. Rendering todo list template...")
@@ -152,6 +236,7 @@ async def read_todos_page(
             "current_user": current_user,
             "status_options": TODO_STATUS_OPTIONS,
             "priority_options": TODO_PRIORITY_OPTIONS,
+            "recurrence_options": RECURRENCE_OPTIONS,
             "sort_options": TODO_SORT_OPTIONS,
             "priority_map": PRIORITY_MAP,
             "filters": {
@@ -159,15 +244,22 @@ async def read_todos_page(
                 "priority": filter_priority,
                 "sort": sort_by,
                 "search": search_term,
+                "archived": show_archived,
+                "tags": filter_tags,
+                "tag_mode": tag_mode,
             },
             "error": request.query_params.get("error"),
             "message": request.query_params.get("message"),
             "today_date": today,
+            "stats": todo_stats,
+            "tags": user_tags,
+            "live_updates": settings.TODO_EVENTS_ENABLED,
         },
     )
 
 
 @router.post("/add", name="web_add_todo")
+@idempotent
 async def add_todo_action(
     request: Request,
     db: AsyncSession = Depends(get_db),
@@ -177,7 +269,11 @@ async def add_todo_action(
     due_date_str: Optional[str] = Form(None, alias="due_date"),
     priority: int = Form(..., ge=min(VALID_PRIORITIES), le=max(VALID_PRIORITIES)),
     photo: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_active_user_from_cookie),
+    tags: Optional[str] = Form(None),
+    parent_id: Optional[int] = Form(None),
+    recurrence: Optional[str] = Form(None),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ):
     """Handles the form submission for adding a new todo item."""
     uploaded_photo = photo if photo and photo.filename else None
@@ -201,8 +297,11 @@ async def add_todo_action(
             description=description,
             due_date=due_date_obj,
             priority=priority,
+            parent_id=parent_id,
+            recurrence_rule=recurrence or None,
         )
-    except ValidationError as e:
+        tag_names = parse_tag_names(tags)
+    except (ValidationError, ValueError) as e:
         error_message = f"Invalid input: {e}"
         redirect_url = request.url_for("web_read_todos").include_query_params(
             error=error_message
@@ -217,7 +316,11 @@ async def add_todo_action(
             f"Route Handler: Calling orchestrator to add todo for user {current_user.email}..."
         )
         await orchestrator.add_todo_for_user(
-            db=db, todo_in=todo_in, user=current_user, photo=uploaded_photo
+            db=db,
+            todo_in=todo_in,
+            user=current_user,
+            photo=uploaded_photo,
+            tag_names=tag_names,
         )
         print("Route Handler: Add todo successful. Redirecting...")
         redirect_url = request.url_for("web_read_todos").include_query_params(
@@ -247,23 +350,87 @@ async def add_todo_action(
     )
 
 
+@router.get("/sync", response_model=TodoSyncPage, name="web_sync_todos")
+async def sync_todos(
+    db: AsyncSession = Depends(get_db),
+    orchestrator: OrchestratorService = Depends(get_orchestrator),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    since: Optional[int] = Query(None, ge=0),
+    since_id: int = Query(0, ge=0),
+    limit: int = Query(settings.SYNC_PAGE_SIZE, ge=1, le=settings.SYNC_PAGE_SIZE),
+):
+    """
+    Returns the todos changed since the client's high-water mark as JSON, for
+    offline clients. Always reads the primary: a lagging replica could move
+    the high-water mark past changes it has not received yet.
+    """
+    return await orchestrator.get_todo_changes_for_user(
+        db=db, user=current_user, since=since, since_id=since_id, limit=limit
+    )
+
+
+@router.get("/events", name="web_todo_events")
+async def todo_events(
+    db: AsyncSession = Depends(get_read_db),
+    orchestrator: OrchestratorService = Depends(get_orchestrator),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+):
+    """
+    Server-Sent Events stream of the user's todo changes, so other open tabs
+    and devices can refresh their list. Sends a comment every
+    TODO_EVENTS_HEARTBEAT_SECONDS to keep proxies from closing it.
+    """
+    # The stream stays open for minutes; do not pin a pooled connection to it.
+    await release_db(db)
+    subscription = orchestrator.subscribe_to_todo_events(current_user)
+
+    async def stream():
+        async with subscription as events:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        events.get(), timeout=settings.TODO_EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event.type}\ndata: {json.dumps(event.for_client())}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/edit/{todo_id}", response_class=HTMLResponse, name="web_edit_todo_form")
 async def edit_todo_form(
     request: Request,
     todo_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     orchestrator: OrchestratorService = Depends(get_orchestrator),
-    current_user: User = Depends(get_current_active_user_from_cookie),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
 ):
     """Displays the form to edit an existing todo item."""
     print(f"Route Handler: Getting todo ID {todo_id} for edit form...")
     todo = None
     photo_url = None
+    tag_names: List[str] = []
+    subtasks: List[Todo] = []
 
     try:
         todo = await orchestrator.get_single_todo_for_user(
             db=db, todo_id=todo_id, user=current_user
         )
+        tags_by_todo = await orchestrator.get_tags_for_todos(
+            db=db, user=current_user, todos=[todo]
+        )
+        tag_names = tags_by_todo.get(todo.id, [])
+        subtasks = await orchestrator.get_subtasks_for_user(
+            db=db, todo_id=todo_id, user=current_user
+        )
+        await release_db(db)
 
         if todo and todo.photo_filename and settings.CLOUDINARY_URL:
             try:
@@ -313,6 +480,13 @@ async def edit_todo_form(
             url=str(redirect_url), status_code=status.HTTP_303_SEE_OTHER
         )
 
+    recurrence = unanchored_rule(todo.recurrence_rule) if todo.recurrence_rule else ""
+    recurrence_options = dict(RECURRENCE_OPTIONS)
+    if recurrence not in recurrence_options:
+        # Set through the API: keep it as it is unless the user picks another.
+        recurrence = todo.recurrence_rule
+        recurrence_options[recurrence] = describe_rule(recurrence)
+
     print("Route Handler: Rendering edit form...")
     return templates.TemplateResponse(
         "edit_todo.html",
@@ -322,12 +496,27 @@ async def edit_todo_form(
             "current_user": current_user,
             "priority_options": TODO_PRIORITY_OPTIONS,
             "photo_url": photo_url,
+            "tags": ", ".join(tag_names),
+            "recurrence": recurrence,
+            "recurrence_options": recurrence_options,
+            "subtasks": nest_subtasks(
+                [
+                    {
+                        "id": t.id,
+                        "parent_id": t.parent_id,
+                        "title": t.title,
+                        "status": t.status,
+                    }
+                    for t in subtasks
+                ]
+            ),
             "error": request.query_params.get("error"),
         },
     )
 
 
 @router.post("/edit/{todo_id}", name="web_edit_todo_action")
+@idempotent
 async def edit_todo_action(
     request: Request,
     todo_id: int,
@@ -337,7 +526,11 @@ async def edit_todo_action(
     description: Optional[str] = Form(None),
     due_date_str: Optional[str] = Form(None, alias="due_date"),
     priority: int = Form(..., ge=min(VALID_PRIORITIES), le=max(VALID_PRIORITIES)),
-    current_user: User = Depends(get_current_active_user_from_cookie),
+    version: Optional[int] = Form(None),
+    tags: str = Form(""),
+    recurrence: str = Form(""),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ):
     """Handles the form submission for editing a todo item."""
     print(f"Route Handler: Processing edit for todo ID {todo_id}...")
@@ -361,8 +554,10 @@ async def edit_todo_action(
             description=description,
             due_date=due_date_obj,
             priority=priority,
+            recurrence_rule=recurrence or None,
         )
-    except ValidationError as e:
+        tag_names = parse_tag_names(tags)
+    except (ValidationError, ValueError) as e:
         edit_form_url = request.url_for("web_edit_todo_form", todo_id=todo_id)
         redirect_url = edit_form_url.include_query_params(error=f"Invalid input: {e}")
         return RedirectResponse(
@@ -374,7 +569,12 @@ async def edit_todo_action(
     try:
         print(f"Route Handler: Calling orchestrator to update todo ID {todo_id}...")
         await orchestrator.update_todo_for_user(
-            db=db, todo_id=todo_id, todo_in=todo_update_data, user=current_user
+            db=db,
+            todo_id=todo_id,
+            todo_in=todo_update_data,
+            user=current_user,
+            expected_version=version,
+            tag_names=tag_names,
         )
         print("Route Handler: Edit successful. Redirecting to list...")
         success_message = "Todo updated successfully."
@@ -383,6 +583,13 @@ async def edit_todo_action(
         print(
             f"Route Handler: Edit failed (HTTPException {e.status_code}) - {e.detail}."
         )
+        if e.status_code == status.HTTP_409_CONFLICT:
+            # Reload the form so the user sees what changed before re-applying.
+            edit_form_url = request.url_for("web_edit_todo_form", todo_id=todo_id)
+            redirect_url = edit_form_url.include_query_params(error=e.detail)
+            return RedirectResponse(
+                url=str(redirect_url), status_code=status.HTTP_303_SEE_OTHER
+            )
         if e.status_code == status.HTTP_404_NOT_FOUND:
             error_message = "Todo not found or you don't have permission to edit it."
         else:
@@ -407,13 +614,16 @@ async def edit_todo_action(
 
 
 @router.post("/update/{todo_id}/status", name="web_update_todo_status")
+@idempotent
 async def update_todo_status_action(
     request: Request,
     todo_id: int,
     status_val: str = Form(..., alias="status"),
+    version: Optional[int] = Form(None),
     db: AsyncSession = Depends(get_db),
     orchestrator: OrchestratorService = Depends(get_orchestrator),
-    current_user: User = Depends(get_current_active_user_from_cookie),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ):
     """Handles the form submission for updating ONLY a todo item's status."""
     print(
@@ -429,16 +639,17 @@ async def update_todo_status_action(
             url=str(redirect_url), status_code=status.HTTP_303_SEE_OTHER
         )
 
-    print("Route Handler: Preparing update data (status only)...")
-    todo_update = TodoUpdate(status=status_val)
-
     error_message = None
     try:
         print(
             f"Route Handler: Calling orchestrator to update todo ID {todo_id} status..."
         )
-        await orchestrator.update_todo_for_user(
-            db=db, todo_id=todo_id, todo_in=todo_update, user=current_user
+        await orchestrator.update_todo_status_for_user(
+            db=db,
+            todo_id=todo_id,
+            status_val=status_val,
+            user=current_user,
+            expected_version=version,
         )
         print("Route Handler: Status update successful. Redirecting...")
         redirect_url = request.url_for("web_read_todos").include_query_params(
@@ -470,12 +681,14 @@ async def update_todo_status_action(
 
 
 @router.post("/delete/{todo_id}", name="web_delete_todo")
+@idempotent
 async def delete_todo_action(
     request: Request,
     todo_id: int,
     db: AsyncSession = Depends(get_db),
     orchestrator: OrchestratorService = Depends(get_orchestrator),
-    current_user: User = Depends(get_current_active_user_from_cookie),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ):
     """Handles the form submission for deleting a todo item."""
     error_message = None
@@ -486,7 +699,7 @@ async def delete_todo_action(
             db=db, todo_id=todo_id, user=current_user
         )
         print("Route Handler: Delete successful. Redirecting...")
-        success_message = "Todo deleted successfully."
+        success_message = "Todo deleted."
 
     except HTTPException as e:
         print(
@@ -501,6 +714,55 @@ async def delete_todo_action(
         logging.exception("Unexpected error during delete_todo_action")
         error_message = "An unexpected error occurred while deleting the todo."
 
+    query_params = {}
+    if error_message:
+        query_params["error"] = error_message
+    if success_message:
+        query_params["message"] = success_message
+        query_params["undo"] = todo_id
+
+    redirect_url = request.url_for("web_read_todos").include_query_params(
+        **query_params
+    )
+    return RedirectResponse(
+        url=str(redirect_url), status_code=status.HTTP_303_SEE_OTHER
+    )
+
+
+@router.post("/restore/{todo_id}", name="web_restore_todo")
+@idempotent
+async def restore_todo_action(
+    request: Request,
+    todo_id: int,
+    db: AsyncSession = Depends(get_db),
+    orchestrator: OrchestratorService = Depends(get_orchestrator),
+    current_user: Principal = Depends(get_current_active_user_from_cookie),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
+    """Handles the Undo button shown after a todo is deleted."""
+    error_message = None
+    success_message = None
+    try:
+        print(f"Route Handler: Calling orchestrator to restore todo ID {todo_id}...")
+        await orchestrator.restore_todo_for_user(
+            db=db, todo_id=todo_id, user=current_user
+        )
+        print("Route Handler: Restore successful. Redirecting...")
+        success_message = "Todo restored."
+
+    except HTTPException as e:
+        print(
+            f"Route Handler: Restore failed (HTTPException {e.status_code}) - {e.detail}."
+        )
+        if e.status_code == status.HTTP_404_NOT_FOUND:
+            error_message = "This todo can no longer be restored."
+        else:
+            error_message = e.detail
+    except Exception as e:
+        print(f"Route Handler: Restore failed (Unexpected Exception) - {e}.")
+        logging.exception("Unexpected error during restore_todo_action")
+        error_message = "An unexpected error occurred while restoring the todo."
+
     query_params = {}
     if error_message:
         query_params["error"] = error_message
@@ -0,0 +1,298 @@
+"""
+Micro-benchmark cases for the CRUD, security, and web rendering hot paths.
+
+Importing this module pulls in the application settings, so `benchmarks.run`
+sets DATABASE_URL and SECRET_KEY before importing it.
+"""
+
+import itertools
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.security import (
+    VerifiedTokenCache,
+    create_access_token,
+    decode_access_token,
+)
+from app.crud import crud_todo
+from app.db.base import Base
+from app.db.models import Todo, User
+from app.main import app
+from app.schemas.todo import TodoCreate, TodoUpdate, PRIORITY_MAP, VALID_PRIORITIES
+from app.web.routes.todos import (
+    RECURRENCE_OPTIONS,
+    TODO_PRIORITY_OPTIONS,
+    TODO_SORT_OPTIONS,
+    TODO_STATUS_OPTIONS,
+    prepare_todos_for_template,
+    templates,
+)
+from benchmarks.harness import BenchmarkResult, Sampler
+
+SEARCH_TERMS = [None, "report"]
+RENDER_SIZES = [10, 1_000, 10_000]
+WORDS = [
+    "report",
+    "invoice",
+    "groceries",
+    "meeting",
+    "deploy",
+    "review",
+    "call",
+    "email",
+    "budget",
+    "travel",
+]
+
+
+def make_todo_rows(owner_id: int, count: int, rng: random.Random) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    rows = []
+    for _ in range(count):
+        words = rng.sample(WORDS, 3)
+        created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        rows.append(
+            {
+                "title": " ".join(words[:2]).capitalize(),
+                "description": f"Remember the {words[2]} before the deadline",
+                "status": rng.choice(TODO_STATUS_OPTIONS),
+                "priority": rng.choice(VALID_PRIORITIES),
+                "due_date": (
+                    date.today() + timedelta(days=rng.randint(-30, 90))
+                    if rng.random() < 0.7
+                    else None
+                ),
+                "created_at": created_at,
+                "updated_at": created_at,
+                "owner_id": owner_id,
+            }
+        )
+    return rows
+
+
+def make_transient_todos(count: int, rng: random.Random) -> List[Todo]:
+    """Builds detached Todo objects for the benchmarks that need no database."""
+    return [
+        Todo(id=index + 1, **row)
+        for index, row in enumerate(make_todo_rows(1, count, rng))
+    ]
+
+
+async def seed_database(engine, users: int, todos_per_user: int, seed: int) -> int:
+    """Recreates the schema and bulk-loads benchmark data. Returns the user id."""
+    rng = random.Random(seed)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(User),
+            [
+                {
+                    "email": f"bench{index}@example.com",
+                    "hashed_password": "not-a-real-hash",
+                    "is_active": True,
+                }
+                for index in range(users)
+            ],
+        )
+        for owner_id in range(1, users + 1):
+            await conn.execute(
+                insert(Todo), make_todo_rows(owner_id, todos_per_user, rng)
+            )
+    return 1
+
+
+def make_request() -> Request:
+    """A minimal request scope that lets templates resolve url_for()."""
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("testserver", 80),
+            "path": "/todos/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+            "app": app,
+            "router": app.router,
+        }
+    )
+
+
+async def bench_list_queries(session_factory, owner_id, repeat, warmup):
+    results = []
+    combinations = itertools.product(
+        TODO_SORT_OPTIONS,
+        [None] + TODO_STATUS_OPTIONS,
+        [None] + VALID_PRIORITIES,
+        SEARCH_TERMS,
+    )
+    async with session_factory() as db:
+        for sort_by, filter_status, filter_priority, search_term in combinations:
+            sampler = Sampler(repeat, warmup)
+            for _ in sampler.rounds():
+                with sampler.time():
+                    await crud_todo.get_todos_by_owner(
+                        db=db,
+                        owner_id=owner_id,
+                        filter_status=filter_status,
+                        filter_priority=filter_priority,
+                        sort_by=sort_by,
+                        search_term=search_term,
+                    )
+            results.append(
+                BenchmarkResult(
+                    "crud_todo.get_todos_by_owner",
+                    {
+                        "sort_by": sort_by,
+                        "filter_status": filter_status,
+                        "filter_priority": filter_priority,
+                        "search_term": search_term,
+                    },
+                    sampler.samples_ns,
+                )
+            )
+    return results
+
+
+async def bench_update_todo(session_factory, owner_id, repeat, warmup):
+    sampler = Sampler(repeat, warmup)
+    for round_number in sampler.rounds():
+        async with session_factory() as db:
+            todos = await crud_todo.get_todos_by_owner(
+                db=db, owner_id=owner_id, limit=1
+            )
+            todo_in = TodoUpdate(title=f"Benchmark update {round_number}", priority=1)
+            with sampler.time():
+                await crud_todo.update_todo(db=db, db_todo=todos[0], todo_in=todo_in)
+            await db.rollback()
+    return [BenchmarkResult("crud_todo.update_todo", {}, sampler.samples_ns)]
+
+
+async def bench_delete_todo(session_factory, owner_id, repeat, warmup):
+    sampler = Sampler(repeat, warmup)
+    for _ in sampler.rounds():
+        async with session_factory() as db:
+            todo = await crud_todo.create_todo(
+                db=db, todo_in=TodoCreate(title="Benchmark delete"), owner_id=owner_id
+            )
+            with sampler.time():
+                await crud_todo.delete_todo(db=db, todo_id=todo.id, owner_id=owner_id)
+            await db.rollback()
+    return [BenchmarkResult("crud_todo.delete_todo", {}, sampler.samples_ns)]
+
+
+def bench_tokens(repeat, warmup):
+    create_sampler = Sampler(repeat, warmup)
+    token = None
+    for _ in create_sampler.rounds():
+        with create_sampler.time():
+            token = create_access_token(data={"sub": "bench0@example.com"})
+
+    token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE)
+    decode_sampler = Sampler(repeat, warmup)
+    for _ in decode_sampler.rounds():
+        token_cache.clear()
+        with decode_sampler.time():
+            decode_access_token(token, token_cache)
+
+    cached_sampler = Sampler(repeat, warmup)
+    for _ in cached_sampler.rounds():
+        with cached_sampler.time():
+            decode_access_token(token, token_cache)
+
+    return [
+        BenchmarkResult("security.create_access_token", {}, create_sampler.samples_ns),
+        BenchmarkResult(
+            "security.decode_access_token", {"cache": "cold"}, decode_sampler.samples_ns
+        ),
+        BenchmarkResult(
+            "security.decode_access_token", {"cache": "hit"}, cached_sampler.samples_ns
+        ),
+    ]
+
+
+def bench_template_rows(repeat, warmup, rng):
+    results = []
+    for size in RENDER_SIZES:
+        todos = make_transient_todos(size, rng)
+        sampler = Sampler(repeat, warmup)
+        for _ in sampler.rounds():
+            with sampler.time():
+                prepare_todos_for_template(todos)
+        results.append(
+            BenchmarkResult(
+                "read_todos_page.prepare_todos_for_template",
+                {"items": size},
+                sampler.samples_ns,
+            )
+        )
+    return results
+
+
+def bench_render_todos(repeat, warmup, rng):
+    results = []
+    template = templates.get_template("todos.html")
+    request = make_request()
+    current_user = User(id=1, email="bench0@example.com", is_active=True)
+    for size in RENDER_SIZES:
+        context = {
+            "request": request,
+            "todos": prepare_todos_for_template(make_transient_todos(size, rng)),
+            "current_user": current_user,
+            "status_options": TODO_STATUS_OPTIONS,
+            "priority_options": TODO_PRIORITY_OPTIONS,
+            "recurrence_options": RECURRENCE_OPTIONS,
+            "sort_options": TODO_SORT_OPTIONS,
+            "priority_map": PRIORITY_MAP,
+            "filters": {"status": None, "priority": None, "sort": "created_at"},
+            "error": None,
+            "message": None,
+            "today_date": date.today(),
+        }
+        sampler = Sampler(repeat, warmup)
+        for _ in sampler.rounds():
+            with sampler.time():
+                template.render(context)
+        results.append(
+            BenchmarkResult(
+                "jinja.render_todos_html", {"items": size}, sampler.samples_ns
+            )
+        )
+    return results
+
+
+async def run_all(
+    database_url: str,
+    users: int,
+    todos_per_user: int,
+    repeat: int,
+    warmup: int,
+    seed: int,
+) -> List[BenchmarkResult]:
+    engine = create_async_engine(database_url)
+    session_factory = sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+    rng = random.Random(seed)
+    results: List[BenchmarkResult] = []
+    try:
+        owner_id = await seed_database(engine, users, todos_per_user, seed)
+        results += await bench_list_queries(session_factory, owner_id, repeat, warmup)
+        results += await bench_update_todo(session_factory, owner_id, repeat, warmup)
+        results += await bench_delete_todo(session_factory, owner_id, repeat, warmup)
+    finally:
+        await engine.dispose()
+
+    results += bench_tokens(repeat, warmup)
+    results += bench_template_rows(repeat, warmup, rng)
+    results += bench_render_todos(max(1, repeat // 5), min(warmup, 1), rng)
+    return results
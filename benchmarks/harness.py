@@ -0,0 +1,109 @@
+"""Timing helpers and JSON result storage for the micro-benchmarks."""
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_RESULTS_DIR = BENCHMARK_DIR / "results"
+
+
+class Sampler:
+    """Collects wall-clock samples, discarding the first `warmup` rounds."""
+
+    def __init__(self, repeat: int, warmup: int):
+        self.repeat = repeat
+        self.warmup = warmup
+        self.samples_ns: List[int] = []
+        self._round = 0
+
+    def rounds(self) -> Iterator[int]:
+        for self._round in range(self.warmup + self.repeat):
+            yield self._round
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        yield
+        elapsed = time.perf_counter_ns() - start
+        if self._round >= self.warmup:
+            self.samples_ns.append(elapsed)
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: dict[str, Any]
+    samples_ns: List[int] = field(default_factory=list)
+
+    def summary(self) -> dict[str, Any]:
+        samples = sorted(self.samples_ns)
+        p95_index = max(0, int(round(len(samples) * 0.95)) - 1)
+        mean_ns = statistics.fmean(samples)
+        return {
+            "name": self.name,
+            "params": self.params,
+            "rounds": len(samples),
+            "min_us": samples[0] / 1000,
+            "median_us": statistics.median(samples) / 1000,
+            "mean_us": mean_ns / 1000,
+            "p95_us": samples[p95_index] / 1000,
+            "stdev_us": (statistics.stdev(samples) / 1000) if len(samples) > 1 else 0.0,
+            "ops_per_sec": 1e9 / mean_ns if mean_ns else None,
+        }
+
+
+def git_revision() -> tuple[str, bool]:
+    """Returns the current short commit hash and whether the tree is dirty."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=BENCHMARK_DIR,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=BENCHMARK_DIR,
+            ).stdout.strip()
+        )
+        return revision, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def write_results(
+    results: List[BenchmarkResult],
+    metadata: dict[str, Any],
+    output: Optional[Path] = None,
+) -> Path:
+    """Writes the results as JSON, by default to results/<revision>.json."""
+    revision, dirty = git_revision()
+    if output is None:
+        suffix = "-dirty" if dirty else ""
+        output = DEFAULT_RESULTS_DIR / f"{revision}{suffix}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    document = {
+        "revision": revision,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **metadata,
+        "results": [result.summary() for result in results],
+    }
+    output.write_text(json.dumps(document, indent=2, default=str) + "\n")
+    return output
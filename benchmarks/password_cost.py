@@ -0,0 +1,119 @@
+"""
+Finds the password hashing cost that fits a target login latency on this machine.
+
+Usage (from the project root):
+
+    python -m benchmarks.password_cost --scheme bcrypt --target-ms 250
+    python -m benchmarks.password_cost --scheme argon2 --target-ms 250 --memory-cost-kib 65536
+
+Each cost is timed with the same CryptContext the app builds, and the highest
+cost whose median hash time stays under the target is printed as the
+PASSWORD_* settings to put in .env. Run it on the hardware that serves logins.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from benchmarks.harness import BenchmarkResult, Sampler, write_results
+
+BENCHMARK_PASSWORD = "correct horse battery staple"
+MAX_COST = {"bcrypt": 20, "argon2": 32}
+MIN_COST = {"bcrypt": 4, "argon2": 1}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=250.0,
+        help="Acceptable median time for one hash (and so one login verify).",
+    )
+    parser.add_argument(
+        "--memory-cost-kib",
+        type=int,
+        default=65536,
+        help="argon2 only: memory per hash, in KiB.",
+    )
+    parser.add_argument(
+        "--parallelism",
+        type=int,
+        default=1,
+        help="argon2 only: lanes per hash. Keep it at 1 when every core already "
+        "serves concurrent logins; raise it on hosts with idle cores.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Optionally store the timings as JSON (see benchmarks.harness).",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    # Settings are read at import time, so configure them before importing app code.
+    os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./benchmarks/bench.db")
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+    from app.core.security import build_crypt_context
+
+    results = []
+    chosen = None
+    for cost in range(MIN_COST[args.scheme], MAX_COST[args.scheme] + 1):
+        if args.scheme == "bcrypt":
+            context = build_crypt_context(["bcrypt"], bcrypt_rounds=cost)
+        else:
+            context = build_crypt_context(
+                ["argon2"],
+                argon2_time_cost=cost,
+                argon2_memory_cost_kib=args.memory_cost_kib,
+                argon2_parallelism=args.parallelism,
+            )
+
+        sampler = Sampler(args.repeat, args.warmup)
+        for _ in sampler.rounds():
+            with sampler.time():
+                context.hash(BENCHMARK_PASSWORD)
+        result = BenchmarkResult(
+            f"password_hash.{args.scheme}", {"cost": cost}, sampler.samples_ns
+        )
+        results.append(result)
+
+        median_ms = result.summary()["median_us"] / 1000
+        print(f"{args.scheme} cost {cost:>2}: {median_ms:>9.1f} ms")
+        if median_ms <= args.target_ms:
+            chosen = cost
+        else:
+            break
+
+    if args.output is not None:
+        write_results(
+            results,
+            metadata={"scheme": args.scheme, "target_ms": args.target_ms},
+            output=args.output,
+        )
+
+    if chosen is None:
+        print(f"Even the lowest {args.scheme} cost exceeds {args.target_ms} ms.")
+        return
+
+    print(f"\nSuggested settings for a {args.target_ms:.0f} ms target:")
+    if args.scheme == "bcrypt":
+        print('PASSWORD_SCHEMES=["bcrypt"]')
+        print(f"PASSWORD_BCRYPT_ROUNDS={chosen}")
+    else:
+        print('PASSWORD_SCHEMES=["argon2","bcrypt"]')
+        print(f"PASSWORD_ARGON2_TIME_COST={chosen}")
+        print(f"PASSWORD_ARGON2_MEMORY_COST_KIB={args.memory_cost_kib}")
+        print(f"PASSWORD_ARGON2_PARALLELISM={args.parallelism}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+
+
+@pytest.fixture
+def run_with_db(tmp_path):
+    """
+    Runs `scenario(session_factory)` on the event loop against a fresh
+    SQLite database with the application schema, and returns its result.
+    """
+    url = f"sqlite+aiosqlite:///{tmp_path / 'todo.db'}"
+
+    def run(scenario):
+        async def main():
+            engine = create_async_engine(url)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                return await scenario(
+                    sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+                )
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,103 @@
+import asyncio
+
+from sqlalchemy import insert
+
+from app.core.security import TokenGenerationTable
+from app.db.models import User
+from app.schemas.user import Principal
+from app.services.auth_service import AuthService
+
+
+def make_auth_service():
+    return AuthService(token_generations=TokenGenerationTable())
+
+
+def resolve(auth_service, token):
+    # Current tokens are resolved without a database session.
+    return asyncio.run(auth_service.get_principal_from_token(None, token))
+
+
+def test_current_token_is_accepted():
+    auth_service = make_auth_service()
+    token = auth_service.create_jwt_token(Principal(id=7, email="a@example.com"))
+
+    principal = resolve(auth_service, token)
+
+    assert principal is not None
+    assert principal.id == 7
+    assert principal.email == "a@example.com"
+
+
+def test_revoked_token_is_rejected():
+    """Tokens issued before a revocation stop working; newer ones still do."""
+    auth_service = make_auth_service()
+    old_token = auth_service.create_jwt_token(Principal(id=7, email="a@example.com"))
+
+    auth_service.token_generations.set(7, 1)
+    new_token = auth_service.create_jwt_token(
+        Principal(id=7, email="a@example.com", token_generation=1)
+    )
+
+    assert resolve(auth_service, old_token) is None
+    assert resolve(auth_service, new_token) is not None
+
+
+def test_revocation_only_affects_that_user():
+    auth_service = make_auth_service()
+    token = auth_service.create_jwt_token(Principal(id=8, email="b@example.com"))
+
+    auth_service.token_generations.set(7, 3)
+
+    assert resolve(auth_service, token) is not None
+
+
+def test_invalid_token_is_rejected():
+    assert resolve(make_auth_service(), "not-a-jwt") is None
+
+
+def test_each_auth_service_owns_its_token_cache():
+    first, second = make_auth_service(), make_auth_service()
+    token = first.create_jwt_token(Principal(id=7, email="a@example.com"))
+
+    resolve(first, token)
+    resolve(first, token)
+
+    assert len(first.token_cache) == 1
+    assert first.token_cache.hits == 1
+    assert len(second.token_cache) == 0
+
+
+def test_generation_merge_keeps_the_higher_generation():
+    table = TokenGenerationTable()
+    table.set(7, 3)
+    table.set(8, 1)
+
+    table.merge([(7, 2), (8, 4), (9, 1)])
+
+    assert [table.get(user_id) for user_id in (7, 8, 9, 10)] == [3, 4, 1, 0]
+
+
+def test_refresh_does_not_undo_a_revocation_made_during_the_load(run_with_db):
+    """A snapshot loaded before a revocation committed must not restore old tokens."""
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            await db.execute(
+                insert(User),
+                [
+                    {
+                        "email": "a@example.com",
+                        "hashed_password": "x",
+                        "token_generation": 1,
+                    }
+                ],
+            )
+            await db.commit()
+        auth_service = make_auth_service()
+        # Revocation applied from another request after the load started.
+        auth_service.token_generations.set(1, 2)
+        async with session_factory() as db:
+            await auth_service.refresh_token_generations(db)
+        return auth_service.token_generations.get(1)
+
+    assert run_with_db(scenario) == 2
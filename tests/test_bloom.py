@@ -0,0 +1,53 @@
+import math
+
+from app.core.bloom import BloomFilter
+
+
+def emails(count, prefix="user"):
+    return [f"{prefix}{index}@example.com" for index in range(count)]
+
+
+def test_added_keys_are_always_found():
+    bloom = BloomFilter(capacity=1_000, false_positive_rate=0.01)
+    added = emails(1_000)
+    for email in added:
+        bloom.add(email)
+
+    assert all(bloom.might_contain(email) for email in added)
+    assert bloom.count == 1_000
+
+
+def test_added_keys_are_found_past_capacity():
+    """Overfilling raises the false positive rate, never the false negatives."""
+    bloom = BloomFilter(capacity=100, false_positive_rate=0.01)
+    added = emails(5_000)
+    for email in added:
+        bloom.add(email)
+
+    assert all(bloom.might_contain(email) for email in added)
+
+
+def test_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(capacity=10_000, false_positive_rate=0.01)
+    for email in emails(10_000):
+        bloom.add(email)
+
+    probes = emails(20_000, prefix="stranger")
+    false_positives = sum(bloom.might_contain(email) for email in probes)
+
+    assert false_positives / len(probes) < 0.02
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(capacity=0)
+
+    assert not bloom.might_contain("a@example.com")
+    assert bloom.capacity == 1
+
+
+def test_size_follows_the_formula():
+    bloom = BloomFilter(capacity=1_000_000, false_positive_rate=0.01)
+
+    assert bloom.num_bits == math.ceil(-1_000_000 * math.log(0.01) / math.log(2) ** 2)
+    assert bloom.num_hashes == 7
+    assert bloom.size_bytes == (bloom.num_bits + 7) // 8
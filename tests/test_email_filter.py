@@ -0,0 +1,81 @@
+from sqlalchemy import event
+
+from app.core.security import get_password_hash
+from app.crud import crud_user
+from app.schemas.user import UserCreate
+from app.services.auth_service import AuthService
+
+
+def record_statements(session_factory):
+    statements = []
+    event.listen(
+        session_factory.kw["bind"].sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    return statements
+
+
+def looked_up_by_email(statements):
+    return [statement for statement in statements if "users.email =" in statement]
+
+
+async def add_user(session_factory, email, password="pw12345"):
+    async with session_factory() as db:
+        await crud_user.create_user(
+            db,
+            user_in=UserCreate(email=email, password=password),
+            hashed_password=get_password_hash(password),
+        )
+        await db.commit()
+
+
+def test_unknown_email_login_skips_the_email_lookup(run_with_db):
+    async def scenario(session_factory):
+        await add_user(session_factory, "known@example.com")
+        auth_service = AuthService()
+        async with session_factory() as db:
+            await auth_service.refresh_email_filter(db)
+            statements = record_statements(session_factory)
+            user = await auth_service.authenticate_user(
+                db, "nobody@example.com", "pw12345"
+            )
+        return user, statements
+
+    user, statements = run_with_db(scenario)
+
+    assert user is None
+    assert looked_up_by_email(statements) == []
+
+
+def test_known_email_login_looks_the_user_up(run_with_db):
+    async def scenario(session_factory):
+        await add_user(session_factory, "known@example.com")
+        auth_service = AuthService()
+        async with session_factory() as db:
+            await auth_service.refresh_email_filter(db)
+            return await auth_service.authenticate_user(
+                db, "known@example.com", "pw12345"
+            )
+
+    assert run_with_db(scenario).email == "known@example.com"
+
+
+def test_login_of_user_registered_elsewhere_tops_up_the_filter(run_with_db):
+    """A signup through another worker is not refused before the next refresh."""
+
+    async def scenario(session_factory):
+        auth_service = AuthService()
+        async with session_factory() as db:
+            await auth_service.refresh_email_filter(db)
+        await add_user(session_factory, "new@example.com")
+        async with session_factory() as db:
+            user = await auth_service.authenticate_user(
+                db, "new@example.com", "pw12345"
+            )
+        return user, auth_service.email_might_exist("new@example.com")
+
+    user, in_filter = run_with_db(scenario)
+
+    assert user is not None
+    assert in_filter
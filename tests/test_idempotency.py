@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+from fastapi.responses import RedirectResponse
+
+from app.core.idempotency import (
+    IdempotencyInProgress,
+    IdempotencyKeyReused,
+    InMemoryIdempotencyStore,
+    StoredResponse,
+)
+from app.web.deps import completed_write
+
+REDIRECT = StoredResponse(303, [("location", "/todos/?message=Added")], b"")
+
+
+def make_store(**kwargs):
+    return InMemoryIdempotencyStore(
+        ttl_seconds=kwargs.pop("ttl_seconds", 60),
+        wait_seconds=kwargs.pop("wait_seconds", 0.05),
+        **kwargs,
+    )
+
+
+def test_completed_key_replays_stored_response():
+    store = make_store()
+
+    async def scenario():
+        assert await store.begin("1:k", "fp") is None
+        await store.complete("1:k", REDIRECT)
+        assert await store.begin("1:k", "fp") == REDIRECT
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_for_another_request_is_rejected():
+    store = make_store()
+
+    async def scenario():
+        await store.begin("1:k", "fp")
+        await store.complete("1:k", REDIRECT)
+        with pytest.raises(IdempotencyKeyReused):
+            await store.begin("1:k", "other")
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_key_runs_again():
+    store = make_store()
+
+    async def scenario():
+        await store.begin("1:k", "fp")
+        await store.abandon("1:k")
+        assert await store.begin("1:k", "fp") is None
+        # The retry may also be a corrected form.
+        await store.abandon("1:k")
+        assert await store.begin("1:k", "fixed") is None
+
+    asyncio.run(scenario())
+
+
+def test_retry_waits_for_the_original_request():
+    store = make_store(wait_seconds=1)
+
+    async def scenario():
+        await store.begin("1:k", "fp")
+        retry = asyncio.create_task(store.begin("1:k", "fp"))
+        await asyncio.sleep(0.01)
+        assert not retry.done()
+        await store.complete("1:k", REDIRECT)
+        assert await retry == REDIRECT
+
+    asyncio.run(scenario())
+
+
+def test_retry_takes_over_a_key_abandoned_while_waiting():
+    store = make_store(wait_seconds=1)
+
+    async def scenario():
+        await store.begin("1:k", "fp")
+        retry = asyncio.create_task(store.begin("1:k", "fp"))
+        await asyncio.sleep(0.01)
+        await store.abandon("1:k")
+        assert await retry is None
+
+    asyncio.run(scenario())
+
+
+def test_retry_gives_up_while_original_is_still_running():
+    store = make_store(wait_seconds=0.01)
+
+    async def scenario():
+        await store.begin("1:k", "fp")
+        with pytest.raises(IdempotencyInProgress):
+            await store.begin("1:k", "fp")
+
+    asyncio.run(scenario())
+
+
+def test_expired_key_is_claimed_again_and_purged():
+    store = make_store(ttl_seconds=0)
+
+    async def scenario():
+        await store.begin("1:k", "fp")
+        await store.complete("1:k", REDIRECT)
+        assert await store.begin("1:k", "other") is None
+        await store.complete("1:k", REDIRECT)
+        await store.purge()
+        assert len(store._entries) == 0
+
+    asyncio.run(scenario())
+
+
+def test_stored_response_drops_cookies():
+    response = RedirectResponse("/todos/", status_code=303)
+    response.set_cookie("access_token", "secret")
+
+    stored = StoredResponse.from_response(response)
+
+    assert stored.status_code == 303
+    assert ("location", "/todos/") in stored.headers
+    assert all(name.lower() != "set-cookie" for name, _ in stored.headers)
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        (Response(status_code=200), True),
+        (RedirectResponse("/todos/?message=Todo%20added", status_code=303), True),
+        (RedirectResponse("/todos/?error=Todo%20not%20found", status_code=303), False),
+        (RedirectResponse("/todos/", status_code=307), False),
+        (Response(status_code=409), False),
+        (Response(status_code=503), False),
+    ],
+)
+def test_only_completed_writes_are_stored(response, expected):
+    assert completed_write(response) is expected
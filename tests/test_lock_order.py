@@ -0,0 +1,184 @@
+"""
+Lock order of the todo write paths.
+
+Every write locks the todos it changes, then the owner's todo_stats row
+(record_todo_change), then parent todos whose roll-up changes. These tests
+interleave a subtask insert with a sibling's status change in both orders
+and check neither waits for a lock the other holds while holding one it
+needs, which Postgres would abort as a deadlock.
+
+Set TEST_DATABASE_URL to enable (see tests/test_query_plans.py). The tables
+in that database are dropped and recreated.
+"""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import crud_todo
+from app.db.base import Base
+from app.db.models import Todo, TodoStats, User
+from app.schemas.todo import TodoCreate
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL or not TEST_DATABASE_URL.startswith("postgresql"),
+    reason="Lock order tests need TEST_DATABASE_URL pointing at a PostgreSQL database",
+)
+
+OWNER_ID = 1
+# Long enough for a blocked statement to be waiting, short enough to keep
+# a regression from hanging the suite.
+BLOCKED_SECONDS = 0.3
+
+
+async def _setup():
+    """Fresh schema with one parent todo and one subtask. Returns ids and sessions."""
+    engine = create_async_engine(TEST_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(User), [{"email": "lock@example.com", "hashed_password": "x"}]
+        )
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        parent = await crud_todo.create_todo(
+            db, todo_in=TodoCreate(title="Parent"), owner_id=OWNER_ID
+        )
+        sibling = await crud_todo.create_todo(
+            db,
+            todo_in=TodoCreate(title="Sibling", parent_id=parent.id),
+            owner_id=OWNER_ID,
+        )
+        await db.commit()
+    return engine, session_factory, parent.id, sibling.id
+
+
+async def _lock_timeout(db: AsyncSession) -> None:
+    # Turns a lock wait that would deadlock into a quick, visible failure.
+    await db.execute(text("SET LOCAL lock_timeout = '2s'"))
+
+
+async def _rollup(session_factory, parent_id):
+    async with session_factory() as db:
+        parent = await db.get(Todo, parent_id)
+        return parent.subtask_count, parent.subtasks_done
+
+
+def test_subtask_insert_waits_for_stats_before_locking_the_parent():
+    """A status change holding the stats row can still take the parent."""
+
+    async def scenario():
+        engine, session_factory, parent_id, sibling_id = await _setup()
+        try:
+            async with session_factory() as status_db, session_factory() as create_db:
+                await _lock_timeout(status_db)
+                await _lock_timeout(create_db)
+                # Where update_todo_statuses stands before its roll-up: the
+                # sibling and the stats row locked, the parent not yet.
+                await status_db.execute(
+                    select(Todo.id).filter(Todo.id == sibling_id).with_for_update()
+                )
+                await status_db.execute(
+                    select(TodoStats.owner_id)
+                    .filter(TodoStats.owner_id == OWNER_ID)
+                    .with_for_update()
+                )
+
+                create = asyncio.create_task(
+                    crud_todo.create_todo(
+                        create_db,
+                        todo_in=TodoCreate(title="New", parent_id=parent_id),
+                        owner_id=OWNER_ID,
+                    )
+                )
+                await asyncio.sleep(BLOCKED_SECONDS)
+                assert not create.done()
+
+                await crud_todo.apply_subtask_rollups(
+                    status_db, OWNER_ID, {parent_id: (0, 1)}
+                )
+                await status_db.commit()
+                await create
+                await create_db.commit()
+
+            assert await _rollup(session_factory, parent_id) == (2, 1)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_status_change_waits_for_a_subtask_insert_in_progress():
+    async def scenario():
+        engine, session_factory, parent_id, sibling_id = await _setup()
+        try:
+            async with session_factory() as create_db, session_factory() as status_db:
+                await _lock_timeout(create_db)
+                await _lock_timeout(status_db)
+                await crud_todo.create_todo(
+                    create_db,
+                    todo_in=TodoCreate(title="New", parent_id=parent_id),
+                    owner_id=OWNER_ID,
+                )
+
+                change = asyncio.create_task(
+                    crud_todo.update_todo_statuses(
+                        status_db,
+                        owner_id=OWNER_ID,
+                        changes={sibling_id: ("Done", None)},
+                    )
+                )
+                await asyncio.sleep(BLOCKED_SECONDS)
+                assert not change.done()
+
+                await create_db.commit()
+                assert await change == [sibling_id]
+                await status_db.commit()
+
+            assert await _rollup(session_factory, parent_id) == (2, 1)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_subtask_inserts_and_status_changes_do_not_deadlock():
+    rounds = 20
+
+    async def scenario():
+        engine, session_factory, parent_id, sibling_id = await _setup()
+
+        async def add_subtask(index):
+            async with session_factory() as db:
+                await crud_todo.create_todo(
+                    db,
+                    todo_in=TodoCreate(title=f"Sub {index}", parent_id=parent_id),
+                    owner_id=OWNER_ID,
+                )
+                await db.commit()
+
+        async def flip_sibling(index):
+            async with session_factory() as db:
+                status = "Done" if index % 2 == 0 else "Not Started"
+                await crud_todo.update_todo_statuses(
+                    db, owner_id=OWNER_ID, changes={sibling_id: (status, None)}
+                )
+                await db.commit()
+
+        try:
+            await asyncio.gather(
+                *(add_subtask(index) for index in range(rounds)),
+                *(flip_sibling(index) for index in range(rounds)),
+            )
+            assert await _rollup(session_factory, parent_id) == (rounds + 1, 0)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
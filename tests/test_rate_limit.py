@@ -0,0 +1,137 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import rate_limit
+from app.core.rate_limit import (
+    BucketRule,
+    HashingBusy,
+    HashingLimiter,
+    InMemoryTokenBuckets,
+    RateLimiter,
+)
+from app.main import app
+from app.web.deps import email_digest, limit_auth_attempts
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def take(buckets, key, rule):
+    return asyncio.run(buckets.take(key, rule))
+
+
+def test_bucket_allows_burst_then_reports_wait(clock):
+    buckets = InMemoryTokenBuckets()
+    rule = BucketRule(burst=3, per_minute=6)
+
+    assert [take(buckets, "ip:a", rule) for _ in range(3)] == [0, 0, 0]
+    # One token every 10 seconds.
+    assert take(buckets, "ip:a", rule) == pytest.approx(10)
+
+
+def test_bucket_refills_over_time_up_to_burst(clock):
+    buckets = InMemoryTokenBuckets()
+    rule = BucketRule(burst=2, per_minute=6)
+    take(buckets, "ip:a", rule)
+    take(buckets, "ip:a", rule)
+
+    clock.now += 5
+    assert take(buckets, "ip:a", rule) == pytest.approx(5)
+    clock.now += 5
+    assert take(buckets, "ip:a", rule) == 0
+
+    # A long idle period refills no more than `burst` tokens.
+    clock.now += 3_600
+    assert [take(buckets, "ip:a", rule) for _ in range(2)] == [0, 0]
+    assert take(buckets, "ip:a", rule) > 0
+
+
+def test_buckets_are_independent_and_evicted_past_max_keys(clock):
+    buckets = InMemoryTokenBuckets(max_keys=2)
+    rule = BucketRule(burst=1, per_minute=1)
+    take(buckets, "ip:a", rule)
+    assert take(buckets, "ip:b", rule) == 0
+
+    take(buckets, "ip:c", rule)
+    # "ip:a" was evicted, so it starts from a full bucket again.
+    assert take(buckets, "ip:a", rule) == 0
+    assert take(buckets, "ip:c", rule) > 0
+
+
+def test_rate_limiter_returns_longest_wait(clock):
+    limiter = RateLimiter(
+        InMemoryTokenBuckets(),
+        {"ip": BucketRule(burst=1, per_minute=60), "email": BucketRule(1, 6)},
+    )
+    keys = [("ip", "10.0.0.1"), ("email", "a@example.com")]
+
+    assert asyncio.run(limiter.check(keys)) == 0
+    assert asyncio.run(limiter.check(keys)) == pytest.approx(10)
+
+
+def test_hashing_limiter_sheds_load_past_concurrency():
+    limiter = HashingLimiter(concurrency=1, queue_timeout_seconds=0.05)
+    release = threading.Event()
+
+    async def scenario():
+        slow = asyncio.create_task(limiter.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HashingBusy):
+            await limiter.run(lambda: "fast")
+        release.set()
+        assert await slow is True
+        assert await limiter.run(lambda: "fast") == "fast"
+
+    asyncio.run(scenario())
+
+
+def test_hashing_limiter_frees_slot_when_hash_fails():
+    limiter = HashingLimiter(concurrency=1, queue_timeout_seconds=0.05)
+
+    def fail():
+        raise ValueError("bad hash")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await limiter.run(fail)
+        assert await limiter.run(lambda: "ok") == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_email_keys_hide_the_address():
+    digest = email_digest(" Alice@Example.com ")
+
+    assert digest == email_digest("alice@example.com")
+    assert "alice" not in digest and len(digest) == 16
+    assert digest != email_digest("bob@example.com")
+
+
+def test_only_login_and_signup_submissions_are_rate_limited():
+    limited = {
+        (method, route.path)
+        for route in app.routes
+        if hasattr(route, "dependant")
+        and any(
+            dependency.call is limit_auth_attempts
+            for dependency in route.dependant.dependencies
+        )
+        for method in route.methods
+    }
+
+    assert limited == {("POST", "/auth/login"), ("POST", "/auth/signup")}
@@ -0,0 +1,140 @@
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from app.core.recurrence import (
+    RecurrenceRule,
+    anchor_rule,
+    describe_rule,
+    next_occurrence,
+    normalize_rule,
+    occurrence_start,
+    parse_rule,
+)
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Server time zone with DST: 2026-03-08 and 2026-11-01 are 23 and 25 hours long."""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_parse_rule_reads_every_supported_part():
+    rule = parse_rule("RRULE:freq=weekly;interval=2;byday=FR,MO;until=20261231")
+
+    assert rule == RecurrenceRule(
+        "WEEKLY", interval=2, by_day=(0, 4), until=date(2026, 12, 31)
+    )
+    assert str(rule) == "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR;UNTIL=20261231"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "FREQ=HOURLY",
+        "FREQ=DAILY;COUNT=3",
+        "FREQ=DAILY;INTERVAL=0",
+        "FREQ=DAILY;INTERVAL=x",
+        "FREQ=DAILY;BYDAY=MO",
+        "FREQ=MONTHLY;BYMONTH=2",
+        "FREQ=MONTHLY;BYMONTHDAY=32",
+        "FREQ=WEEKLY;BYDAY=XX",
+        "FREQ=DAILY;UNTIL=2026-13-01",
+        "FREQ",
+    ],
+)
+def test_parse_rule_rejects_unsupported_rules(text):
+    with pytest.raises(ValueError):
+        parse_rule(text)
+
+
+def test_normalize_rule_is_canonical():
+    assert normalize_rule(" freq=daily ; interval=1 ") == "FREQ=DAILY"
+
+
+def test_monthly_rule_on_the_31st_uses_the_last_day_of_short_months():
+    rule = anchor_rule("FREQ=MONTHLY", date(2026, 1, 31))
+    assert rule == "FREQ=MONTHLY;BYMONTHDAY=31"
+
+    occurrences = [date(2026, 1, 31)]
+    for _ in range(3):
+        occurrences.append(next_occurrence(rule, occurrences[-1]))
+
+    assert occurrences[1:] == [date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+
+
+def test_unanchored_monthly_rule_drifts_to_the_shorter_day():
+    assert next_occurrence("FREQ=MONTHLY", date(2026, 1, 31)) == date(2026, 2, 28)
+    assert next_occurrence("FREQ=MONTHLY", date(2026, 2, 28)) == date(2026, 3, 28)
+
+
+def test_monthly_rule_crosses_the_year_end():
+    assert next_occurrence("FREQ=MONTHLY;INTERVAL=2", date(2026, 12, 15)) == date(
+        2027, 2, 15
+    )
+
+
+def test_yearly_rule_on_february_29th():
+    rule = anchor_rule("FREQ=YEARLY", date(2028, 2, 29))
+
+    assert next_occurrence(rule, date(2028, 2, 29)) == date(2029, 2, 28)
+    assert next_occurrence(rule, date(2031, 2, 28)) == date(2032, 2, 29)
+
+
+def test_weekly_rule_with_weekdays_wraps_to_the_next_period():
+    rule = "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH"
+    monday = date(2026, 10, 19)
+
+    assert next_occurrence(rule, monday) == date(2026, 10, 22)
+    assert next_occurrence(rule, date(2026, 10, 22)) == date(2026, 11, 2)
+
+
+def test_missed_occurrences_are_skipped():
+    assert next_occurrence(
+        "FREQ=DAILY;INTERVAL=3", date(2026, 1, 1), not_before=date(2026, 1, 20)
+    ) == date(2026, 1, 22)
+    assert next_occurrence(
+        "FREQ=WEEKLY;BYDAY=MO,FR", date(2026, 10, 5), not_before=date(2026, 10, 21)
+    ) == date(2026, 10, 23)
+
+
+def test_rule_ends_after_until():
+    rule = "FREQ=DAILY;UNTIL=20261020"
+
+    assert next_occurrence(rule, date(2026, 10, 19)) == date(2026, 10, 20)
+    assert next_occurrence(rule, date(2026, 10, 20)) is None
+
+
+def test_daily_rule_keeps_the_date_across_dst(new_york):
+    spring = next_occurrence("FREQ=DAILY", date(2026, 3, 7))
+    autumn = next_occurrence("FREQ=DAILY", date(2026, 10, 31))
+
+    assert spring == date(2026, 3, 8)
+    assert autumn == date(2026, 11, 1)
+
+
+def test_occurrence_start_is_local_midnight_across_dst(new_york):
+    before, during, after = (occurrence_start(date(2026, 3, day)) for day in (7, 8, 9))
+
+    assert before.utcoffset() == timedelta(hours=-5)
+    assert after.utcoffset() == timedelta(hours=-4)
+    assert (during.hour, during.minute) == (0, 0)
+    assert after - during == timedelta(hours=23)
+
+    fall_day = occurrence_start(date(2026, 11, 1))
+    assert occurrence_start(date(2026, 11, 2)) - fall_day == timedelta(hours=25)
+
+
+def test_describe_rule():
+    assert describe_rule(None) is None
+    assert describe_rule("FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR") == "Every weekday"
+    assert (
+        describe_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20261231")
+        == "Every 2 weeks on Mon, Thu until Dec 31, 2026"
+    )
@@ -0,0 +1,92 @@
+from collections import Counter
+
+import pytest
+from sqlalchemy import inspect
+
+from app.db.models import Todo, User
+from app.db.sharding import (
+    DIRECTORY_STRATEGY,
+    HASH_STRATEGY,
+    PRIMARY_SHARD,
+    ShardRouter,
+)
+
+# Engines connect lazily, so these URLs are never dialed.
+SHARD_URLS = [
+    "postgresql+asyncpg://todo@localhost:5432/todo_shard1",
+    "postgresql+asyncpg://todo@localhost:5432/todo_shard2",
+]
+
+
+def test_unsharded_router_uses_the_primary():
+    router = ShardRouter([])
+
+    assert not router.enabled
+    assert router.shard_for(42) == PRIMARY_SHARD
+    assert router.bind_arguments(42) is None
+    assert router.owner_shard_ids() == [PRIMARY_SHARD]
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        ShardRouter(SHARD_URLS, "round_robin")
+
+
+def test_hash_strategy_is_stable_and_spreads_owners():
+    router = ShardRouter(SHARD_URLS, HASH_STRATEGY)
+    other_worker = ShardRouter(SHARD_URLS, HASH_STRATEGY)
+
+    placement = Counter(router.shard_for(owner_id) for owner_id in range(1, 1_001))
+
+    assert router.shard_ids == ["shard0", "shard1"]
+    assert set(placement) == {"shard0", "shard1"}
+    assert min(placement.values()) > 400
+    assert all(
+        router.shard_for(owner_id) == other_worker.shard_for(owner_id)
+        for owner_id in range(1, 1_001)
+    )
+    assert router.bind_arguments(7) == {"shard_id": router.shard_for(7)}
+
+
+def test_hash_strategy_ignores_assignments():
+    router = ShardRouter(SHARD_URLS, HASH_STRATEGY)
+    hashed = router.shard_for(7)
+
+    router.assign(7, "shard1" if hashed == "shard0" else "shard0")
+
+    assert router.shard_for(7) == hashed
+
+
+def test_directory_entries_win_over_the_hash():
+    router = ShardRouter(SHARD_URLS, DIRECTORY_STRATEGY)
+    hashed = router.shard_for(7)
+    moved = "shard1" if hashed == "shard0" else "shard0"
+
+    router.assign(7, moved)
+    assert router.shard_for(7) == moved
+
+    # Owners missing from the directory fall back to the hash.
+    router.load_directory([])
+    assert router.shard_for(7) == hashed
+
+
+def test_directory_skips_unknown_shards():
+    router = ShardRouter(SHARD_URLS, DIRECTORY_STRATEGY)
+
+    router.load_directory([(7, "shard1"), (8, "shard9")])
+
+    assert router.shard_for(7) == "shard1"
+    assert router.shard_for(8) == router.hash_shard(8)
+
+
+def test_session_callbacks_route_by_owner():
+    router = ShardRouter(SHARD_URLS, HASH_STRATEGY)
+    todos, users = inspect(Todo), inspect(User)
+
+    assert router.choose_shard(todos, Todo(owner_id=7)) == router.shard_for(7)
+    assert router.choose_shard(users, User(id=7)) == PRIMARY_SHARD
+    with pytest.raises(ValueError):
+        router.choose_shard(todos, Todo())
+
+    assert router.choose_identity_shards(todos, (1,)) == ["shard0", "shard1"]
+    assert router.choose_identity_shards(users, (1,)) == [PRIMARY_SHARD]
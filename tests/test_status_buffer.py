@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+from app.crud import crud_todo
+from app.db.models import Todo
+from app.services.status_buffer import StatusWriteBuffer
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Records the batches the buffer writes instead of running the UPDATE."""
+    batches = []
+
+    async def update_todo_statuses(db, *, owner_id, changes):
+        batches.append((owner_id, changes))
+        return list(changes)
+
+    monkeypatch.setattr(crud_todo, "update_todo_statuses", update_todo_statuses)
+    return batches
+
+
+def test_flush_writes_coalesced_changes_once(writes):
+    buffer = StatusWriteBuffer(window_seconds=60)
+
+    async def scenario():
+        await buffer.add(1, 10, "In Progress", expected_version=3)
+        await buffer.add(1, 10, "Done", expected_version=4)
+        await buffer.add(1, 11, "Done")
+        assert buffer.has_pending(1)
+        await buffer.flush_user(1)
+
+    asyncio.run(scenario())
+
+    # The last status wins, checked against the version of the first click.
+    assert writes == [(1, {10: ("Done", 3), 11: ("Done", None)})]
+    assert not buffer.has_pending(1)
+
+
+def test_changes_are_flushed_after_the_window(writes):
+    buffer = StatusWriteBuffer(window_seconds=0.01)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.add(2, 20, "Done")
+        assert writes == []
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+
+    assert sorted(writes) == [(1, {10: ("Done", None)}), (2, {20: ("Done", None)})]
+
+
+def test_full_buffer_flushes_immediately(writes):
+    buffer = StatusWriteBuffer(window_seconds=60, max_pending_per_user=2)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.add(1, 11, "Done")
+
+    asyncio.run(scenario())
+
+    assert writes == [(1, {10: ("Done", None), 11: ("Done", None)})]
+
+
+def test_flush_all_writes_every_user(writes):
+    buffer = StatusWriteBuffer(window_seconds=60)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.add(2, 20, "In Progress")
+        await buffer.flush_all()
+
+    asyncio.run(scenario())
+
+    assert sorted(writes) == [
+        (1, {10: ("Done", None)}),
+        (2, {20: ("In Progress", None)}),
+    ]
+
+
+def test_failed_flush_keeps_changes_behind_newer_clicks(monkeypatch):
+    async def update_todo_statuses(db, *, owner_id, changes):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(crud_todo, "update_todo_statuses", update_todo_statuses)
+    buffer = StatusWriteBuffer(window_seconds=60)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.add(1, 11, "Done")
+        flush = asyncio.create_task(buffer.flush_user(1))
+        await asyncio.sleep(0)
+        await buffer.add(1, 10, "Not Started")
+        await flush
+        pending = buffer.snapshot(1)
+        buffer._timers.pop(1).cancel()
+        return pending
+
+    pending = asyncio.run(scenario())
+
+    assert {todo_id: change.status for todo_id, change in pending.items()} == {
+        10: "Not Started",
+        11: "Done",
+    }
+
+
+def test_overlay_shows_pending_status_and_counts_its_delta():
+    buffer = StatusWriteBuffer(window_seconds=60)
+    todo = Todo(id=10, status="Not Started", priority=1, due_date=None)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        assert buffer.stats_delta(1) is None
+        buffer.overlay(buffer.snapshot(1), [todo])
+        delta = buffer.stats_delta(1)
+        buffer._timers.pop(1).cancel()
+        return delta
+
+    delta = asyncio.run(scenario())
+
+    assert todo.status == "Done"
+    assert delta == {"not_started": -1, "done": 1}
+
+
+def failing_writes(monkeypatch, failures):
+    """Fails the first `failures` writes, then records batches like `writes`."""
+    batches = []
+
+    async def update_todo_statuses(db, *, owner_id, changes):
+        if len(batches) < failures:
+            batches.append(None)
+            raise RuntimeError("database unavailable")
+        batches.append((owner_id, changes))
+        return list(changes)
+
+    monkeypatch.setattr(crud_todo, "update_todo_statuses", update_todo_statuses)
+    return batches
+
+
+def test_change_is_dropped_after_max_attempts(monkeypatch, caplog):
+    failing_writes(monkeypatch, failures=10)
+    buffer = StatusWriteBuffer(window_seconds=60, max_attempts=2)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.flush_user(1)
+        assert buffer.has_pending(1)
+        await buffer.flush_user(1)
+        assert 1 not in buffer._timers
+
+    asyncio.run(scenario())
+
+    assert not buffer.has_pending(1)
+    assert "Dropping 1 status changes for user 1" in caplog.text
+    assert "todo 10 -> Done" in caplog.text
+
+
+def test_flush_all_retries_a_failed_write(monkeypatch):
+    batches = failing_writes(monkeypatch, failures=1)
+    buffer = StatusWriteBuffer(window_seconds=0)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.flush_all()
+        assert buffer._timers == {}
+
+    asyncio.run(scenario())
+
+    assert batches == [None, (1, {10: ("Done", None)})]
+    assert not buffer.has_pending(1)
+
+
+def test_flush_all_logs_changes_it_could_not_write(monkeypatch, caplog):
+    batches = failing_writes(monkeypatch, failures=10)
+    buffer = StatusWriteBuffer(window_seconds=0, max_attempts=3)
+
+    async def scenario():
+        await buffer.add(1, 10, "Done")
+        await buffer.add(2, 20, "In Progress")
+        await buffer.flush_all()
+        assert buffer._timers == {}
+
+    asyncio.run(scenario())
+
+    assert len(batches) == 6
+    assert not buffer.has_pending(1) and not buffer.has_pending(2)
+    assert "todo 10 -> Done" in caplog.text
+    assert "todo 20 -> In Progress" in caplog.text
@@ -0,0 +1,102 @@
+from sqlalchemy import func, select
+
+from app.crud import crud_todo
+from app.db.models import Todo
+from app.schemas.todo import TodoCreate, TodoUpdate
+
+OWNER_ID = 1
+
+
+async def add_todo(db, title, parent_id=None, status="Not Started"):
+    return await crud_todo.create_todo(
+        db,
+        todo_in=TodoCreate(title=title, parent_id=parent_id, status=status),
+        owner_id=OWNER_ID,
+    )
+
+
+async def rollup(session_factory, parent_id):
+    """The parent's stored roll-up and the one counted from its live subtasks."""
+    async with session_factory() as db:
+        parent = await db.get(Todo, parent_id)
+        children = Todo.parent_id == parent_id, Todo.deleted_at.is_(None)
+        counted = (
+            await db.scalar(select(func.count()).filter(*children)),
+            await db.scalar(
+                select(func.count()).filter(*children, Todo.status == "Done")
+            ),
+        )
+    return (parent.subtask_count, parent.subtasks_done), counted
+
+
+def test_rollup_follows_create_status_change_delete_and_restore(run_with_db):
+    async def scenario(session_factory):
+        steps = []
+
+        async def step(name, parent_id):
+            stored, counted = await rollup(session_factory, parent_id)
+            steps.append((name, stored, counted))
+
+        async with session_factory() as db:
+            parent = await add_todo(db, "Project")
+            design = await add_todo(db, "Design", parent.id)
+            budget = await add_todo(db, "Budget", parent.id, status="Done")
+            await db.commit()
+        await step("created", parent.id)
+
+        async with session_factory() as db:
+            await crud_todo.update_todo(
+                db, db_todo=design, todo_in=TodoUpdate(status="Done")
+            )
+            await db.commit()
+        await step("updated", parent.id)
+
+        async with session_factory() as db:
+            await crud_todo.update_todo_statuses(
+                db,
+                owner_id=OWNER_ID,
+                changes={design.id: ("In Progress", None), budget.id: ("Done", None)},
+            )
+            await db.commit()
+        await step("batched", parent.id)
+
+        async with session_factory() as db:
+            await crud_todo.delete_todo(db, todo_id=budget.id, owner_id=OWNER_ID)
+            await db.commit()
+        await step("deleted", parent.id)
+
+        async with session_factory() as db:
+            await crud_todo.restore_todo(db, todo_id=budget.id, owner_id=OWNER_ID)
+            await db.commit()
+        await step("restored", parent.id)
+        return steps
+
+    steps = run_with_db(scenario)
+
+    assert [(name, stored) for name, stored, _ in steps] == [
+        ("created", (2, 1)),
+        ("updated", (2, 2)),
+        ("batched", (2, 1)),
+        ("deleted", (1, 0)),
+        ("restored", (2, 1)),
+    ]
+    for name, stored, counted in steps:
+        assert stored == counted, name
+
+
+def test_deleting_a_parent_leaves_the_grandparent_counting_the_rest(run_with_db):
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            project = await add_todo(db, "Project")
+            design = await add_todo(db, "Design", project.id, status="Done")
+            await add_todo(db, "Sketch", design.id, status="Done")
+            await add_todo(db, "Budget", project.id)
+            await db.commit()
+        async with session_factory() as db:
+            await crud_todo.delete_todo(db, todo_id=design.id, owner_id=OWNER_ID)
+            await db.commit()
+        return await rollup(session_factory, project.id)
+
+    stored, counted = run_with_db(scenario)
+
+    assert stored == counted == (1, 0)
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from app.core.pubsub import InMemoryPubSub, _deliver
+from app.services.todo_events import (
+    MAX_BATCH,
+    RESYNC,
+    Subscription,
+    TodoEvent,
+    TodoEventBroker,
+)
+
+
+def drain(subscription):
+    async def read_all():
+        events = []
+        while not subscription._queue.empty():
+            events.append(await subscription.get())
+        return events
+
+    return asyncio.run(read_all())
+
+
+def updated(todo_id, owner_id=1):
+    return TodoEvent("updated", owner_id, todo_id)
+
+
+def test_events_are_delivered_in_order():
+    subscription = Subscription(owner_id=1, queue_size=10)
+    subscription.offer(updated(1))
+    subscription.offer(updated(2))
+
+    assert drain(subscription) == [updated(1), updated(2)]
+
+
+def test_full_queue_collapses_into_one_resync():
+    subscription = Subscription(owner_id=1, queue_size=3)
+    for todo_id in range(10):
+        subscription.offer(updated(todo_id))
+
+    assert drain(subscription) == [TodoEvent(RESYNC, 1)]
+
+
+def test_events_queue_again_once_resync_is_read():
+    subscription = Subscription(owner_id=1, queue_size=2)
+    for todo_id in range(3):
+        subscription.offer(updated(todo_id))
+    assert drain(subscription) == [TodoEvent(RESYNC, 1)]
+
+    subscription.offer(updated(7))
+    assert drain(subscription) == [updated(7)]
+
+
+def test_explicit_resync_replaces_queued_events():
+    subscription = Subscription(owner_id=1, queue_size=10)
+    subscription.offer(updated(1))
+    subscription.offer(TodoEvent(RESYNC, 1))
+    subscription.offer(updated(2))
+
+    assert drain(subscription) == [TodoEvent(RESYNC, 1)]
+
+
+def test_broker_delivers_to_the_owners_streams_only():
+    broker = TodoEventBroker(InMemoryPubSub(), queue_size=10)
+
+    async def scenario():
+        async with broker.subscribe(1) as mine, broker.subscribe(2) as theirs:
+            await broker.publish([updated(5, owner_id=1)])
+            assert await mine.get() == updated(5, owner_id=1)
+            assert theirs._queue.empty()
+        assert broker._subscriptions == {}
+
+    asyncio.run(scenario())
+
+
+def test_lost_pubsub_connection_resyncs_every_stream():
+    broker = TodoEventBroker(InMemoryPubSub(), queue_size=10)
+
+    async def scenario():
+        async with broker.subscribe(1) as first, broker.subscribe(2) as second:
+            _deliver(broker.pubsub._handlers["todo_events"], None)
+            assert await first.get() == TodoEvent(RESYNC, 1)
+            assert await second.get() == TodoEvent(RESYNC, 2)
+
+    asyncio.run(scenario())
+
+
+class RecordingPubSub(InMemoryPubSub):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    async def publish(self, channel, message):
+        self.messages.append(message)
+        await super().publish(channel, message)
+
+
+def test_broker_publishes_one_message_per_batch_of_events():
+    broker = TodoEventBroker(RecordingPubSub(), queue_size=300)
+    todo_events = [updated(todo_id) for todo_id in range(MAX_BATCH + 1)]
+
+    async def scenario():
+        async with broker.subscribe(1) as subscription:
+            await broker.publish(todo_events)
+            return [await subscription.get() for _ in todo_events]
+
+    assert asyncio.run(scenario()) == todo_events
+    assert [len(message["items"]) for message in broker.pubsub.messages] == [
+        MAX_BATCH,
+        1,
+    ]
+    # Stays within the 8000-byte NOTIFY payload limit.
+    widest = [["restored", 2**31 - 1, 2**31 - 1, 2**31 - 1]] * MAX_BATCH
+    assert len(json.dumps({"items": widest})) < 8000
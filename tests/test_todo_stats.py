@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+from app.crud import crud_todo, crud_todo_stats
+from app.db.models import TodoStats
+from app.schemas.todo import TodoCreate, TodoUpdate
+
+OWNER_ID = 1
+
+
+async def counters(session_factory):
+    """The stored counters and the same counters computed from scratch."""
+    today = date.today()
+    async with session_factory() as db:
+        stats = await db.scalar(
+            select(TodoStats).filter(TodoStats.owner_id == OWNER_ID)
+        )
+        counted = await crud_todo_stats.compute_todo_stats(db, OWNER_ID, today)
+    stored = {column: getattr(stats, column) for column in counted}
+    return stored, counted
+
+
+def test_counters_follow_create_status_change_delete_and_restore(run_with_db):
+    async def scenario(session_factory):
+        steps = []
+
+        async def step(name):
+            steps.append((name, *await counters(session_factory)))
+
+        async with session_factory() as db:
+            project = await crud_todo.create_todo(
+                db, todo_in=TodoCreate(title="Project"), owner_id=OWNER_ID
+            )
+            late = await crud_todo.create_todo(
+                db,
+                todo_in=TodoCreate(
+                    title="Taxes",
+                    parent_id=project.id,
+                    due_date=date.today() - timedelta(days=1),
+                ),
+                owner_id=OWNER_ID,
+            )
+            await crud_todo.create_todo(
+                db,
+                todo_in=TodoCreate(title="Sketch", parent_id=project.id, status="Done"),
+                owner_id=OWNER_ID,
+            )
+            await db.commit()
+        await step("created")
+
+        async with session_factory() as db:
+            await crud_todo.update_todo(
+                db, db_todo=late, todo_in=TodoUpdate(status="Done")
+            )
+            await db.commit()
+        await step("updated")
+
+        async with session_factory() as db:
+            await crud_todo.update_todo_statuses(
+                db, owner_id=OWNER_ID, changes={project.id: ("In Progress", None)}
+            )
+            await db.commit()
+        await step("batched")
+
+        async with session_factory() as db:
+            await crud_todo.delete_todo(db, todo_id=project.id, owner_id=OWNER_ID)
+            await db.commit()
+        await step("deleted")
+
+        async with session_factory() as db:
+            await crud_todo.restore_todo(db, todo_id=project.id, owner_id=OWNER_ID)
+            await db.commit()
+        await step("restored")
+        return steps
+
+    steps = run_with_db(scenario)
+
+    for name, stored, counted in steps:
+        assert stored == counted, name
+    totals = {name: counted for name, _, counted in steps}
+    assert totals["created"]["overdue"] == 1
+    assert totals["updated"]["overdue"] == 0
+    assert all(value == 0 for value in totals["deleted"].values())
+    assert totals["restored"] == totals["batched"]
@@ -0,0 +1,112 @@
+from app.crud import crud_todo
+from app.schemas.todo import TodoCreate, TodoUpdate
+from app.schemas.user import Principal
+from app.services.todo_service import TodoService
+
+USER = Principal(id=1, email="a@example.com")
+PAGE_SIZE = 2
+
+
+async def add_todo(db, title, parent_id=None):
+    return await crud_todo.create_todo(
+        db, todo_in=TodoCreate(title=title, parent_id=parent_id), owner_id=USER.id
+    )
+
+
+async def add_todos(session_factory):
+    """
+    Seven todos, where each subtask insert also stamps its parent,
+    so several rows share a change_seq and pages end mid-change. Returns
+    their ids by title.
+    """
+    async with session_factory() as db:
+        project = await add_todo(db, "Project")
+        chores = await add_todo(db, "Chores")
+        todos = [
+            project,
+            chores,
+            await add_todo(db, "Design", project.id),
+            await add_todo(db, "Budget", project.id),
+            await add_todo(db, "Groceries"),
+            await add_todo(db, "Laundry", chores.id),
+            await add_todo(db, "Dishes", chores.id),
+        ]
+        await db.commit()
+    return {todo.title: todo.id for todo in todos}
+
+
+async def sync(session_factory, since=None, since_id=0):
+    """Pages until caught up. Returns the pages' (id, deleted) items and the mark."""
+    items = []
+    todo_service = TodoService()
+    while True:
+        async with session_factory() as db:
+            page = await todo_service.get_todo_changes(
+                db, USER, since=since, since_id=since_id, limit=PAGE_SIZE
+            )
+        items.extend((todo.id, False) for todo in page.todos)
+        items.extend((tombstone.id, True) for tombstone in page.deleted)
+        since, since_id = page.since, page.since_id
+        if not page.has_more:
+            return items, since, since_id
+
+
+async def changed_order(session_factory, since=None, since_id=0):
+    """Every change after the mark in (change_seq, id) order, in one read."""
+    async with session_factory() as db:
+        todos = await crud_todo.get_todo_changes(
+            db, USER.id, since=since, since_id=since_id
+        )
+    return [(todo.id, todo.deleted_at is not None) for todo in todos]
+
+
+def test_full_download_pages_through_every_todo_once(run_with_db):
+    async def scenario(session_factory):
+        await add_todos(session_factory)
+        items, _, _ = await sync(session_factory)
+        return items, await changed_order(session_factory)
+
+    items, expected = run_with_db(scenario)
+
+    assert len(expected) == 7
+    assert sorted(items) == sorted(expected)
+    assert len(set(items)) == len(items)
+
+
+def test_incremental_sync_sees_each_later_change_once(run_with_db):
+    async def scenario(session_factory):
+        ids = await add_todos(session_factory)
+        _, since, since_id = await sync(session_factory)
+        todo_service = TodoService()
+        async with session_factory() as db:
+            await todo_service.update_existing_todo(
+                db, ids["Design"], TodoUpdate(status="Done"), USER
+            )
+            await todo_service.delete_existing_todo(db, ids["Chores"], USER)
+            await todo_service.update_existing_todo(
+                db, ids["Groceries"], TodoUpdate(title="Shopping"), USER
+            )
+            await db.commit()
+        items, _, _ = await sync(session_factory, since, since_id)
+        return items, ids
+
+    items, ids = run_with_db(scenario)
+
+    # The status change re-counts the parent, so both are sent again.
+    assert sorted(items) == sorted(
+        [(ids[title], False) for title in ("Design", "Project", "Groceries")]
+        + [(ids[title], True) for title in ("Chores", "Laundry", "Dishes")]
+    )
+    assert len(set(items)) == len(items)
+
+
+def test_caught_up_client_gets_an_empty_page(run_with_db):
+    async def scenario(session_factory):
+        await add_todos(session_factory)
+        _, since, since_id = await sync(session_factory)
+        return await sync(session_factory, since, since_id)
+
+    items, since, since_id = run_with_db(scenario)
+
+    assert items == []
+    assert since is not None and since_id is not None
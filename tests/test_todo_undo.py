@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from app.crud import crud_todo
+from app.db.models import Todo
+from app.schemas.todo import TodoCreate
+
+OWNER_ID = 1
+
+
+async def add_todo(db, title, parent_id=None):
+    return await crud_todo.create_todo(
+        db, todo_in=TodoCreate(title=title, parent_id=parent_id), owner_id=OWNER_ID
+    )
+
+
+async def build_tree(session_factory):
+    """
+    Project
+    |- Design
+    |  `- Sketch
+    `- Budget   (deleted on its own first)
+    Groceries
+    """
+    async with session_factory() as db:
+        project = await add_todo(db, "Project")
+        design = await add_todo(db, "Design", project.id)
+        await add_todo(db, "Sketch", design.id)
+        budget = await add_todo(db, "Budget", project.id)
+        await add_todo(db, "Groceries")
+        await crud_todo.delete_todo(db, todo_id=budget.id, owner_id=OWNER_ID)
+        # Deleted well before its parent (SQLite timestamps have 1s precision).
+        await db.execute(
+            update(Todo)
+            .where(Todo.id == budget.id)
+            .values(deleted_at=datetime.now(timezone.utc) - timedelta(hours=1))
+        )
+        await db.commit()
+    return project.id, design.id
+
+
+async def live_titles(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Todo.title).filter(Todo.deleted_at.is_(None)).order_by(Todo.id)
+        )
+        return result.scalars().all()
+
+
+def test_delete_takes_the_whole_subtree(run_with_db):
+    async def scenario(session_factory):
+        project_id, _ = await build_tree(session_factory)
+        async with session_factory() as db:
+            await crud_todo.delete_todo(db, todo_id=project_id, owner_id=OWNER_ID)
+            await db.commit()
+        return await live_titles(session_factory)
+
+    assert run_with_db(scenario) == ["Groceries"]
+
+
+def test_undo_restores_exactly_the_deleted_subtree(run_with_db):
+    async def scenario(session_factory):
+        project_id, _ = await build_tree(session_factory)
+        async with session_factory() as db:
+            await crud_todo.delete_todo(db, todo_id=project_id, owner_id=OWNER_ID)
+            await db.commit()
+        async with session_factory() as db:
+            restored = await crud_todo.restore_todo(
+                db, todo_id=project_id, owner_id=OWNER_ID
+            )
+            await db.commit()
+        return restored, await live_titles(session_factory)
+
+    restored, titles = run_with_db(scenario)
+
+    assert restored.deleted_at is None
+    # Budget was deleted on its own earlier and stays deleted.
+    assert titles == ["Project", "Design", "Sketch", "Groceries"]
+
+
+def test_subtask_cannot_be_restored_while_its_parent_is_deleted(run_with_db):
+    async def scenario(session_factory):
+        project_id, design_id = await build_tree(session_factory)
+        async with session_factory() as db:
+            await crud_todo.delete_todo(db, todo_id=project_id, owner_id=OWNER_ID)
+            await db.commit()
+        async with session_factory() as db:
+            restored = await crud_todo.restore_todo(
+                db, todo_id=design_id, owner_id=OWNER_ID
+            )
+            await db.commit()
+        return restored, await live_titles(session_factory)
+
+    restored, titles = run_with_db(scenario)
+
+    assert restored is None
+    assert titles == ["Groceries"]
@@ -0,0 +1,85 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.crud import crud_todo
+from app.schemas.todo import TodoCreate, TodoUpdate
+from app.schemas.user import Principal
+from app.services.todo_service import TodoService
+
+USER = Principal(id=1, email="a@example.com")
+
+
+async def add_todo(session_factory, title="Write tests"):
+    async with session_factory() as db:
+        todo = await crud_todo.create_todo(
+            db, todo_in=TodoCreate(title=title), owner_id=USER.id
+        )
+        await db.commit()
+    return todo
+
+
+async def load(session_factory, todo_id):
+    async with session_factory() as db:
+        return await crud_todo.get_todo(db, todo_id, USER.id)
+
+
+def test_update_with_current_version_bumps_it(run_with_db):
+    async def scenario(session_factory):
+        todo = await add_todo(session_factory)
+        async with session_factory() as db:
+            updated = await TodoService().update_existing_todo(
+                db, todo.id, TodoUpdate(title="Renamed"), USER, expected_version=1
+            )
+            await db.commit()
+        return updated, await load(session_factory, todo.id)
+
+    updated, stored = run_with_db(scenario)
+
+    # The UPDATE ... RETURNING result is current without a refresh.
+    assert (updated.title, updated.version) == ("Renamed", 2)
+    assert (stored.title, stored.version) == ("Renamed", 2)
+
+
+def test_update_with_stale_version_is_a_conflict(run_with_db):
+    async def scenario(session_factory):
+        todo = await add_todo(session_factory)
+        todo_service = TodoService()
+        async with session_factory() as db:
+            await todo_service.update_existing_todo(
+                db, todo.id, TodoUpdate(title="First"), USER, expected_version=1
+            )
+            await db.commit()
+        async with session_factory() as db:
+            # Submitted from a form loaded before the first edit.
+            with pytest.raises(HTTPException) as conflict:
+                await todo_service.update_existing_todo(
+                    db, todo.id, TodoUpdate(title="Second"), USER, expected_version=1
+                )
+        return conflict.value, await load(session_factory, todo.id)
+
+    conflict, stored = run_with_db(scenario)
+
+    assert conflict.status_code == 409
+    assert (stored.title, stored.version) == ("First", 2)
+
+
+def test_update_of_a_row_changed_since_it_was_loaded_is_rejected(run_with_db):
+    async def scenario(session_factory):
+        todo = await add_todo(session_factory)
+        loaded = await load(session_factory, todo.id)
+        async with session_factory() as db:
+            await crud_todo.update_todo(
+                db, db_todo=todo, todo_in=TodoUpdate(title="Elsewhere")
+            )
+            await db.commit()
+        async with session_factory() as db:
+            with pytest.raises(StaleDataError):
+                await crud_todo.update_todo(
+                    db, db_todo=loaded, todo_in=TodoUpdate(title="Here")
+                )
+        return await load(session_factory, todo.id)
+
+    stored = run_with_db(scenario)
+
+    assert (stored.title, stored.version) == ("Elsewhere", 2)
@@ -0,0 +1,49 @@
+import time
+
+from app.core.security import VerifiedTokenCache
+
+
+def claims_expiring_in(seconds):
+    return {"sub": "a@example.com", "exp": time.time() + seconds}
+
+
+def test_cached_claims_are_returned_until_expiry():
+    cache = VerifiedTokenCache(maxsize=10)
+    claims = claims_expiring_in(60)
+    cache.put("token", claims)
+
+    assert cache.get("token") == claims
+    assert cache.hits == 1
+    assert cache.get("other") is None
+    assert cache.misses == 1
+
+
+def test_expired_entry_is_dropped():
+    cache = VerifiedTokenCache(maxsize=10)
+    cache.put("token", claims_expiring_in(-1))
+
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerifiedTokenCache(maxsize=2)
+    cache.put("a", claims_expiring_in(60))
+    cache.put("b", claims_expiring_in(60))
+    cache.get("a")
+    cache.put("c", claims_expiring_in(60))
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_claims_without_expiry_and_disabled_cache_store_nothing():
+    cache = VerifiedTokenCache(maxsize=10)
+    cache.put("token", {"sub": "a@example.com"})
+    assert len(cache) == 0
+
+    disabled = VerifiedTokenCache(maxsize=0)
+    disabled.put("token", claims_expiring_in(60))
+    assert len(disabled) == 0
@@ -6,7 +6,12 @@ from fastapi.testclient import TestClient
 
 from app.main import app
 
-client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def client():
+    # Runs the lifespan, which starts the ServiceContainer the routes use.
+    with TestClient(app) as client:
+        yield client
 
 
 def find_form_tag(text):
@@ -14,7 +19,7 @@ def find_form_tag(text):
     return match.group(0) if match else "!!! FORM TAG NOT FOUND !!!"
 
 
-def test_read_root_redirects_to_login_unauthenticated():
+def test_read_root_redirects_to_login_unauthenticated(client):
     """
     Test that accessing the root ('/') redirects to the login page
     when not authenticated (no access token cookie).
@@ -35,7 +40,7 @@ def test_read_root_redirects_to_login_unauthenticated():
     assert response.headers["location"].endswith(expected_location_suffix)
 
 
-def test_get_login_page():
+def test_get_login_page(client):
     """
     Test that the login page ('/auth/login') can be accessed via GET
     and returns a successful HTML response containing the correct form action URL.
@@ -62,7 +67,7 @@ def test_get_login_page():
     assert action_pattern.search(form_tag_html) is not None
 
 
-def test_get_signup_page():
+def test_get_signup_page(client):
     """
     Test that the signup page ('/auth/signup') can be accessed via GET
     and returns a successful HTML response containing the correct form action URL.
@@ -93,7 +98,7 @@ def test_get_signup_page():
 @pytest.mark.skip(
     reason="Requires authentication and DB setup which is not implemented in this simple test"
 )
-def test_get_todos_page_unauthorized():
+def test_get_todos_page_unauthorized(client):
     """
     Test accessing the main todos page ('/todos/') without being logged in.
     It should redirect to login (checked by the 401 exception handler in main.py).